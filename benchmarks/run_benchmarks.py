@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""Run the ctk-cli benchmarks, optionally comparing against (or
+storing) a baseline:
+
+    python benchmarks/run_benchmarks.py --save-baseline baseline.json
+    python benchmarks/run_benchmarks.py --baseline baseline.json
+
+Exits with a non-zero exit code if any benchmark got slower than the
+baseline by more than the given tolerance."""
+
+from __future__ import print_function
+import os, sys, io, json, time, shutil, argparse, tempfile, logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ctk_cli import CLIModule, CLIArgumentParser, listCLIExecutables, getXMLDescription, discoverCLIModules
+from synthetic import generateXML, writeStubExecutables
+
+# (groups, parameters per group) for checking how parsing scales:
+SIZES = [(1, 10), (5, 40), (20, 100)]
+
+
+def bestTime(func, repeat, number):
+    """Return the best per-call time (in seconds) of `repeat` rounds
+    with `number` calls each."""
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        for _ in range(number):
+            func()
+        duration = (time.time() - start) / number
+        if best is None or duration < best:
+            best = duration
+    return best
+
+
+def benchmarks(workDir, quick):
+    repeat = 3 if quick else 5
+    for groups, parametersPerGroup in SIZES:
+        xml = generateXML(groups, parametersPerGroup)
+        size = '%dx%d' % (groups, parametersPerGroup)
+        number = max(1, 2000 // (groups * parametersPerGroup))
+        if quick:
+            number = max(1, number // 10)
+
+        yield 'parse[%s]' % size, bestTime(
+            lambda: CLIModule(stream = io.StringIO(xml)), repeat, number)
+
+        module = CLIModule(stream = io.StringIO(xml))
+        def classify():
+            module.invalidateIndexes()
+            module.classifyParameters()
+        yield 'classifyParameters[%s]' % size, bestTime(classify, repeat, number)
+
+        xmlFilename = os.path.join(workDir, 'module%s.xml' % size)
+        with open(xmlFilename, 'w') as f:
+            f.write(xml)
+        yield 'CLIArgumentParser[%s]' % size, bestTime(
+            lambda: CLIArgumentParser(xmlFilename), repeat, number)
+
+    stubCount = 8 if quick else 32
+    stubDir = os.path.join(workDir, 'stubs')
+    writeStubExecutables(stubDir, stubCount)
+    def describeAll():
+        for path in listCLIExecutables(stubDir):
+            getXMLDescription(path)
+    yield 'listCLIExecutables+getXMLDescription[%d]' % stubCount, bestTime(describeAll, repeat, 1)
+    yield 'discoverCLIModules[%d]' % stubCount, bestTime(lambda: discoverCLIModules(stubDir), repeat, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.split('\n\n')[0])
+    parser.add_argument('--baseline', help = 'JSON file with baseline timings to compare against')
+    parser.add_argument('--save-baseline', metavar = 'FILE', help = 'store timings as new baseline')
+    parser.add_argument('--tolerance', type = float, default = 0.25,
+                        help = 'relative slowdown that is reported as regression (default: 0.25)')
+    parser.add_argument('--quick', action = 'store_true', help = 'fewer iterations (less accurate)')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING) # the synthetic modules trigger parser warnings
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    workDir = tempfile.mkdtemp(prefix = 'ctk-cli-bench-')
+    results = {}
+    regressions = []
+    try:
+        for name, duration in benchmarks(workDir, args.quick):
+            results[name] = duration
+            line = '%-50s %10.3f ms' % (name, duration * 1e3)
+            if name in baseline:
+                ratio = duration / baseline[name]
+                line += '  (%+.0f%%)' % ((ratio - 1) * 100)
+                if ratio > 1 + args.tolerance:
+                    line += '  REGRESSION'
+                    regressions.append(name)
+            print(line)
+            sys.stdout.flush()
+    finally:
+        shutil.rmtree(workDir, ignore_errors = True)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent = 2, sort_keys = True)
+
+    if regressions:
+        print('%d regression(s) beyond %.0f%% tolerance' % (len(regressions), args.tolerance * 100))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
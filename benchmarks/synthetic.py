@@ -0,0 +1,107 @@
+"""Generators for synthetic CLI descriptions and stub executables
+used by the benchmarks."""
+
+import os, stat
+from xml.sax.saxutils import escape
+
+from ctk_cli.module import CLIParameter
+
+_DEFAULTS = {
+    'boolean' : 'false',
+    'integer' : '3',
+    'float' : '0.5',
+    'double' : '0.25',
+    'string' : 'some text',
+    'directory' : '/tmp',
+    'integer-vector' : '1,2,3',
+    'float-vector' : '0.5,1.5',
+    'double-vector' : '0.25,0.75,1.25',
+    'string-vector' : 'a,b,c',
+    'point' : '1,2,3',
+    'region' : '0,0,0,10,10,10',
+    'file' : 'input.txt',
+}
+
+_ENUMERATION_ELEMENTS = {
+    'integer-enumeration' : ['1', '2', '3'],
+    'float-enumeration' : ['0.5', '1.5'],
+    'double-enumeration' : ['0.25', '0.75'],
+    'string-enumeration' : ['first', 'second', 'third'],
+}
+
+_CONSTRAINED_TYPES = ('integer', 'float', 'double', 'integer-vector', 'float-vector', 'double-vector')
+
+
+def _parameterXML(typ, number, index = None):
+    name = 'param%d' % number
+    lines = ['    <%s%s>' % (typ, ' fileExtensions=".nrrd,.nii"' if typ == 'image' else ''),
+             '      <name>%s</name>' % name,
+             '      <label>Parameter %d</label>' % number,
+             '      <description>%s parameter number %d</description>' % (escape(typ), number)]
+    if index is not None:
+        lines.append('      <index>%d</index>' % index)
+    else:
+        lines.append('      <longflag>%s</longflag>' % name)
+    if typ in CLIParameter.EXTERNAL_TYPES:
+        lines.append('      <channel>%s</channel>' % ('output' if number % 2 else 'input'))
+    if typ in _DEFAULTS:
+        lines.append('      <default>%s</default>' % _DEFAULTS[typ])
+    for element in _ENUMERATION_ELEMENTS.get(typ, ()):
+        lines.append('      <element>%s</element>' % element)
+    if typ in _ENUMERATION_ELEMENTS:
+        lines.append('      <default>%s</default>' % _ENUMERATION_ELEMENTS[typ][0])
+    if typ in _CONSTRAINED_TYPES:
+        lines.append('      <constraints><minimum>0</minimum><maximum>100</maximum>'
+                     '<step>1</step></constraints>')
+    lines.append('    </%s>' % typ)
+    return lines
+
+
+def generateXML(groups, parametersPerGroup, indexed = 2):
+    """Return XML description (str) of a synthetic CLI module with
+    the given number of parameter groups and parameters per group,
+    cycling through all of `CLIParameter.TYPES`.  The first `indexed`
+    parameters are positional image arguments."""
+    lines = ['<?xml version="1.0" encoding="utf-8"?>',
+             '<executable>',
+             '  <category>Benchmarks</category>',
+             '  <title>Synthetic Module</title>',
+             '  <description>Synthetic module with %d groups of %d parameters</description>' % (
+                 groups, parametersPerGroup),
+             '  <version>1.0</version>',
+             '  <contributor>ctk-cli benchmarks</contributor>']
+    number = 0
+    for group in range(groups):
+        lines.extend(['  <parameters%s>' % (' advanced="true"' if group % 2 else ''),
+                      '    <label>Group %d</label>' % group,
+                      '    <description>Parameter group %d</description>' % group])
+        for _ in range(parametersPerGroup):
+            if number < indexed:
+                lines.extend(_parameterXML('image', number, index = number))
+            else:
+                typ = CLIParameter.TYPES[number % len(CLIParameter.TYPES)]
+                lines.extend(_parameterXML(typ, number))
+            number += 1
+        lines.append('  </parameters>')
+    lines.append('</executable>')
+    return '\n'.join(lines) + '\n'
+
+
+def writeStubExecutables(directory, count, groups = 2, parametersPerGroup = 10):
+    """Create `count` stub CLI executables within `directory` that
+    answer --xml with a synthetic description (and ignore anything
+    else).  Returns the list of executable paths."""
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    xmlFilename = os.path.join(directory, 'description.xml')
+    with open(xmlFilename, 'w') as f:
+        f.write(generateXML(groups, parametersPerGroup))
+
+    result = []
+    for i in range(count):
+        path = os.path.join(directory, 'StubModule%d' % i)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\nexec cat "%s"\n' % xmlFilename)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+        result.append(path)
+    return result
@@ -1,4 +1,17 @@
-from .module import CLIModule
-from .execution import (getXMLDescription, isCLIExecutable,
-                       listCLIExecutables, popenCLIExecutable)
+from .module import CLIModule, CLIDiagnostics, CLIParseError, CLIValueCodec
+from .execution import (CLIExecution, CLIExecutionResult, CLIResourceUsage,
+                       CLITimeoutError, LauncherEnvironmentCache, getXMLDescription,
+                       isCLIExecutable, killProcess, listCLIExecutables,
+                       popenCLIExecutable, setLauncherEnvironmentCache)
 from .argument_parser import CLIArgumentParser
+from .cache import XMLDescriptionCache
+from .result_cache import CLIResultCache
+from .pipeline import CLIPipeline, CLIPipelineResult
+from .discovery import CLICatalog, CLIDiscoveryResult, discoverCLIModules, slicerCLIDirectories
+from .batch import batchJobKey, runBatch
+from .serialization import dumpModule, loadModule
+from .instrumentation import MetricsCollector, addListener, removeListener
+from .return_parameters import (readReturnParameterFile, readReturnParameterFiles,
+                                writeReturnParameterFile)
+from .scratch import ScratchDirectory, ScratchSpace
+from .progress import CLIProgressEvent, CLIProgressParser, iterCLIProgress
@@ -0,0 +1,136 @@
+"""asyncio counterparts of the functions in `ctk_cli.execution`.
+
+All functions run the CLI processes through asyncio's subprocess
+support, so a single event loop can drive many concurrent CLI
+processes without blocking or needing a thread per process."""
+
+import os, logging, asyncio
+import xml.etree.ElementTree as ET
+
+from .execution import (CLITimeoutError, killProcess, prepareCLICommand, _PIPE_CHUNK_SIZE,
+                        _putXMLDescription)
+from .module import CLIModule
+
+logger = logging.getLogger(__name__)
+
+
+async def popenCLIExecutableAsync(command, **kwargs):
+    """Coroutine version of `popenCLIExecutable()`; returns an
+    `asyncio.subprocess.Process`.  Slicer CLI modules are still
+    launched through the Slicer launcher (see `prepareCLICommand()`;
+    note that filling a `LauncherEnvironmentCache` blocks).
+
+    Any kwargs are passed on to asyncio.create_subprocess_exec()."""
+    command, kwargs = prepareCLICommand(command, kwargs)
+    return await asyncio.create_subprocess_exec(*command, **kwargs)
+
+
+async def iterCLIOutputAsync(process, chunkSize = _PIPE_CHUNK_SIZE):
+    """Asynchronous generator yielding ('stdout', chunk) and
+    ('stderr', line) tuples (as bytes) in the order in which they
+    arrive from the given process, which must have been started with
+    stdout and/or stderr set to asyncio.subprocess.PIPE.  stdout is
+    passed on in chunks of arbitrary size (at most `chunkSize`), while
+    stderr is split into lines (including line endings, except maybe
+    for the last one).  Lines and chunks are not limited by asyncio's
+    stream buffer size.  Ends when all pipes are closed; the caller is
+    responsible for awaiting `process.wait()` afterwards."""
+
+    pending = {}
+    for name in ('stdout', 'stderr'):
+        stream = getattr(process, name)
+        if stream is not None:
+            pending[asyncio.ensure_future(stream.read(chunkSize))] = (name, stream)
+
+    partialLine = b''
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when = asyncio.FIRST_COMPLETED)
+            for task in done:
+                name, stream = pending.pop(task)
+                chunk = task.result()
+                if chunk:
+                    pending[asyncio.ensure_future(stream.read(chunkSize))] = (name, stream)
+                if name == 'stdout':
+                    if chunk:
+                        yield name, chunk
+                    continue
+                lines = (partialLine + chunk).splitlines(True)
+                partialLine = b''
+                if chunk and lines and not lines[-1].endswith(b'\n'):
+                    partialLine = lines.pop()
+                for line in lines:
+                    yield name, line
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _waitOrKill(process, coroutine, timeout, command):
+    """Await `coroutine` (with the given timeout); on timeout or any
+    other exception (including cancellation), kill the process if it is
+    still running and reap it before propagating the error."""
+    try:
+        return await asyncio.wait_for(coroutine, timeout)
+    except BaseException as e:
+        if process.returncode is None:
+            killProcess(process)
+            await asyncio.shield(process.wait())
+        if isinstance(e, asyncio.TimeoutError):
+            raise CLITimeoutError("Calling %s timed out after %ss" % (command[0], timeout))
+        raise
+
+
+async def runCLIExecutableAsync(command, timeout = None, **kwargs):
+    """Run the given command (see `popenCLIExecutableAsync()`) to
+    completion and return (exitCode, stdout, stderr), with the outputs
+    as bytes.  If `timeout` (in seconds) is given, the process is
+    killed (together with its process group, see `killProcess()`) and
+    `CLITimeoutError` is raised if it does not finish in time."""
+    if timeout is not None and os.name == 'posix':
+        kwargs.setdefault('start_new_session', True)
+    process = await popenCLIExecutableAsync(
+        command, stdout = asyncio.subprocess.PIPE, stderr = asyncio.subprocess.PIPE, **kwargs)
+    stdout, stderr = await _waitOrKill(process, process.communicate(), timeout, command)
+    return process.returncode, stdout, stderr
+
+
+async def getXMLDescriptionAsync(cliExecutable, cache = None, timeout = None, **kwargs):
+    """Coroutine version of `getXMLDescription()`."""
+
+    if cache is not None:
+        result = cache.get(cliExecutable, env = kwargs.get('env'))
+        if result is not None:
+            return result
+
+    command = [cliExecutable, '--xml']
+    if timeout is not None and os.name == 'posix':
+        kwargs.setdefault('start_new_session', True)
+    process = await popenCLIExecutableAsync(
+        command, stdout = asyncio.subprocess.PIPE, stderr = asyncio.subprocess.PIPE, **kwargs)
+
+    async def consume():
+        parser = ET.XMLParser()
+        async for name, data in iterCLIOutputAsync(process):
+            if name == 'stdout':
+                parser.feed(data)
+            else:
+                logger.warning('%s: %s' % (os.path.basename(cliExecutable),
+                                           data.decode(errors = 'replace').rstrip('\r\n')))
+        ec = await process.wait()
+        if ec:
+            raise RuntimeError("Calling %s failed (exit code %d)" % (cliExecutable, ec))
+        return ET.ElementTree(parser.close())
+
+    result = await _waitOrKill(process, consume(), timeout, command)
+
+    if cache is not None:
+        _putXMLDescription(cache, cliExecutable, result, kwargs.get('env'))
+    return result
+
+
+async def describeCLIModuleAsync(path, env = None, cache = None, timeout = None, lazy = False):
+    """Coroutine for creating a `CLIModule` from the CLI executable
+    at `path` (see `getXMLDescriptionAsync()`, and `CLIModule` for `lazy`)."""
+    elementTree = await getXMLDescriptionAsync(path, cache = cache, timeout = timeout, env = env)
+    return CLIModule.fromElementTree(elementTree, path = path, lazy = lazy)
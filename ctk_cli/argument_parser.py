@@ -4,7 +4,9 @@ import sys
 import argparse
 import textwrap as _textwrap
 
-from .module import CLIModule
+from .module import CLIModule, CLIValueCodec, _parseBool
+from .serialization import loadCompiledModule
+from .return_parameters import writeReturnParameterFile
 
 class _MultilineHelpFormatter(argparse.HelpFormatter):
     def _fill_text(self, text, width, indent):
@@ -22,10 +24,6 @@ class _MultilineHelpFormatter(argparse.HelpFormatter):
 
 def _make_print_xml_action(xml_spec_file):
 
-    # read xml spec file into a string
-    with open(xml_spec_file) as f:
-        str_xml = f.read()
-
     class _PrintXMLAction(argparse.Action):
 
         def __init__(self,
@@ -41,26 +39,84 @@ def _make_print_xml_action(xml_spec_file):
                 help=help)
 
         def __call__(self, parser, namespace, values, option_string=None):
-            print(str_xml)
+            # read xml spec file only when it is actually requested
+            with open(xml_spec_file) as f:
+                print(f.read())
             parser.exit()
 
     return _PrintXMLAction
 
 
+def _make_value_type(param, enforce_constraints):
+    """Return argparse type function parsing and validating values of
+    the given parameter with its precompiled codec.  The minimum and
+    maximum constraints are only checked if `enforce_constraints` is
+    set."""
+    if enforce_constraints:
+        codec = param.codec
+    else:
+        codec = CLIValueCodec(param, ignoreConstraints=True)
+
+    def parse_value(value):
+        try:
+            return codec.parseValid(value)
+        except (ValueError, TypeError) as e:
+            raise argparse.ArgumentTypeError(str(e))
+
+    parse_value.__name__ = param.typ # (used in argparse error messages)
+    return parse_value
+
+
+class _BooleanSwitchAction(argparse.Action):
+    """Zero-argument switch setting its destination to True (the
+    --flag=true/false form is handled by
+    `CLIArgumentParser.parse_known_args()`)."""
+
+    def __init__(self, option_strings, dest, default=None, help=None):
+        super(_BooleanSwitchAction, self).__init__(
+            option_strings=option_strings,
+            dest=dest,
+            nargs=0,
+            default=default,
+            help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        setattr(namespace, self.dest, True)
+
+
 class CLIArgumentParser(argparse.ArgumentParser):
-    def __init__(self, xml_spec_file=None):
+    def __init__(self, xml_spec_file=None, cache_dir=None, enforce_constraints=False):
+        """Create argument parser from the CLI XML description in
+        `xml_spec_file` (default: the script name with extension
+        .xml).  If `cache_dir` is given, the parsed description is
+        compiled into that directory and reused by subsequent
+        invocations as long as the XML file does not change (see
+        `ctk_cli.serialization.loadCompiledModule()`).
+
+        Values are checked for their type, enumeration membership and
+        number of elements (of points and regions).  Values outside of
+        the parameters' minimum and maximum constraints (which are
+        often just slider ranges) are only rejected if
+        `enforce_constraints` is set.
+        """
 
         # call and initialize super class
         super(CLIArgumentParser, self).__init__(
             formatter_class=_MultilineHelpFormatter
         )
 
+        # option strings of boolean switches, see parse_known_args()
+        self._boolean_switches = {}
+
         # get xml spec file
         if xml_spec_file is None:
             xml_spec_file = os.path.splitext(sys.argv[0])[0] + '.xml'
 
         # parse xml spec file
-        clim = CLIModule(xml_spec_file)
+        if cache_dir is not None:
+            clim = loadCompiledModule(xml_spec_file, cache_dir)
+        else:
+            clim = CLIModule(xml_spec_file)
 
         # add description as epilog
         str_description = ['Title: ' + clim.title,
@@ -117,6 +173,7 @@ class CLIArgumentParser(argparse.ArgumentParser):
         opt_params.sort(key=lambda p: get_flag(p))
 
         # if xml spec has simple output parameters add returnparameterfile
+        self._return_params = simple_out_params
         if len(simple_out_params) > 0:
             self.add_argument(
                 '--returnparameterfile',
@@ -133,7 +190,7 @@ class CLIArgumentParser(argparse.ArgumentParser):
         for param in index_params:
 
             cur_kwargs = {
-                'type': param.parseValue,
+                'type': _make_value_type(param, enforce_constraints),
                 'help': param.description + ' (type: %s)' % param.typ,
             }
 
@@ -163,14 +220,20 @@ class CLIArgumentParser(argparse.ArgumentParser):
 
             cur_kwargs = {
                 'dest': param.name,
-                'type': param.parseValue,
                 'help': param.description,
             }
 
-            if param.elements is not None:
-                cur_kwargs['choices'] = param.elements
+            if param.typ == 'boolean' and not param.multiple:
+                # bare switch (as passed by CLIExecution) or --flag=value
+                cur_kwargs['action'] = _BooleanSwitchAction
+                for option_string in cur_args:
+                    self._boolean_switches[option_string] = param.name
             else:
-                cur_kwargs['metavar'] = '<%s>' % param.typ
+                cur_kwargs['type'] = _make_value_type(param, enforce_constraints)
+                if param.elements is not None:
+                    cur_kwargs['choices'] = param.elements
+                else:
+                    cur_kwargs['metavar'] = '<%s>' % param.typ
 
             if param.multiple:
                 cur_kwargs['action'] = 'append'
@@ -186,3 +249,43 @@ class CLIArgumentParser(argparse.ArgumentParser):
 
             self.add_argument(*cur_args, **cur_kwargs)
 
+    def parse_known_args(self, args=None, namespace=None):
+        """Like `argparse.ArgumentParser.parse_known_args()`, but
+        additionally accepts explicit values for boolean switches
+        given as --flag=true or --flag=false.  (A separate value is not
+        accepted, because it could not be told apart from a positional
+        argument.)"""
+        if args is None:
+            args = sys.argv[1:]
+
+        explicit = {}
+        remaining = []
+        for i, arg in enumerate(args):
+            if arg == '--':
+                remaining.extend(args[i:])
+                break
+            option_string, sep, value = arg.partition('=')
+            dest = self._boolean_switches.get(option_string)
+            if dest is not None:
+                if sep:
+                    try:
+                        explicit[dest] = _parseBool(value)
+                    except ValueError as e:
+                        self.error('argument %s: %s' % (option_string, e))
+                    continue
+                explicit.pop(dest, None) # a later bare switch wins
+            remaining.append(arg)
+
+        namespace, extras = super(CLIArgumentParser, self).parse_known_args(
+            remaining, namespace)
+        for dest, value in explicit.items():
+            setattr(namespace, dest, value)
+        return namespace, extras
+
+    def write_return_parameters(self, args, values):
+        """Write the given values of simple output parameters (dict
+        mapping names to python values) to the file given via
+        --returnparameterfile in the parsed `args` (if any)."""
+        filename = getattr(args, 'returnParameterFile', None)
+        if filename:
+            writeReturnParameterFile(filename, values, self._return_params)
@@ -0,0 +1,146 @@
+import os, json, hashlib, logging, collections
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .execution import CLIExecution, CLIExecutionResult
+
+logger = logging.getLogger(__name__)
+
+
+def batchJobKey(values):
+    """Return a string identifying the given parameter values, used
+    for recognizing already completed jobs in a checkpoint file."""
+    data = json.dumps(values, sort_keys = True, default = str)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def _readCheckpoint(filename):
+    """Return dict mapping the keys of completed jobs to their records."""
+    result = {}
+    if not os.path.exists(filename):
+        return result
+    with open(filename) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                result[record['key']] = record
+            except (ValueError, KeyError, TypeError):
+                pass # e.g. truncated last line after a crash
+    return result
+
+
+def _checkpointRecord(index, key, result):
+    return json.dumps(dict(index = index, key = key, command = result.command,
+                           outputs = result.outputs), default = str)
+
+
+def _restoredResult(record):
+    """Return `CLIExecutionResult` for a job completed in an earlier
+    call (without stdout, stderr and resource usage), or None for
+    records without outputs."""
+    if record.get('outputs') is None:
+        return None
+    return CLIExecutionResult(record['command'], 0, b'', b'', record['outputs'])
+
+
+def _runWithRetries(execution, values, retries, kwargs):
+    for attempt in range(retries + 1):
+        try:
+            result = execution.run(values, **kwargs)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            logger.warning("%s failed (%s), retrying" % (execution.module.name, e))
+            continue
+        if not result.exitCode or attempt == retries:
+            return result
+        logger.warning("%s failed (exit code %d), retrying" % (
+            execution.module.name, result.exitCode))
+        result.cleanup()
+
+
+def runBatch(module, parameterSets, maxWorkers = None, retries = 0, checkpoint = None, **kwargs):
+    """Generator that runs the given CLI module once for each element
+    of `parameterSets` (an iterable of dicts as accepted by
+    `CLIExecution.run()`), with up to `maxWorkers` (default: number of
+    CPUs) processes running concurrently.
+
+    Yields (index, result, error) tuples in the order in which the
+    jobs finish, where `index` is the position within
+    `parameterSets`, and either `result` is a `CLIExecutionResult` or
+    `error` is the exception that prevented running the job.  Jobs
+    that exit with non-zero exit code or raise are retried up to
+    `retries` times.
+
+    If `checkpoint` is given, the keys (see `batchJobKey()`) of
+    successfully completed jobs are appended to that file together
+    with their command lines and outputs, so an interrupted batch can
+    be resumed by calling runBatch() with the same arguments again:
+    jobs that are already recorded there are not run again, but
+    yielded with a `CLIExecutionResult` restored from the record
+    (with empty stdout and stderr and without `resourceUsage`).  Note
+    that automatically allocated output files of such jobs may no
+    longer exist (e.g. after `CLIExecutionResult.cleanup()`), so pass
+    explicit paths for output files that are needed after resuming.
+
+    `module` may also be a `CLIExecution`; any kwargs are passed on to
+    `CLIExecution.run()`.
+    """
+    execution = module if isinstance(module, CLIExecution) else CLIExecution(module)
+    maxWorkers = maxWorkers or os.cpu_count() or 1
+
+    completed = _readCheckpoint(checkpoint) if checkpoint else {}
+    checkpointFile = open(checkpoint, 'a') if checkpoint else None
+
+    jobs = iter(enumerate(parameterSets))
+    running = {}
+    restored = collections.deque() # (index, result) of jobs completed in an earlier call
+
+    def submitNext(pool):
+        for index, values in jobs:
+            key = batchJobKey(values)
+            if key in completed:
+                result = _restoredResult(completed[key])
+                if result is not None:
+                    restored.append((index, result))
+                continue
+            future = pool.submit(_runWithRetries, execution, values, retries, kwargs)
+            running[future] = (index, key)
+            return True
+        return False
+
+    try:
+        with ThreadPoolExecutor(max_workers = maxWorkers) as pool:
+            try:
+                # keep the queue short, so that parameterSets may be a lazy iterable:
+                while len(running) < 2 * maxWorkers and submitNext(pool):
+                    pass
+                while running or restored:
+                    while restored:
+                        index, result = restored.popleft()
+                        yield index, result, None
+                    if not running:
+                        break
+                    done, _ = wait(running, return_when = FIRST_COMPLETED)
+                    for future in done:
+                        index, key = running.pop(future)
+                        submitNext(pool)
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            yield index, None, e
+                            continue
+                        if checkpointFile is not None and not result.exitCode:
+                            checkpointFile.write(_checkpointRecord(index, key, result) + '\n')
+                            checkpointFile.flush()
+                        yield index, result, None
+            finally:
+                # consumer stopped early (or failed): do not start the
+                # queued jobs, only wait for the running ones
+                for future in running:
+                    future.cancel()
+    finally:
+        for future in running:
+            if not future.cancelled() and future.exception() is None:
+                future.result().cleanup() # never yielded
+        if checkpointFile is not None:
+            checkpointFile.close()
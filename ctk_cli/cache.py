@@ -0,0 +1,211 @@
+import os, time, hashlib, logging, tempfile
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+
+def defaultCacheDirectory(*subdirs):
+    """Return the default base directory for ctk-cli's persistent
+    caches, i.e. $XDG_CACHE_HOME/ctk-cli (falling back to
+    ~/.cache/ctk-cli), optionally extended by `subdirs`."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'ctk-cli', *subdirs)
+
+
+def statSignature(path):
+    """Return a tuple identifying the current state of the file at
+    `path` (resolved path, size, mtime, inode).  The signature changes
+    whenever the file is replaced or rewritten."""
+    st = os.stat(path)
+    mtime = getattr(st, 'st_mtime_ns', None)
+    if mtime is None:
+        mtime = st.st_mtime
+    return (os.path.realpath(path), st.st_size, mtime, st.st_ino)
+
+
+def _hexdigest(*parts):
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(repr(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def _atomicWrite(filename, data):
+    """Write `data` (bytes) to `filename` such that concurrent readers
+    either see the old or the complete new file, never a partial one."""
+    fd, tmpFilename = tempfile.mkstemp('.tmp', dir = os.path.dirname(filename))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        replace = getattr(os, 'replace', os.rename)
+        replace(tmpFilename, filename)
+    except:
+        try:
+            os.unlink(tmpFilename)
+        except OSError:
+            pass
+        raise
+
+
+class XMLDescriptionCache(object):
+    """Persistent on-disk cache for the --xml descriptions of CLI
+    executables, which saves spawning the executables (and possibly
+    the Slicer launcher) just for querying their interface.
+
+    Entries are keyed by the executable's path, size, mtime and inode
+    as well as the `env` used for calling it, so a rebuilt executable
+    will never be served a stale description.  Entries are written
+    atomically, so several processes may safely share one cache
+    directory.
+
+    :param directory: base directory of the cache (default:
+        $XDG_CACHE_HOME/ctk-cli/xml)
+    :param maxSize: if given, `evict()` removes least recently used
+        entries until the total size is at most `maxSize` bytes
+    :param maxAge: if given, `evict()` removes entries that have not
+        been used for more than `maxAge` seconds
+
+    Since evicting has to stat every entry, `put()` evicts only when
+    the total size (as last scanned plus what has been stored since)
+    exceeds `maxSize`, or `EVICTION_INTERVAL` seconds after the last
+    eviction; it then shrinks the cache to `EVICTION_HEADROOM` times
+    `maxSize`.
+    """
+
+    SUFFIX = '.xml'
+
+    EVICTION_INTERVAL = 60
+
+    EVICTION_HEADROOM = 0.9
+
+    def __init__(self, directory = None, maxSize = None, maxAge = None):
+        self.directory = directory or defaultCacheDirectory('xml')
+        self.maxSize = maxSize
+        self.maxAge = maxAge
+        self._size = None # estimated total size, None before first eviction
+        self._lastEviction = None
+
+    def __repr__(self):
+        return '<XMLDescriptionCache %r>' % (self.directory, )
+
+    def _entryDirectory(self, cliExecutable):
+        return os.path.join(self.directory, _hexdigest(os.path.realpath(cliExecutable)))
+
+    def _entryFilename(self, cliExecutable, env):
+        envKey = sorted(env.items()) if env is not None else None
+        return os.path.join(self._entryDirectory(cliExecutable),
+                            _hexdigest(statSignature(cliExecutable), envKey) + self.SUFFIX)
+
+    def get(self, cliExecutable, env = None):
+        """Return cached ElementTree for the given executable, or None
+        if there is no valid entry."""
+        try:
+            filename = self._entryFilename(cliExecutable, env)
+            with open(filename, 'rb') as f:
+                result = ET.parse(f)
+        except (OSError, IOError):
+            return None
+        except ET.ParseError:
+            logger.warning("Ignoring corrupt cache entry %r" % (filename, ))
+            return None
+        try:
+            os.utime(filename, None) # mark as recently used
+        except OSError:
+            pass
+        return result
+
+    def put(self, cliExecutable, elementTree, env = None):
+        """Store the ElementTree describing the given executable.
+        Previous entries for the same path (i.e. for older builds of
+        the executable, or different `env`) are kept until evicted."""
+        filename = self._entryFilename(cliExecutable, env)
+        entryDirectory = os.path.dirname(filename)
+        if not os.path.isdir(entryDirectory):
+            try:
+                os.makedirs(entryDirectory)
+            except OSError:
+                if not os.path.isdir(entryDirectory): # lost a race otherwise
+                    raise
+        data = ET.tostring(elementTree.getroot())
+        _atomicWrite(filename, data)
+        if self.maxSize is not None or self.maxAge is not None:
+            if self._size is not None:
+                self._size += len(data)
+            if (self._lastEviction is None or
+                    time.time() - self._lastEviction > self.EVICTION_INTERVAL or
+                    (self.maxSize is not None and self._size > self.maxSize)):
+                # leave some headroom, so that the next put() does not
+                # have to evict again:
+                self._evict(int(self.maxSize * self.EVICTION_HEADROOM)
+                            if self.maxSize is not None else None)
+
+    def invalidate(self, cliExecutable = None):
+        """Remove all cached entries for the given executable, or the
+        complete cache if `cliExecutable` is None."""
+        if cliExecutable is None:
+            filenames = [filename for filename, size, atime in self._entries()]
+        else:
+            entryDirectory = self._entryDirectory(cliExecutable)
+            filenames = [os.path.join(entryDirectory, fn)
+                         for fn in self._listdir(entryDirectory)]
+        for filename in filenames:
+            self._remove(filename)
+
+    def evict(self):
+        """Remove entries according to `maxAge` and `maxSize`."""
+        self._evict(self.maxSize)
+
+    def _evict(self, targetSize):
+        """Remove entries older than `maxAge` and least recently used
+        entries until the total size is at most `targetSize`."""
+        entries = self._entries()
+        now = time.time()
+        self._lastEviction = now
+        if self.maxAge is not None:
+            for filename, size, atime in entries:
+                if now - atime > self.maxAge:
+                    self._remove(filename)
+            entries = [e for e in entries if now - e[2] <= self.maxAge]
+        totalSize = 0
+        entries.sort(key = lambda e: e[2], reverse = True)
+        for filename, size, atime in entries:
+            if targetSize is not None and totalSize + size > targetSize:
+                self._remove(filename)
+            else:
+                totalSize += size
+        self._size = totalSize
+
+    def _entries(self):
+        """Return list of (filename, size, last use) tuples."""
+        result = []
+        for entryDirectory in self._listdir(self.directory):
+            entryDirectory = os.path.join(self.directory, entryDirectory)
+            for fn in self._listdir(entryDirectory):
+                if not fn.endswith(self.SUFFIX):
+                    continue
+                filename = os.path.join(entryDirectory, fn)
+                try:
+                    st = os.stat(filename)
+                except OSError:
+                    continue # removed concurrently
+                result.append((filename, st.st_size, st.st_mtime))
+        return result
+
+    @staticmethod
+    def _listdir(directory):
+        try:
+            return os.listdir(directory)
+        except OSError:
+            return []
+
+    @staticmethod
+    def _remove(filename):
+        try:
+            os.unlink(filename)
+        except OSError:
+            pass # removed concurrently
+        try:
+            os.rmdir(os.path.dirname(filename))
+        except OSError:
+            pass # not empty
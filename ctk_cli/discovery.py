@@ -0,0 +1,222 @@
+import os, glob, logging, threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .execution import isCLIExecutable, listCLIExecutables
+from .module import CLIModule
+
+logger = logging.getLogger(__name__)
+
+
+class CLIDiscoveryResult(dict):
+    """Mapping from module names to `CLIModule` instances, as returned
+    by `discoverCLIModules()`.  The `failures` attribute maps the paths
+    of executables that could not be described to the corresponding
+    exceptions."""
+
+    __slots__ = ('failures', )
+
+    def __init__(self):
+        super(CLIDiscoveryResult, self).__init__()
+        self.failures = {}
+
+
+def _describe(path, env, cache, timeout, lazy):
+    return CLIModule(path, env = env, cache = cache, timeout = timeout, lazy = lazy)
+
+
+def _describeAll(paths, maxWorkers, env, cache, timeout, lazy):
+    """Describe the given executables concurrently; yields (path,
+    module, exception) tuples in the order of `paths` (with module or
+    exception being None)."""
+    if not paths:
+        return
+    maxWorkers = maxWorkers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers = min(maxWorkers, len(paths))) as pool:
+        futures = [(path, pool.submit(_describe, path, env, cache, timeout, lazy))
+                   for path in paths]
+        for path, future in futures:
+            try:
+                module = future.result()
+            except Exception as e:
+                logger.warning("Could not describe CLI %r: %s" % (path, e))
+                yield path, None, e
+                continue
+            yield path, module, None
+
+
+def _addModule(result, module, log = logger.warning):
+    if module.name in result:
+        log("Ignoring %r (module %r already found in %r)" % (
+            module.path, module.name, result[module.name].path))
+        return
+    result[module.name] = module
+
+
+def discoverCLIModules(baseDirs, maxWorkers = None, timeout = None, env = None, cache = None,
+                       lazy = False):
+    """Find all CLI executables within the given directory (or list of
+    directories) using `listCLIExecutables()`, and fetch and parse
+    their descriptions concurrently.
+
+    Since describing a CLI mostly means waiting for a child process,
+    up to `maxWorkers` (default: number of CPUs) executables are
+    queried in parallel.  `timeout`, `env` and `cache` are passed on
+    to `getXMLDescription()` for each executable.  With `lazy` set,
+    the modules' parameter groups are parsed on first access only
+    (see `CLIModule`).
+
+    Returns a `CLIDiscoveryResult` mapping module names to `CLIModule`
+    instances.  Executables that fail (non-zero exit code, timeout,
+    invalid XML, ...) are logged and reported in its `failures`
+    attribute instead of aborting the whole discovery.  If the same
+    module name is found in several directories, the first one (in
+    the order of `baseDirs`) wins.
+    """
+    if isinstance(baseDirs, str):
+        baseDirs = [baseDirs]
+
+    paths = []
+    for baseDir in baseDirs:
+        paths.extend(sorted(listCLIExecutables(baseDir)))
+
+    result = CLIDiscoveryResult()
+    for path, module, error in _describeAll(paths, maxWorkers, env, cache, timeout, lazy):
+        if error is not None:
+            result.failures[path] = error
+        else:
+            _addModule(result, module)
+    return result
+
+
+def slicerCLIDirectories(slicerRoot):
+    """Return the CLI module directories of the Slicer installation in
+    `slicerRoot`, i.e. lib/Slicer-*/cli-modules and those of installed
+    extensions (Extensions-*/*/lib/Slicer-*/cli-modules)."""
+    patterns = [os.path.join(slicerRoot, 'lib', 'Slicer-*', 'cli-modules'),
+                os.path.join(slicerRoot, 'Extensions-*', '*', 'lib', 'Slicer-*', 'cli-modules')]
+    return [path for pattern in patterns for path in sorted(glob.glob(pattern))
+            if os.path.isdir(path)]
+
+
+class CLICatalog(CLIDiscoveryResult):
+    """Persistent mapping from module names to `CLIModule` instances for
+    all CLI executables within several directories, which can be
+    updated cheaply with `rescan()`.
+
+    `baseDirs` are searched like in `discoverCLIModules()`, and each
+    of `slicerRoots` contributes its `slicerCLIDirectories()` (which
+    are re-evaluated on each rescan, so that newly installed
+    extensions are found).  Directories are listed with os.scandir(),
+    and only executables that are new or whose stat signature (size,
+    mtime, inode, mode) changed are described again; the others keep
+    their `CLIModule` (or their failure, which is thus not retried
+    until the executable changes).  The remaining arguments are
+    passed on to `discoverCLIModules()`.
+
+    >>> catalog = CLICatalog(['/opt/cli-modules'], slicerRoots = ['/opt/Slicer'])
+    >>> catalog.rescan()
+    >>> catalog['AddScalarVolumes']
+    <CLIModule 'AddScalarVolumes'>
+    """
+
+    __slots__ = ('baseDirs', 'slicerRoots', 'maxWorkers', 'timeout', 'env', 'cache', 'lazy',
+                 '_entries', '_lock')
+
+    def __init__(self, baseDirs = (), slicerRoots = (), maxWorkers = None, timeout = None,
+                 env = None, cache = None, lazy = False):
+        super(CLICatalog, self).__init__()
+        if isinstance(baseDirs, str):
+            baseDirs = [baseDirs]
+        if isinstance(slicerRoots, str):
+            slicerRoots = [slicerRoots]
+        self.baseDirs = list(baseDirs)
+        self.slicerRoots = list(slicerRoots)
+        self.maxWorkers = maxWorkers
+        self.timeout = timeout
+        self.env = env
+        self.cache = cache
+        self.lazy = lazy
+        self._entries = {} # directory -> path -> (signature, module, exception)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<CLICatalog (%d modules)>' % (len(self), )
+
+    def directories(self):
+        """Return list of all directories to be scanned, in order of precedence."""
+        result = list(self.baseDirs)
+        for slicerRoot in self.slicerRoots:
+            result.extend(slicerCLIDirectories(slicerRoot))
+        return result
+
+    @staticmethod
+    def _scan(directory, previous, changed):
+        """Return (entries, paths) for `directory`, with `entries`
+        mapping the paths of all files to (signature, module,
+        exception) tuples (taken from `previous` if still valid) and
+        `paths` the sorted list of CLI executables.  Appends the paths
+        of CLIs that need to be described to `changed`."""
+        entries, paths = {}, []
+        try:
+            dirEntries = list(os.scandir(directory))
+        except OSError:
+            return entries, paths
+        for entry in dirEntries:
+            if entry.name.startswith('.'):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            signature = (st.st_size, st.st_mtime_ns, st.st_ino, st.st_mode)
+            known = previous.get(entry.path)
+            if known is not None and known[0] == signature:
+                entries[entry.path] = known
+                if known[1] is not None or known[2] is not None:
+                    paths.append(entry.path)
+                continue
+            entries[entry.path] = (signature, None, None)
+            if isCLIExecutable(entry.path):
+                changed.append(entry.path)
+                paths.append(entry.path)
+        paths.sort()
+        return entries, paths
+
+    def rescan(self):
+        """Update the catalog from the file system.  Returns the list
+        of paths that were (re)described."""
+        with self._lock:
+            entries = {}
+            changed = []
+            paths = []
+            for directory in map(os.path.normpath, self.directories()):
+                if directory not in entries:
+                    entries[directory], dirPaths = self._scan(
+                        directory, self._entries.get(directory, {}), changed)
+                    paths.extend(dirPaths)
+
+            for path, module, error in _describeAll(changed, self.maxWorkers, self.env,
+                                                    self.cache, self.timeout, self.lazy):
+                dirEntries = entries[os.path.dirname(path)]
+                dirEntries[path] = (dirEntries[path][0], module, error)
+
+            # build the new mapping first and apply only the differences,
+            # so that concurrent readers never see a partial catalog:
+            updated = CLIDiscoveryResult()
+            for path in paths:
+                _, module, error = entries[os.path.dirname(path)][path]
+                if error is not None:
+                    updated.failures[path] = error
+                else:
+                    _addModule(updated, module, logger.debug)
+
+            self._entries = entries
+            for name, module in updated.items():
+                if self.get(name) is not module:
+                    self[name] = module
+            for name in [name for name in self if name not in updated]:
+                del self[name]
+            self.failures = updated.failures
+            return changed
@@ -1,9 +1,21 @@
-import os, sys, glob, logging, subprocess, tempfile, re
+import os, sys, json, time, logging, subprocess, threading, signal, tempfile, re
 import xml.etree.ElementTree as ET
 
+from . import instrumentation
+from .return_parameters import readReturnParameterFile
+from .scratch import ScratchDirectory
+from .progress import CLIProgressParser
+from .cache import statSignature
+
 logger = logging.getLogger(__name__)
 
 
+class CLITimeoutError(RuntimeError):
+    """Raised if a CLI process did not finish within the given timeout
+    (the process has been killed when this is raised)."""
+    pass
+
+
 def isCLIExecutable(filePath):
     """Test whether given `filePath` is an executable.  Does not really
     check whether the executable is a CLI (e.g. whether it supports
@@ -28,9 +40,13 @@ def isCLIExecutable(filePath):
 
 def listCLIExecutables(baseDir):
     """Return list of paths to valid CLI executables within baseDir (non-recursively).
-    This calls `isCLIExecutable()` on all files within `baseDir`."""
-    return [path for path in glob.glob(os.path.join(os.path.normpath(baseDir), '*'))
-            if isCLIExecutable(path)]
+    This calls `isCLIExecutable()` on all (non-hidden) files within `baseDir`."""
+    try:
+        entries = list(os.scandir(os.path.normpath(baseDir)))
+    except OSError:
+        return []
+    return [entry.path for entry in entries
+            if not entry.name.startswith('.') and entry.is_file() and isCLIExecutable(entry.path)]
 
 
 re_slicerSubPath = '(/Extensions-[0-9]*/.*)?/lib/Slicer-[0-9.]*/cli-modules/.*'
@@ -38,22 +54,10 @@ if sys.platform.startswith('win'):
     re_slicerSubPath = re_slicerSubPath.replace('/', r'[/\\]')
 re_slicerSubPath = re.compile(re_slicerSubPath)
 
-def popenCLIExecutable(command, **kwargs):
-    """Wrapper around subprocess.Popen constructor that tries to
-    detect Slicer CLI modules and launches them through the Slicer
-    launcher in order to prevent potential DLL dependency issues.
-
-    Any kwargs are passed on to subprocess.Popen().
-
-    If you ever try to use this function to run a CLI, you might want to
-    take a look at
-    https://github.com/hmeine/MeVisLab-CLI/blob/master/Modules/Macros/CTK_CLI/CLIModuleBackend.py
-    (in particular, the CLIExecution class.)
-    Ideally, more of that code would be extracted and moved here, but
-    I have not gotten around to doing that yet.
-    """
-
-    cliExecutable = command[0]
+def slicerLauncher(cliExecutable):
+    """Return the path of the Slicer launcher that sets up the runtime
+    environment for the given CLI executable, or None if it does not
+    look like a Slicer CLI module."""
 
     # hack (at least, this does not scale to other module sources):
     # detect Slicer modules and run through wrapper script setting up
@@ -64,33 +68,690 @@ def popenCLIExecutable(command, **kwargs):
         if sys.platform.startswith('win'):
             wrapper += '.exe'
         if os.path.exists(wrapper):
-            command = [wrapper, '--launcher-no-splash', '--launch'] + command
+            return wrapper
+    return None
+
+
+def wrapCLICommand(command):
+    """Return the command line that should actually be executed for
+    running the given command (list of executable path and arguments).
+    Slicer CLI modules are detected and wrapped such that they are
+    launched through the Slicer launcher, in order to prevent potential
+    DLL dependency issues; other commands are returned unchanged."""
+
+    wrapper = slicerLauncher(command[0])
+    if wrapper is not None:
+        command = [wrapper, '--launcher-no-splash', '--launch'] + list(command)
+    return command
+
+
+class LauncherEnvironmentCache(object):
+    """Cache of the runtime environments set up by Slicer launchers.
+
+    Instead of starting every Slicer CLI module through the launcher
+    (see `wrapCLICommand()`), the launcher of each installation is
+    asked once for the environment it computes, and CLI modules are
+    then spawned directly with that environment.  An entry is
+    recomputed when the launcher or its SlicerLauncherSettings.ini
+    changes, or after `invalidate()`.  Entries also depend on the `env`
+    passed for spawning; with env=None, the environment of the
+    current process at the time of the first query is used.
+
+    Enable with `setLauncherEnvironmentCache()`.  `python` is the
+    interpreter used for printing the environment from within the
+    launcher (default: sys.executable)."""
+
+    ENVIRONMENT_SCRIPT = 'import os, sys, json; sys.stdout.write(json.dumps(dict(os.environ)))'
+
+    def __init__(self, python = None):
+        self.python = python or sys.executable
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def __repr__(self):
+        return '<LauncherEnvironmentCache (%d entries)>' % (len(self._entries), )
+
+    @staticmethod
+    def _signature(launcher):
+        result = []
+        launcherDir = os.path.dirname(launcher)
+        for path in (launcher,
+                     os.path.join(launcherDir, 'SlicerLauncherSettings.ini'),
+                     os.path.join(launcherDir, 'bin', 'SlicerLauncherSettings.ini')):
+            try:
+                result.append(statSignature(path))
+            except OSError:
+                result.append(None)
+        return tuple(result)
+
+    def environment(self, launcher, env = None):
+        """Return environment (dict) set up by the given launcher,
+        querying the launcher only if there is no valid cache entry."""
+        key = (os.path.realpath(launcher), tuple(sorted(env.items())) if env is not None else None)
+        signature = self._signature(launcher)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        # (-I: do not let e.g. PYTHONHOME from Slicer affect the interpreter)
+        output = subprocess.check_output(
+            [launcher, '--launcher-no-splash', '--launch',
+             self.python, '-I', '-c', self.ENVIRONMENT_SCRIPT], env = env)
+        environment = json.loads(output.decode('utf-8'))
+
+        with self._lock:
+            self._entries[key] = (signature, environment)
+        return environment
+
+    def invalidate(self, launcher = None):
+        """Forget the environment(s) of the given launcher, or all."""
+        with self._lock:
+            if launcher is None:
+                self._entries.clear()
+            else:
+                launcher = os.path.realpath(launcher)
+                for key in [key for key in self._entries if key[0] == launcher]:
+                    del self._entries[key]
+
+
+_launcherEnvironmentCache = None
+
+def setLauncherEnvironmentCache(cache):
+    """Enable spawning Slicer CLI modules directly with the launcher
+    environment from the given `LauncherEnvironmentCache`, or disable
+    it again (and always go through the launcher) by passing None."""
+    global _launcherEnvironmentCache
+    _launcherEnvironmentCache = cache
+
+
+def prepareCLICommand(command, kwargs):
+    """Return (command, kwargs) with which the given command should be
+    spawned.  Slicer CLI modules are either wrapped such that they are
+    started through the Slicer launcher (see `wrapCLICommand()`), or
+    get the launcher's environment passed via `env` if a
+    `LauncherEnvironmentCache` is enabled (the given kwargs dict is not
+    modified)."""
 
-    return subprocess.Popen(command, **kwargs)
+    cache = _launcherEnvironmentCache
+    if cache is not None:
+        launcher = slicerLauncher(command[0])
+        if launcher is None:
+            return command, kwargs
+        try:
+            environment = cache.environment(launcher, kwargs.get('env'))
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+            logger.warning("Could not query environment from %s (%s), using launcher" % (launcher, e))
+        else:
+            kwargs = dict(kwargs)
+            kwargs['env'] = environment
+            return list(command), kwargs
 
+    return wrapCLICommand(command), kwargs
 
-def getXMLDescription(cliExecutable, **kwargs):
+
+def popenCLIExecutable(command, **kwargs):
+    """Wrapper around subprocess.Popen constructor that tries to
+    detect Slicer CLI modules and launches them through the Slicer
+    launcher in order to prevent potential DLL dependency issues
+    (see `prepareCLICommand()`).
+
+    Any kwargs are passed on to subprocess.Popen().
+
+    If you ever try to use this function to run a CLI, you might want to
+    take a look at the `CLIExecution` class, which takes care of
+    building the command line from parameter values, of temporary
+    output files and of return parameters.
+    """
+
+    if not instrumentation._listeners:
+        command, kwargs = prepareCLICommand(command, kwargs)
+        return subprocess.Popen(command, **kwargs)
+
+    start = instrumentation.clock()
+    preparedCommand, kwargs = prepareCLICommand(command, kwargs)
+    result = subprocess.Popen(preparedCommand, **kwargs)
+    instrumentation.emit('spawn', os.path.basename(command[0]), instrumentation.clock() - start,
+                         launcher = preparedCommand[0] != command[0])
+    return result
+
+
+def killProcess(p):
+    """Kill the given process (a subprocess.Popen or
+    asyncio.subprocess.Process) immediately.  If it leads its own
+    process group (see `start_new_session`), the whole group is
+    killed, i.e. including the CLI started by the Slicer launcher and
+    any processes spawned by the CLI."""
+    try:
+        if os.name == 'posix' and os.getpgid(p.pid) == p.pid:
+            os.killpg(p.pid, signal.SIGKILL)
+        else:
+            p.kill()
+    except OSError:
+        pass # already gone
+
+
+class _ProcessTimeout(object):
+    """Kills the given process (see `killProcess()`) after `timeout`
+    seconds, unless `cancel()` is called first.  `cancel()` must be
+    called once the process has exited but before it is reaped (see
+    `_waitForExit()`), so that the timer can never kill a reused pid;
+    `timedOut` is set only if the process was killed while running."""
+
+    __slots__ = ('process', 'timedOut', '_timer', '_lock', '_exited')
+
+    def __init__(self, process, timeout):
+        self.process = process
+        self.timedOut = False
+        self._lock = threading.Lock()
+        self._exited = False
+        self._timer = threading.Timer(timeout, self._kill)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _kill(self):
+        with self._lock:
+            if self._exited:
+                return
+            self.timedOut = True
+            killProcess(self.process)
+
+    def cancel(self):
+        with self._lock:
+            self._exited = True
+        self._timer.cancel()
+
+
+def _waitForExit(p):
+    """Wait until the given process has exited, but (where supported)
+    without reaping it, so its pid cannot be reused yet.  Where
+    os.waitid() is missing, the process is reaped with p.wait(), so it
+    must not be waited for by pid afterwards."""
+    if hasattr(os, 'waitid'):
+        os.waitid(os.P_PID, p.pid, os.WEXITED | os.WNOWAIT)
+    else:
+        p.wait()
+
+
+_PIPE_CHUNK_SIZE = 65536
+
+def _relayStderr(stream, name):
+    for line in iter(stream.readline, b''):
+        logger.warning('%s: %s' % (name, line.decode('utf-8', 'replace').rstrip('\r\n')))
+
+
+def _putXMLDescription(cache, cliExecutable, elementTree, env):
+    """Store a freshly fetched description in `cache`; failing to do
+    so (e.g. because the cache directory is not writable) must not
+    fail the caller."""
+    try:
+        cache.put(cliExecutable, elementTree, env = env)
+    except (OSError, IOError) as e:
+        logger.debug("Could not store XML description of %r in %r: %s" % (
+            cliExecutable, cache, e))
+
+
+def getXMLDescription(cliExecutable, cache = None, timeout = None, **kwargs):
     """Call given cliExecutable with --xml and return xml ElementTree
-    representation of standard output.
+    representation of standard output.  The output is parsed
+    incrementally while the executable is running, and anything it
+    writes to stderr is relayed to the logger line by line.
+
+    If `timeout` (in seconds) is given and the executable does not
+    finish in time, it is killed and a `CLITimeoutError` is raised.
+
+    If an `XMLDescriptionCache` is passed as `cache`, a valid cached
+    description is returned without spawning the executable, and
+    freshly fetched descriptions are stored in the cache.
 
     Any kwargs are passed on to subprocess.Popen() (via popenCLIExecutable())."""
 
+    if cache is not None:
+        start = instrumentation.clock()
+        result = cache.get(cliExecutable, env = kwargs.get('env'))
+        if result is not None:
+            if instrumentation._listeners:
+                instrumentation.emit('xml-cache-hit', os.path.basename(cliExecutable),
+                                     instrumentation.clock() - start)
+            return result
+        result = getXMLDescription(cliExecutable, timeout = timeout, **kwargs)
+        _putXMLDescription(cache, cliExecutable, result, kwargs.get('env'))
+        return result
+
     command = [cliExecutable, '--xml']
-    
-    stdout, stdoutFilename = tempfile.mkstemp('.stdout')
-    stderr, stderrFilename = tempfile.mkstemp('.stderr')
+    name = os.path.basename(cliExecutable)
+
+    if os.name == 'posix':
+        # run in own process group, so that grandchildren (which might
+        # keep the pipes open) can be killed, too:
+        kwargs.setdefault('start_new_session', True)
+
+    start = instrumentation.clock()
+    parseDuration = 0.0
+
+    p = popenCLIExecutable(command, stdout = subprocess.PIPE, stderr = subprocess.PIPE, **kwargs)
+
+    # relay stderr to the logger while the process is running:
+    stderrThread = threading.Thread(target = _relayStderr, args = (p.stderr, name))
+    stderrThread.daemon = True
+    stderrThread.start()
+
+    deadline = _ProcessTimeout(p, timeout) if timeout is not None else None
+
+    # feed stdout into an incremental parser while the process is running:
+    parser = ET.XMLParser()
+    parseError = None
     try:
-        p = popenCLIExecutable(command, stdout = stdout, stderr = stderr, **kwargs)
-        ec = p.wait()
-        with open(stderrFilename) as f:
-            for line in f:
-                logger.warning('%s: %s' % (os.path.basename(cliExecutable), line[:-1]))
-        if ec:
-            raise RuntimeError("Calling %s failed (exit code %d)" % (cliExecutable, ec))
-        with open(stdoutFilename) as f:
-            return ET.parse(f)
+        fd = p.stdout.fileno()
+        while True:
+            chunk = os.read(fd, _PIPE_CHUNK_SIZE)
+            if not chunk:
+                break
+            if parseError is None:
+                parseStart = instrumentation.clock()
+                try:
+                    parser.feed(chunk)
+                except ET.ParseError as e:
+                    parseError = e # keep draining the pipe
+                parseDuration += instrumentation.clock() - parseStart
+        _waitForExit(p)
+    except:
+        if deadline is not None:
+            deadline.cancel()
+        if p.returncode is None:
+            killProcess(p)
+        raise
     finally:
-        os.close(stdout)
-        os.close(stderr)
-        os.unlink(stdoutFilename)
-        os.unlink(stderrFilename)
+        if deadline is not None:
+            deadline.cancel()
+        stderrThread.join()
+        p.stdout.close()
+        p.stderr.close()
+    ec = p.wait()
+
+    if deadline is not None and deadline.timedOut:
+        raise CLITimeoutError("Calling %s timed out after %ss" % (cliExecutable, timeout))
+    if ec:
+        raise RuntimeError("Calling %s failed (exit code %d)" % (cliExecutable, ec))
+    if parseError is not None:
+        raise parseError
+
+    parseStart = instrumentation.clock()
+    result = ET.ElementTree(parser.close())
+    if instrumentation._listeners:
+        end = instrumentation.clock()
+        parseDuration += end - parseStart
+        instrumentation.emit('xml-wait', name, end - start)
+        instrumentation.emit('xml-parse', name, parseDuration)
+    return result
+
+
+class CLIResourceUsage(object):
+    """Resources used by one CLI run: `wallTime`, `userTime` and
+    `systemTime` in seconds and `maxRSS` (peak resident set size) in
+    bytes.  The CPU and memory figures come from wait4() and include
+    all processes waited for by the CLI process (e.g. the CLI started
+    by the Slicer launcher); they are None where not available (e.g.
+    on Windows)."""
+
+    __slots__ = ('wallTime', 'userTime', 'systemTime', 'maxRSS')
+
+    def __init__(self, wallTime, userTime = None, systemTime = None, maxRSS = None):
+        self.wallTime = wallTime
+        self.userTime = userTime
+        self.systemTime = systemTime
+        self.maxRSS = maxRSS
+
+    def __repr__(self):
+        if self.userTime is None:
+            return '<CLIResourceUsage wall %.3fs>' % (self.wallTime, )
+        return '<CLIResourceUsage wall %.3fs, user %.3fs, sys %.3fs, max RSS %d>' % (
+            self.wallTime, self.userTime, self.systemTime, self.maxRSS)
+
+    @classmethod
+    def fromRusage(cls, wallTime, rusage):
+        # ru_maxrss is given in kilobytes, except on macOS
+        maxRSS = rusage.ru_maxrss if sys.platform == 'darwin' else rusage.ru_maxrss * 1024
+        return cls(wallTime, rusage.ru_utime, rusage.ru_stime, maxRSS)
+
+
+def _readAll(stream, chunks):
+    for chunk in iter(lambda: stream.read(_PIPE_CHUNK_SIZE), b''):
+        chunks.append(chunk)
+
+
+def _communicate(p, start, progress = None, deadline = None):
+    """Like p.communicate() (with stdout and stderr being pipes), but
+    reaps the process with wait4() if possible.  If a `progress`
+    callback is given, stdout is passed through a `CLIProgressParser`
+    while the process is running, and the returned stdout lacks the
+    progress fragments.  A `_ProcessTimeout` passed as `deadline` is
+    cancelled before reaping.  Returns (stdout, stderr, resourceUsage)."""
+    stderrChunks = []
+    stderrThread = threading.Thread(target = _readAll, args = (p.stderr, stderrChunks))
+    stderrThread.daemon = True
+    stderrThread.start()
+    try:
+        if progress is None:
+            stdout = p.stdout.read()
+        else:
+            stdoutChunks = []
+            parser = CLIProgressParser(progress, stdoutChunks.append)
+            fd = p.stdout.fileno()
+            for chunk in iter(lambda: os.read(fd, _PIPE_CHUNK_SIZE), b''):
+                parser.feed(chunk)
+            parser.close()
+            stdout = b''.join(stdoutChunks)
+    finally:
+        stderrThread.join()
+        p.stdout.close()
+        p.stderr.close()
+
+    if hasattr(os, 'wait4'):
+        if hasattr(os, 'waitid'):
+            _waitForExit(p)
+            if deadline is not None:
+                deadline.cancel()
+        # (without waitid, e.g. on older macOS, wait4() has to reap
+        # the process before the deadline can be cancelled)
+        _, status, rusage = os.wait4(p.pid, 0)
+        p.returncode = os.waitstatus_to_exitcode(status) if hasattr(os, 'waitstatus_to_exitcode') \
+            else (-os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status))
+        if deadline is not None:
+            deadline.cancel()
+        resourceUsage = CLIResourceUsage.fromRusage(time.time() - start, rusage)
+    else:
+        _waitForExit(p)
+        if deadline is not None:
+            deadline.cancel()
+        p.wait()
+        resourceUsage = CLIResourceUsage(time.time() - start)
+
+    return stdout, b''.join(stderrChunks), resourceUsage
+
+
+class CLIExecutionResult(object):
+    """Result of a `CLIExecution.run()` call.  `outputs` maps the
+    identifiers of all output parameters to their values, i.e. the
+    paths of output files and the parsed return parameters.
+    `scratchDirectory` is the `ScratchDirectory` containing the
+    automatically allocated output files, and `resourceUsage` a
+    `CLIResourceUsage`."""
+
+    __slots__ = ('command', 'exitCode', 'stdout', 'stderr', 'outputs', 'scratchDirectory',
+                 'resourceUsage')
+
+    def __init__(self, command, exitCode, stdout, stderr, outputs, scratchDirectory = None,
+                 resourceUsage = None):
+        self.command = command
+        self.exitCode = exitCode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.outputs = outputs
+        self.scratchDirectory = scratchDirectory
+        self.resourceUsage = resourceUsage
+
+    @property
+    def tempDir(self):
+        """Path of the directory containing automatically allocated
+        output files (None after `cleanup()`)."""
+        if self.scratchDirectory is None:
+            return None
+        return self.scratchDirectory.path
+
+    def __repr__(self):
+        return '<CLIExecutionResult %r (exit code %s)>' % (
+            os.path.basename(self.command[0]), self.exitCode)
+
+    def check(self):
+        """Raise a RuntimeError if the execution failed, return self otherwise."""
+        if self.exitCode:
+            raise RuntimeError("Calling %s failed (exit code %d):\n%s" % (
+                self.command[0], self.exitCode, self.stderr.decode('utf-8', 'replace')))
+        return self
+
+    def cleanup(self):
+        """Remove the automatically created output files (if any),
+        releasing the scratch directory.  Output paths in `outputs`
+        become invalid after this call."""
+        if self.scratchDirectory is not None:
+            self.scratchDirectory.release()
+            self.scratchDirectory = None
+
+
+class CLIExecution(object):
+    """Runs a CLI module (given as `CLIModule`) with parameter values
+    given as python objects.
+
+    The command line layout is derived from the module's
+    `classifyParameters()` once, so a CLIExecution should be reused for
+    running the same module repeatedly.  Values are passed as dict
+    mapping parameter identifiers to python values (as returned by
+    `CLIParameter.parseValue()`, or paths for files, images etc.):
+
+    >>> execution = CLIExecution(CLIModule('/path/to/AddScalar'))
+    >>> result = execution.run(dict(inputVolume = 'in.nrrd', scalar = 2.0))
+    >>> result.check().outputs['outputVolume']
+    '/tmp/ctk-cli-XXXX/outputVolume.nrrd'
+
+    Output files for which no path is given are created within a new
+    scratch directory per run (using the parameter's
+    `defaultExtension()`, see `ctk_cli.scratch`), and simple return
+    parameters are read back
+    via --returnparameterfile.  Boolean options are passed as
+    switches, i.e. their flag is given iff the value is true; since a
+    switch cannot be turned off, passing False for a boolean whose
+    default is true raises a ValueError.
+
+    Values are checked with the parameters' codecs (see
+    `CLIValueCodec`) when building the command line, raising a
+    ValueError for invalid ones, unless `validate` is False.
+    """
+
+    def __init__(self, module, validate = True):
+        self.module = module
+        self.validate = validate
+
+        arguments, options, outputs = module.classifyParameters()
+
+        self._parameters = dict((p.identifier(), p) for p in module.parameters())
+        self._arguments = [(p.identifier(), p, p.codec) for p in arguments]
+        self._options = [(p.identifier(), p, p.longflag or p.flag, p.codec) for p in options]
+        self._outputFiles = [(identifier, p) for identifier, p in self._parameters.items()
+                             if p.channel == 'output' and p.isExternalType()]
+        self._returnParameters = outputs
+
+    def __repr__(self):
+        return '<CLIExecution %r>' % (self.module.name, )
+
+    def commandLine(self, values, returnParameterFile = None):
+        """Return the command (list of strings) for running the module
+        with the given values."""
+        for identifier in values:
+            if identifier not in self._parameters:
+                raise ValueError("%s has no parameter %r" % (self.module.name, identifier))
+
+        command = [self.module.path]
+        validate = self.validate
+
+        for identifier, parameter, flag, codec in self._options:
+            value = values.get(identifier)
+            if value is None:
+                continue
+            if validate:
+                codec.validate(value)
+            if parameter.typ == 'boolean':
+                if value:
+                    command.append(flag)
+                elif parameter.default:
+                    raise ValueError("Cannot pass False for %s of %s, which defaults to true "
+                                     "(only switching it on is possible)" % (
+                                         identifier, self.module.name))
+            elif codec.multiple:
+                for v in value:
+                    command.append(flag)
+                    command.append(codec.format(v))
+            else:
+                command.append(flag)
+                command.append(codec.format(value))
+
+        if returnParameterFile is not None:
+            command.append('--returnparameterfile')
+            command.append(returnParameterFile)
+
+        for identifier, parameter, codec in self._arguments:
+            value = values.get(identifier)
+            if value is None:
+                raise ValueError("Missing value for required argument %r of %s" % (
+                    identifier, self.module.name))
+            if validate:
+                codec.validate(value)
+            if codec.multiple:
+                command.extend(map(codec.format, value))
+            else:
+                command.append(codec.format(value))
+
+        return command
+
+    def invalidParameterSets(self, parameterSets):
+        """Validate many parameter sets (dicts as passed to `run()`,
+        e.g. a sweep to be passed to `runBatch()`) at once, checking
+        each parameter's values in one go (see
+        `CLIValueCodec.invalidIndices()`).  Returns dict mapping the
+        indices of invalid parameter sets to the sorted lists of
+        identifiers with invalid (or unknown) values.  Missing required
+        values are not reported."""
+        columns = {}
+        for index, values in enumerate(parameterSets):
+            for identifier, value in values.items():
+                if value is not None:
+                    indices, column = columns.setdefault(identifier, ([], []))
+                    indices.append(index)
+                    column.append(value)
+
+        result = {}
+        for identifier, (indices, column) in columns.items():
+            parameter = self._parameters.get(identifier)
+            if parameter is None:
+                invalid = range(len(column))
+            else:
+                invalid = parameter.codec.invalidIndices(column)
+            for i in invalid:
+                result.setdefault(indices[i], []).append(identifier)
+        for identifiers in result.values():
+            identifiers.sort()
+        return result
+
+    def _prepareOutputs(self, values, scratchDirectory):
+        """Return copy of `values` with paths for all output files
+        not given by the caller allocated within `scratchDirectory`."""
+        values = dict(values)
+        for identifier, parameter in self._outputFiles:
+            if values.get(identifier) is None:
+                values[identifier] = scratchDirectory.allocate(parameter, identifier)
+        return values
+
+    def run(self, values = None, scratch = None, forkServer = None, timeout = None,
+            progress = None, resultCache = None, **kwargs):
+        """Run the module with the given values (dict mapping parameter
+        identifiers to values) and return a `CLIExecutionResult`.
+        Note that a failing execution does not raise an exception;
+        use `CLIExecutionResult.check()` for that.
+
+        If a `ScratchSpace` is passed as `scratch`, automatically
+        allocated output files are placed in one of its (recycled)
+        directories; otherwise a new temporary directory is created.
+
+        If `timeout` (in seconds) is given and the module does not
+        finish in time, it is killed and a `CLITimeoutError` is raised.
+        On POSIX systems, the module is run in its own process group,
+        which is killed as a whole on timeout or if waiting for it is
+        interrupted (e.g. by KeyboardInterrupt), so that no orphaned
+        processes keep using CPU cores.
+
+        If a `progress` callback is given, it is called with a
+        `CLIProgressEvent` (see `ctk_cli.progress`) for each progress
+        report while the module is running; these reports are then
+        removed from the result's stdout.
+
+        If a `CLIResultCache` is passed as `resultCache` and it has an
+        entry for the module and values, the outputs are restored from
+        it without running anything (with `resourceUsage` being None
+        and `progress` not being called); otherwise, successful results
+        are stored in it.
+
+        If a `CLIForkServerClient` (see `ctk_cli.forkserver`) is passed
+        as `forkServer`, the module is run by that server instead of
+        spawning a new process, the only supported kwarg is `cwd`, and
+        `progress` is called after the module has finished.
+        Otherwise, any kwargs are passed on to subprocess.Popen() (via
+        popenCLIExecutable())."""
+        if scratch is not None:
+            scratchDirectory = scratch.newDirectory()
+        else:
+            scratchDirectory = ScratchDirectory(tempfile.mkdtemp(prefix = 'ctk-cli-'))
+        try:
+            values = self._prepareOutputs(values or {}, scratchDirectory)
+            returnParameterFile = None
+            if self._returnParameters:
+                returnParameterFile = os.path.join(scratchDirectory.path, '.returnparameters')
+
+            command = self.commandLine(values, returnParameterFile)
+            outputPaths = dict((identifier, values[identifier]) for identifier, _ in self._outputFiles)
+
+            cached = None
+            if resultCache is not None:
+                start = instrumentation.clock()
+                cacheKey = resultCache.key(self.module, values, kwargs.get('env'))
+                cached = resultCache.restore(cacheKey, outputPaths, returnParameterFile)
+                if cached is not None and instrumentation._listeners:
+                    instrumentation.emit('result-cache-hit', self.module.name,
+                                         instrumentation.clock() - start)
+
+            start = time.time()
+            if cached is not None:
+                stdout, stderr = cached
+                exitCode = 0
+                resourceUsage = None
+            elif forkServer is not None:
+                exitCode, stdout, stderr, _ = forkServer.run(command[1:], timeout = timeout, **kwargs)
+                resourceUsage = CLIResourceUsage(time.time() - start)
+                if progress is not None:
+                    stdoutChunks = []
+                    parser = CLIProgressParser(progress, stdoutChunks.append)
+                    parser.feed(stdout)
+                    parser.close()
+                    stdout = b''.join(stdoutChunks)
+            else:
+                if os.name == 'posix':
+                    kwargs.setdefault('start_new_session', True)
+                p = popenCLIExecutable(command, stdout = subprocess.PIPE, stderr = subprocess.PIPE, **kwargs)
+                deadline = _ProcessTimeout(p, timeout) if timeout is not None else None
+                try:
+                    stdout, stderr, resourceUsage = _communicate(p, start, progress, deadline)
+                except:
+                    if deadline is not None:
+                        deadline.cancel()
+                    if p.returncode is None:
+                        killProcess(p)
+                    raise
+                if deadline is not None and deadline.timedOut:
+                    raise CLITimeoutError("Calling %s timed out after %ss" % (command[0], timeout))
+                exitCode = p.returncode
+
+            if resultCache is not None and cached is None and exitCode == 0:
+                try:
+                    resultCache.store(cacheKey, stdout, stderr, outputPaths, returnParameterFile)
+                except (OSError, IOError) as e: # e.g. disk full; the result is still valid
+                    logger.warning("Could not store result of %s in %r: %s" % (
+                        self.module.name, resultCache, e))
+
+            outputs = dict(outputPaths)
+            if returnParameterFile is not None and os.path.exists(returnParameterFile):
+                outputs.update(readReturnParameterFile(returnParameterFile, self._returnParameters))
+        except:
+            scratchDirectory.release()
+            raise
+
+        return CLIExecutionResult(command, exitCode, stdout, stderr, outputs, scratchDirectory,
+                                  resourceUsage)
@@ -0,0 +1,280 @@
+"""Warm fork-server mode for python CLIs based on `CLIArgumentParser`.
+
+Python CLIs often spend much more time on interpreter startup, imports
+and parsing their XML description than on their actual work.  A fork
+server pays these costs once: it preloads everything, listens on a
+local Unix socket and forks a child per request, which parses the
+given arguments with the already built parser and runs the CLI's main
+function.  The child's exit code, stdout, stderr and return parameters
+are sent back to the client.  In the CLI script:
+
+>>> def main(args):
+...     ...
+>>> if __name__ == '__main__':
+...     runCLIMain(CLIArgumentParser(), main)
+
+Calling the script with ``--fork-server <socket path>`` then starts a
+server instead of running once; `startForkServer()` does so and returns
+a `CLIForkServerClient`, which can be passed to `CLIExecution.run()`.
+
+Requests run in the server's environment (only the working directory
+is passed), and this module requires a POSIX system.
+"""
+
+import os, sys, json, time, base64, shutil, signal, socket, struct, logging, tempfile, traceback
+
+from .execution import CLITimeoutError, popenCLIExecutable
+from .return_parameters import _readRaw
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct('!I')
+
+
+def _send(connection, message):
+    data = json.dumps(message).encode('utf-8')
+    connection.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _receiveExactly(connection, size):
+    chunks = []
+    while size:
+        chunk = connection.recv(min(size, 65536))
+        if not chunk:
+            raise EOFError("Fork server connection closed unexpectedly")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _receive(connection):
+    size, = _HEADER.unpack(_receiveExactly(connection, _HEADER.size))
+    return json.loads(_receiveExactly(connection, size).decode('utf-8'))
+
+
+def _exitCode(code):
+    """Convert SystemExit.code into an exit code like the interpreter does."""
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    sys.stderr.write('%s\n' % (code, ))
+    return 1
+
+
+class CLIForkServer(object):
+    """Server forking a child per request that runs `main(args)` with
+    `args` parsed by `parser` (a `CLIArgumentParser`).  The return
+    value of `main` is used as exit code if it is an integer."""
+
+    def __init__(self, parser, main, socketPath):
+        self.parser = parser
+        self.main = main
+        self.socketPath = socketPath
+        self._socket = None
+
+    def __repr__(self):
+        return '<CLIForkServer %r>' % (self.socketPath, )
+
+    def listen(self):
+        if os.path.exists(self.socketPath):
+            os.unlink(self.socketPath) # stale socket of a previous server
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(self.socketPath)
+        self._socket.listen(64)
+
+    def serveForever(self):
+        """Accept and serve requests until `close()` is called or the
+        process is terminated (SIGTERM removes the socket, too)."""
+        if self._socket is None:
+            self.listen()
+        # let the kernel reap the children
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            while self._socket is not None:
+                try:
+                    connection, _ = self._socket.accept()
+                except OSError:
+                    if self._socket is None:
+                        break # closed
+                    raise
+                pid = os.fork()
+                if pid == 0:
+                    self._serveChild(connection) # never returns
+                connection.close()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            try:
+                os.unlink(self.socketPath)
+            except OSError:
+                pass
+
+    def _serveChild(self, connection):
+        try:
+            # own process group, so that a timeout can kill any
+            # processes spawned by the request, too:
+            os.setsid()
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            self._socket.close()
+
+            request = _receive(connection)
+            _send(connection, dict(pid = os.getpid()))
+
+            stdout, stderr = tempfile.TemporaryFile(), tempfile.TemporaryFile()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(stdout.fileno(), 1)
+            os.dup2(stderr.fileno(), 2)
+
+            args = None
+            try:
+                if request.get('cwd'):
+                    os.chdir(request['cwd'])
+                sys.argv = sys.argv[:1] + request['argv']
+                args = self.parser.parse_args(request['argv'])
+                result = self.main(args)
+                exitCode = result if isinstance(result, int) else 0
+            except SystemExit as e:
+                exitCode = _exitCode(e.code)
+            except BaseException:
+                traceback.print_exc()
+                exitCode = 1
+            sys.stdout.flush()
+            sys.stderr.flush()
+
+            returnParameters = {}
+            returnParameterFile = getattr(args, 'returnParameterFile', None)
+            if returnParameterFile and os.path.isfile(returnParameterFile):
+                try:
+                    returnParameters = _readRaw(returnParameterFile)
+                except (OSError, IOError, UnicodeDecodeError):
+                    pass # left for the client to notice
+
+            response = dict(exitCode = exitCode, returnParameters = returnParameters)
+            for name, f in (('stdout', stdout), ('stderr', stderr)):
+                f.seek(0)
+                response[name] = base64.b64encode(f.read()).decode('ascii')
+            _send(connection, response)
+        finally:
+            os._exit(0)
+
+
+def runCLIMain(parser, main, argv = None):
+    """Entry point for CLI scripts: run `main(args)` once with `args`
+    parsed from `argv` (default: sys.argv[1:]) and exit, or serve
+    requests if the arguments are ``--fork-server <socket path>``."""
+    if argv is None:
+        argv = sys.argv[1:]
+    if len(argv) == 2 and argv[0] == '--fork-server':
+        CLIForkServer(parser, main, argv[1]).serveForever()
+        sys.exit(0)
+    result = main(parser.parse_args(argv))
+    sys.exit(result if isinstance(result, int) else 0)
+
+
+class CLIForkServerClient(object):
+    """Client for running requests on the `CLIForkServer` listening
+    at `socketPath`.  `process` is the server process if it was started
+    via `startForkServer()`, which is terminated by `close()`."""
+
+    def __init__(self, socketPath, process = None):
+        self.socketPath = socketPath
+        self.process = process
+        self._temporaryDirectory = None
+
+    def __repr__(self):
+        return '<CLIForkServerClient %r>' % (self.socketPath, )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def run(self, argv, cwd = None, timeout = None):
+        """Run the CLI with the given arguments (without the
+        executable) and return (exitCode, stdout, stderr,
+        returnParameters), with the outputs as bytes and the return
+        parameters as dict mapping names to unparsed values.  If
+        `timeout` (in seconds) is given, the child (with all processes
+        in its process group) is killed and `CLITimeoutError` is raised
+        if it does not finish in time."""
+        deadline = time.time() + timeout if timeout is not None else None
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        pid = None
+        try:
+            connection.settimeout(timeout)
+            connection.connect(self.socketPath)
+            _send(connection, dict(argv = list(argv), cwd = cwd or os.getcwd()))
+            pid = _receive(connection)['pid']
+            if deadline is not None:
+                connection.settimeout(max(deadline - time.time(), 0.001))
+            response = _receive(connection)
+        except BaseException as e:
+            if pid is not None:
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except OSError:
+                    pass # already gone
+            if isinstance(e, socket.timeout):
+                raise CLITimeoutError("Fork server request %r timed out after %ss" % (
+                    self.socketPath, timeout))
+            raise
+        finally:
+            connection.close()
+        return (response['exitCode'],
+                base64.b64decode(response['stdout']),
+                base64.b64decode(response['stderr']),
+                response['returnParameters'])
+
+    def close(self):
+        """Terminate the server process (if started by `startForkServer()`)."""
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+            self.process = None
+            if self._temporaryDirectory is not None:
+                shutil.rmtree(self._temporaryDirectory, ignore_errors = True)
+
+
+def startForkServer(cliExecutable, socketPath = None, timeout = 30, **kwargs):
+    """Start the given CLI executable (which must use `runCLIMain()`)
+    as fork server and return a `CLIForkServerClient` once it accepts
+    connections.  Without `socketPath`, a socket in a new temporary
+    directory is used.  Any kwargs are passed on to
+    `popenCLIExecutable()`."""
+    temporaryDirectory = None
+    if socketPath is None:
+        temporaryDirectory = tempfile.mkdtemp(prefix = 'ctk-cli-fork-')
+        socketPath = os.path.join(temporaryDirectory, 'socket')
+    process = popenCLIExecutable([cliExecutable, '--fork-server', socketPath], **kwargs)
+
+    deadline = time.time() + timeout
+    while True:
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socketPath)
+            break
+        except (OSError, IOError):
+            if process.poll() is not None:
+                raise RuntimeError("Fork server %s exited with code %d" % (
+                    cliExecutable, process.returncode))
+            if time.time() > deadline:
+                process.kill()
+                process.wait()
+                raise CLITimeoutError("Fork server %s did not start within %ss" % (
+                    cliExecutable, timeout))
+            time.sleep(0.01)
+        finally:
+            probe.close()
+
+    result = CLIForkServerClient(socketPath, process)
+    result._temporaryDirectory = temporaryDirectory
+    return result
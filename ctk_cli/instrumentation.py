@@ -0,0 +1,126 @@
+"""Opt-in instrumentation of CLI discovery, parsing and process launches.
+
+Register a callback with `addListener()` to receive a `CLIEvent` for
+each of the following operations:
+
+``spawn``
+    creating a CLI process in `popenCLIExecutable()` (details:
+    ``launcher`` tells whether the Slicer launcher was used, as opposed
+    to a cached launcher environment or none at all)
+``xml-wait``
+    running a CLI with --xml in `getXMLDescription()`, from spawn to exit
+``xml-parse``
+    time spent parsing the --xml output (part of ``xml-wait``)
+``xml-cache-hit``
+    looking up a description in an `XMLDescriptionCache` successfully
+``result-cache-hit``
+    restoring the results of `CLIExecution.run()` from a `CLIResultCache`
+``module-parse``
+    `CLIModule` parsing (without the parameter groups in lazy mode)
+``parameters-parse``
+    parsing the parameter groups of a `CLIModule` (part of
+    ``module-parse`` unless in lazy mode)
+
+A `MetricsCollector` aggregates the events per operation and module
+and can export them in the Prometheus text format.  Without listeners,
+the instrumentation costs a single list check per operation.
+"""
+
+import time, threading
+
+from .cache import _atomicWrite
+
+_listeners = []
+
+clock = time.perf_counter
+
+
+class CLIEvent(object):
+    """Timing information about one instrumented operation."""
+
+    __slots__ = ('name', 'module', 'duration', 'details')
+
+    def __init__(self, name, module, duration, details):
+        self.name = name
+        self.module = module
+        self.duration = duration
+        self.details = details
+
+    def __repr__(self):
+        return '<CLIEvent %s %r %.6fs>' % (self.name, self.module, self.duration)
+
+
+def addListener(callback):
+    """Register `callback`, which will be called with a `CLIEvent` after
+    each instrumented operation (possibly from different threads)."""
+    _listeners.append(callback)
+
+def removeListener(callback):
+    _listeners.remove(callback)
+
+def isEnabled():
+    """Return True iff there are any listeners."""
+    return bool(_listeners)
+
+
+def emit(name, module, duration, **details):
+    """Pass a `CLIEvent` with the given values to all listeners."""
+    event = CLIEvent(name, module, duration, details)
+    for listener in list(_listeners):
+        listener(event)
+
+
+class MetricsCollector(object):
+    """Listener that aggregates count, total and maximum duration of
+    all events per (event name, module name):
+
+    >>> metrics = MetricsCollector()
+    >>> addListener(metrics)
+    >>> modules = discoverCLIModules(cliDir)
+    >>> metrics.writePrometheusFile('/var/lib/node_exporter/ctk_cli.prom')
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def __call__(self, event):
+        key = (event.name, event.module)
+        with self._lock:
+            count, total, maximum = self._metrics.get(key, (0, 0.0, 0.0))
+            self._metrics[key] = (count + 1, total + event.duration, max(maximum, event.duration))
+
+    def metrics(self):
+        """Return dict mapping (event name, module name) pairs to
+        (count, total duration, maximum duration) tuples."""
+        with self._lock:
+            return dict(self._metrics)
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+    def prometheusText(self, prefix = 'ctk_cli'):
+        """Return the aggregated metrics in the Prometheus text
+        exposition format."""
+        metrics = sorted(self.metrics().items(), key = lambda item: (item[0][0], item[0][1] or ''))
+
+        def labels(name, module):
+            return '{event="%s",module="%s"}' % (
+                name, (module or '').replace('\\', '\\\\').replace('"', '\\"'))
+
+        lines = ['# HELP %s_duration_seconds Duration of instrumented ctk-cli operations.' % prefix,
+                 '# TYPE %s_duration_seconds summary' % prefix]
+        for (name, module), (count, total, maximum) in metrics:
+            lines.append('%s_duration_seconds_sum%s %r' % (prefix, labels(name, module), total))
+            lines.append('%s_duration_seconds_count%s %d' % (prefix, labels(name, module), count))
+        lines.extend(['# HELP %s_duration_seconds_max Maximum duration of instrumented ctk-cli operations.' % prefix,
+                      '# TYPE %s_duration_seconds_max gauge' % prefix])
+        for (name, module), (count, total, maximum) in metrics:
+            lines.append('%s_duration_seconds_max%s %r' % (prefix, labels(name, module), maximum))
+        return '\n'.join(lines) + '\n'
+
+    def writePrometheusFile(self, filename, prefix = 'ctk_cli'):
+        """Atomically (re)write `filename` with `prometheusText()`,
+        e.g. for node_exporter's textfile collector."""
+        _atomicWrite(filename, self.prometheusText(prefix).encode('utf-8'))
@@ -1,9 +1,10 @@
 # see https://github.com/commontk/CTK/blob/master/Libs/CommandLineModules/Core/Resources/ctkCmdLineModule.xsd
 # for what we aim to be able to parse
 
-import os, logging
+import os, logging, itertools
 import xml.etree.ElementTree as ET
 from .execution import isCLIExecutable, getXMLDescription
+from . import instrumentation
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +21,15 @@ def _parseBool(x):
         return False
     raise ValueError("cannot convert %r to boolean" % (x, ))
 
+def _numpy():
+    """Import numpy on demand (it is an optional dependency, and
+    importing it is relatively expensive)."""
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("NumPy is required for parsing values into arrays")
+    return numpy
+
 def _tag(element):
     """Return element.tag with xmlns stripped away."""
     tag = element.tag
@@ -35,36 +45,171 @@ def _uriPrefix(element):
     return element.tag[:i+1]
 
 
-def _parseElements(self, elementTree, expectedTag = None):
+class CLIParseError(ValueError):
+    """Raised for problems with a CLI description when parsing with
+    the 'strict' diagnostics policy.  The `diagnostic` attribute holds
+    the corresponding `CLIDiagnostic`."""
+
+    def __init__(self, diagnostic):
+        super(CLIParseError, self).__init__(diagnostic.message())
+        self.diagnostic = diagnostic
+
+
+class CLIDiagnostic(object):
+    """Record of a problem found while parsing a CLI description.
+    `code` identifies the kind of problem (see MESSAGES), `element` is
+    the tag of the element in which it was found and `args` holds
+    further details; the human-readable `message()` is only formatted
+    on demand."""
+
+    MESSAGES = {
+        'multiple-elements' : "More than one <%s> found within %r (using only first)",
+        'missing-element' : "Required element %r not found within %r",
+        'unparsed-element' : "Element %r within %r not parsed",
+        'reference-attribute' : "'reference' attribute of %r is not part of the spec yet (CTK issue #623)",
+        'ignored-attribute' : "attribute of %r ignored: %s=%r",
+        'empty-enumeration-element' : "Ignoring empty <element> within <%s>",
+        'unpassable-parameter' : "Parameter %s cannot be passed (missing one of flag, longflag, or index)!",
+        'index-and-flag' : "Parameter '%s' has both index=%d and flag set.",
+        'invalid-default' : "Could not parse default value of <%s> (%s): %s",
+        'invalid-enumeration' : "Problem parsing enumeration element values of <%s> (%s): %s",
+        'missing-enumeration-elements' : "No <element>s found within <%s>",
+        'ignored-enumeration-elements' : "Ignoring <element>s within <%s>",
+        'invalid-constraints' : "Could not parse constraints of <%s> (%s): %s",
+    }
+
+    __slots__ = ('module', 'element', 'code', 'args')
+
+    def __init__(self, module, element, code, args):
+        self.module = module
+        self.element = element
+        self.code = code
+        self.args = args
+
+    def message(self):
+        return self.MESSAGES[self.code] % self.args
+
+    def __str__(self):
+        if self.module is None:
+            return self.message()
+        return '%s: %s' % (self.module, self.message())
+
+    def __repr__(self):
+        return '<CLIDiagnostic %s in <%s>%s>' % (
+            self.code, self.element, ' of %r' % (self.module, ) if self.module else '')
+
+
+class CLIDiagnostics(list):
+    """List of `CLIDiagnostic` records collected while parsing a CLI
+    description, according to one of the following policies:
+
+    'log'
+        record problems and log them as warnings (the default)
+    'collect'
+        only record problems
+    'strict'
+        raise a `CLIParseError` for the first problem
+    'silent'
+        ignore problems completely (fastest)
+    """
+
+    POLICIES = ('log', 'collect', 'strict', 'silent')
+
+    # policy used if none is given explicitly:
+    defaultPolicy = 'log'
+
+    __slots__ = ('module', 'policy')
+
+    def __init__(self, module = None, policy = None):
+        super(CLIDiagnostics, self).__init__()
+        policy = policy or self.defaultPolicy
+        if policy not in self.POLICIES:
+            raise ValueError("unknown diagnostics policy %r (expected one of %s)" % (
+                policy, ', '.join(self.POLICIES)))
+        self.module = module
+        self.policy = policy
+
+    def report(self, element, code, *args):
+        """Handle problem of the given `code` (see CLIDiagnostic.MESSAGES)
+        found within the given element (tag)."""
+        policy = self.policy
+        if policy == 'silent':
+            return
+        diagnostic = CLIDiagnostic(self.module, element, code, args)
+        if policy == 'strict':
+            raise CLIParseError(diagnostic)
+        self.append(diagnostic)
+        if policy == 'log':
+            logger.warning('%s', diagnostic) # (formatted lazily by logging)
+
+    def messages(self):
+        """Return list of formatted messages."""
+        return [str(diagnostic) for diagnostic in self]
+
+
+_elementTables = {}
+
+def _elementTable(cls):
+    """Return (fields, identifiers) for the REQUIRED_ELEMENTS and
+    OPTIONAL_ELEMENTS of the given class, where `fields` is a list of
+    (tagName, identifier, required) tuples and `identifiers` maps tag
+    names to attribute names."""
+    try:
+        return _elementTables[cls]
+    except KeyError:
+        fields = [(tagName, _tagToIdentifier(tagName), tagName in cls.REQUIRED_ELEMENTS)
+                  for tagName in cls.REQUIRED_ELEMENTS + cls.OPTIONAL_ELEMENTS]
+        result = _elementTables[cls] = (fields, dict((f[0], f[1]) for f in fields))
+        return result
+
+
+def _parseElements(self, elementTree, tag, diagnostics, expectedTag = None):
     """Read REQUIRED_ELEMENTS and OPTIONAL_ELEMENTS and returns
-    the rest of the children.  Every read child element's text
+    the rest of the children as (tag, element) pairs (with the tags'
+    xmlns stripped away).  Every read child element's text
     value will be filled into an attribute of the same name,
     i.e. <description>Test</description> will lead to 'Test' being
     assigned to self.description.  Missing REQUIRED_ELEMENTS
-    result in warnings."""
+    are reported to `diagnostics` (a CLIDiagnostics instance).
 
-    xmlns = _uriPrefix(elementTree)
+    `tag` is the tag of `elementTree` itself (without xmlns).  The
+    children are visited only once, dispatching on their tags."""
 
     if expectedTag is not None:
-        assert _tag(elementTree) == expectedTag, 'expected <%s>, got <%s>' % (expectedTag, _tag(elementTree))
-
-    parsed = []
-
-    for tagName in self.REQUIRED_ELEMENTS + self.OPTIONAL_ELEMENTS:
-        tags = elementTree.findall(xmlns + tagName)
-        if tags:
-            parsed.extend(tags)
-            tagValue = tags[0].text
-            tagValue = tagValue.strip() if tagValue else ""
-            if len(tags) > 1:
-                logger.warning("More than one <%s> found within %r (using only first)" % (tagName, _tag(elementTree)))
+        assert tag == expectedTag, 'expected <%s>, got <%s>' % (expectedTag, tag)
+
+    fields, identifiers = _elementTable(type(self))
+    xmlns = _uriPrefix(elementTree)
+    xmlnsLength = len(xmlns)
+
+    values = {}
+    rest = []
+    for child in elementTree:
+        childTag = child.tag
+        if not isinstance(childTag, str):
+            continue # comment or processing instruction
+        if childTag[0] == "{":
+            if xmlnsLength and childTag.startswith(xmlns):
+                childTag = childTag[xmlnsLength:]
+            else: # foreign namespace
+                rest.append((_tag(child), child))
+                continue
+        identifier = identifiers.get(childTag)
+        if identifier is None:
+            rest.append((childTag, child))
+        elif identifier in values:
+            diagnostics.report(tag, 'multiple-elements', childTag, tag)
         else:
-            tagValue = None
-            if tagName in self.REQUIRED_ELEMENTS:
-                logger.warning("Required element %r not found within %r" % (tagName, _tag(elementTree)))
-        setattr(self, _tagToIdentifier(tagName), tagValue)
+            text = child.text
+            values[identifier] = text.strip() if text else ""
+
+    for tagName, identifier, required in fields:
+        value = values.get(identifier)
+        if value is None and required:
+            diagnostics.report(tag, 'missing-element', tagName, tag)
+        setattr(self, identifier, value)
 
-    return [tag for tag in elementTree if tag not in parsed]
+    return rest
 
 
 class CLIModule(list):
@@ -73,9 +218,10 @@ class CLIModule(list):
     OPTIONAL_ELEMENTS = ('category', 'index', 'version', 'documentation-url',
                          'license', 'contributor', 'acknowledgements')
 
-    __slots__ = ('path', ) + tuple(map(_tagToIdentifier, REQUIRED_ELEMENTS + OPTIONAL_ELEMENTS))
+    __slots__ = ('path', 'diagnostics', '_pendingNodes', '_indexes') + tuple(map(_tagToIdentifier, REQUIRED_ELEMENTS + OPTIONAL_ELEMENTS))
 
-    def __init__(self, path = None, env = None, stream = None):
+    def __init__(self, path = None, env = None, stream = None, cache = None, timeout = None,
+                 lazy = False, diagnosticsPolicy = None):
         """
         Parse a CLI specification from an XML document. This class can be
         instantiated in three different modes:
@@ -95,11 +241,27 @@ class CLIModule(list):
             when invoking the subprocess to describe the CLI.
         :param stream: An open file-like object that will stream the CLI
             XML description document.
+        :param cache: If using mode 1 described above, an optional
+            `XMLDescriptionCache` that is used to avoid spawning the
+            executable if its description is already known.
+        :param timeout: If using mode 1 described above, the maximum
+            number of seconds to wait for the executable's description
+            (see `getXMLDescription()`).
+        :param lazy: If True, only the module's metadata (title,
+            description, category, version etc.) is parsed immediately,
+            while the parameter groups are parsed on first access
+            (e.g. via iteration, `parameters()` or `classifyParameters()`).
+        :param diagnosticsPolicy: How to handle problems with the
+            description, see `CLIDiagnostics` (default: log warnings).
+            The problems are recorded in the ``diagnostics`` attribute.
         """
         self.path = path
+        self.diagnostics = CLIDiagnostics(self.name, diagnosticsPolicy)
+        self._pendingNodes = None
+        self._indexes = None
 
         if path and isCLIExecutable(path):
-            elementTree = getXMLDescription(path, env = env)
+            elementTree = getXMLDescription(path, env = env, cache = cache, timeout = timeout)
         elif path:
             with open(path) as f:
                 elementTree = ET.parse(f)
@@ -108,11 +270,30 @@ class CLIModule(list):
         else:
             raise RuntimeError('You must pass either a path or stream when instantiating CLIModule.')
 
-        self._parse(elementTree.getroot())
+        self._parse(elementTree.getroot(), lazy)
+
+    @classmethod
+    def fromElementTree(cls, elementTree, path = None, lazy = False, diagnosticsPolicy = None):
+        """Create CLIModule from an already parsed ElementTree (e.g.
+        one returned by `getXMLDescription()`).  `path` is optional
+        and only used for the `name` property; see `__init__` for
+        `lazy` and `diagnosticsPolicy`."""
+        self = cls.__new__(cls)
+        self.path = path
+        self.diagnostics = CLIDiagnostics(self.name, diagnosticsPolicy)
+        self._pendingNodes = None
+        self._indexes = None
+        self._parse(elementTree.getroot(), lazy)
+        return self
 
     def __repr__(self):
         return '<CLIModule %r>' % (self.name, )
 
+    def __reduce__(self):
+        # pickle using the compact format from ctk_cli.serialization:
+        from .serialization import dumpModule, loadModule
+        return (loadModule, (dumpModule(self, binary = True), ))
+
     @property
     def name(self):
         if self.path is None:
@@ -138,8 +319,74 @@ class CLIModule(list):
         required ones (with an index), and simple output parameters
         (that would get written to a file using
         --returnparameterfile).  `arguments` contains the required
-        arguments, already sorted by index."""
-
+        arguments, already sorted by index.
+
+        The classification is computed only once (see
+        `invalidateIndexes()`); each call returns new lists, though."""
+        return tuple(list(parameters) for parameters in self._getIndexes()['classification'])
+
+    def parameterByIdentifier(self, identifier):
+        """Return the parameter with the given `identifier()`, or None."""
+        return self._getIndexes()['identifier'].get(identifier)
+
+    def parameterByFlag(self, flag):
+        """Return the parameter with the given flag (with or without
+        the leading dash), or None."""
+        if not flag.startswith('-'):
+            flag = '-' + flag
+        return self._getIndexes()['flag'].get(flag)
+
+    def parameterByLongflag(self, longflag):
+        """Return the parameter with the given longflag (with or
+        without the leading dashes), or None."""
+        if not longflag.startswith('-'):
+            longflag = '--' + longflag
+        return self._getIndexes()['longflag'].get(longflag)
+
+    def parameterByIndex(self, index):
+        """Return the parameter with the given (positional) index, or None."""
+        return self._getIndexes()['index'].get(index)
+
+    def parametersOfType(self, typ):
+        """Return list of all parameters of the given type (e.g. 'image')."""
+        return list(self._getIndexes()['type'].get(typ, ()))
+
+    def invalidateIndexes(self):
+        """Discard the lookup tables used by `classifyParameters()` and
+        the parameterByXXX() methods.  Changes to the parameter groups
+        (adding, removing or replacing groups or parameters) are
+        detected automatically, but this needs to be called after
+        modifying attributes of individual parameters."""
+        self._indexes = None
+
+    def _getIndexes(self):
+        # every group carries a globally unique stamp that changes
+        # with any modification (see CLIParameters):
+        signature = tuple(parameters._stamp for parameters in self)
+        indexes = getattr(self, '_indexes', None)
+        if indexes is None or indexes['signature'] != signature:
+            indexes = self._buildIndexes()
+            indexes['signature'] = signature
+            self._indexes = indexes
+        return indexes
+
+    def _buildIndexes(self):
+        byIdentifier, byFlag, byLongflag, byIndex, byType = {}, {}, {}, {}, {}
+        for parameter in self.parameters():
+            byIdentifier.setdefault(parameter.identifier(), parameter)
+            if parameter.flag:
+                byFlag.setdefault(parameter.flag, parameter)
+            if parameter.longflag:
+                byLongflag.setdefault(parameter.longflag, parameter)
+            if parameter.index is not None:
+                byIndex.setdefault(parameter.index, parameter)
+            byType.setdefault(parameter.typ, []).append(parameter)
+        return dict(identifier = byIdentifier, flag = byFlag, longflag = byLongflag,
+                    index = byIndex, type = byType,
+                    classification = self._classifyParameters())
+
+    def _classifyParameters(self):
+        diagnostics = self.diagnostics
         arguments = []
         options = []
         outputs = []
@@ -149,12 +396,12 @@ class CLIModule(list):
             elif parameter.index is not None:
                 arguments.append(parameter)
                 if parameter.flag is not None or parameter.longflag is not None:
-                    logger.warning("Parameter '%s' has both index=%d and flag set." % (
-                        parameter.identifier(), parameter.index))
+                    diagnostics.report(parameter.typ, 'index-and-flag',
+                                       parameter.identifier(), parameter.index)
             elif parameter.flag or parameter.longflag:
                 options.append(parameter)
             else:
-                logger.warning("Parameter '%s' cannot be passed (missing flag, longflag, or index)!" % parameter.name)
+                diagnostics.report(parameter.typ, 'unpassable-parameter', parameter.name)
         arguments.sort(key = lambda parameter: parameter.index)
         return (arguments, options, outputs)
 
@@ -162,38 +409,121 @@ class CLIModule(list):
     # because it is not a classmethod that is supposed to be used as a
     # factory method from the outside, even if the signature and
     # content is really similar:
-    def _parse(self, elementTree):
-        childNodes = _parseElements(self, elementTree, 'executable')
+    def _parse(self, elementTree, lazy = False):
+        if instrumentation._listeners:
+            start = instrumentation.clock()
+            self._parseModule(elementTree, lazy)
+            instrumentation.emit('module-parse', self.name, instrumentation.clock() - start,
+                                 lazy = lazy)
+        else:
+            self._parseModule(elementTree, lazy)
 
-        for pnode in childNodes:
-            if _tag(pnode) == 'parameters':
-                self.append(CLIParameters.parse(pnode))
+    def _parseModule(self, elementTree, lazy):
+        diagnostics = self.diagnostics
+        childNodes = _parseElements(self, elementTree, _tag(elementTree), diagnostics, 'executable')
+
+        parameterNodes = []
+        for tag, pnode in childNodes:
+            if tag == 'parameters':
+                parameterNodes.append(pnode)
             else:
-                logger.warning("Element %r within %r not parsed" % (_tag(pnode), _tag(elementTree)))
+                diagnostics.report('executable', 'unparsed-element', tag, 'executable')
+
+        self._pendingNodes = parameterNodes
+        if not lazy:
+            self._ensureParsed()
+
+    def _ensureParsed(self):
+        """Parse pending parameter groups (see `lazy` mode)."""
+        try:
+            pendingNodes = self._pendingNodes
+        except AttributeError:
+            return # created without _parse()
+        if pendingNodes is not None:
+            self._pendingNodes = None
+            start = instrumentation.clock()
+            diagnostics = self.diagnostics
+            list.extend(self, [CLIParameters.parse(pnode, diagnostics) for pnode in pendingNodes])
+            if instrumentation._listeners:
+                instrumentation.emit('parameters-parse', self.name, instrumentation.clock() - start)
+
+    def isParsed(self):
+        """Return False iff this module was loaded in `lazy` mode and
+        its parameter groups have not been accessed yet."""
+        return getattr(self, '_pendingNodes', None) is None
+
+
+def _parsingFirst(name):
+    method = getattr(list, name)
+    def wrapper(self, *args, **kwargs):
+        self._ensureParsed()
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+# make sure that pending parameter groups of lazily parsed modules are
+# parsed before any list functionality is used:
+for _name in ('__iter__', '__reversed__', '__len__', '__contains__',
+              '__getitem__', '__setitem__', '__delitem__',
+              '__eq__', '__ne__', '__lt__', '__le__', '__gt__', '__ge__',
+              '__add__', '__iadd__', '__mul__', '__imul__',
+              'append', 'extend', 'insert', 'pop', 'remove', 'clear',
+              'count', 'sort', 'reverse', 'copy'): # ('index' is a slot)
+    if hasattr(list, _name):
+        setattr(CLIModule, _name, _parsingFirst(_name))
+del _name
+
+
+_stamps = itertools.count()
+
+def _stamping(name):
+    method = getattr(list, name)
+    def wrapper(self, *args, **kwargs):
+        self._stamp = next(_stamps)
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
 
 
 class CLIParameters(list):
     REQUIRED_ELEMENTS = ('label', 'description')
     OPTIONAL_ELEMENTS = ()
 
-    __slots__ = ("advanced", ) + REQUIRED_ELEMENTS
+    __slots__ = ("advanced", "_stamp") + REQUIRED_ELEMENTS
+
+    def __init__(self, *args):
+        super(CLIParameters, self).__init__(*args)
+        self._stamp = next(_stamps)
 
     @classmethod
-    def parse(cls, elementTree):
+    def parse(cls, elementTree, diagnostics = None):
+        if diagnostics is None:
+            diagnostics = CLIDiagnostics()
+
         self = cls()
 
-        childNodes = _parseElements(self, elementTree, 'parameters')
+        childNodes = _parseElements(self, elementTree, _tag(elementTree), diagnostics, 'parameters')
 
         self.advanced = _parseBool(elementTree.get('advanced', 'false'))
 
-        for pnode in childNodes:
-            self.append(CLIParameter.parse(pnode))
+        self.extend([CLIParameter.parse(pnode, diagnostics, tag) for tag, pnode in childNodes])
 
         return self
 
     def __repr__(self):
         return '<CLIParameters %r%s>' % (self.label, ' (advanced)' if self.advanced else '')
 
+# renew the _stamp of CLIParameters with every modification, so that
+# CLIModule can detect when its indexes need to be rebuilt:
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__',
+              'append', 'extend', 'insert', 'pop', 'remove', 'clear',
+              'sort', 'reverse'):
+    if hasattr(list, _name):
+        setattr(CLIParameters, _name, _stamping(_name))
+del _name
+
 
 class CLIParameter(object):
     VALUE_TYPES = (
@@ -234,7 +564,7 @@ class CLIParameter(object):
                          'flag', 'longflag', 'index',
                          'default', 'channel')
 
-    __slots__ = ("typ", "hidden", "_pythonType") + REQUIRED_ELEMENTS + OPTIONAL_ELEMENTS + (
+    __slots__ = ("typ", "hidden", "_pythonType", "_codec") + REQUIRED_ELEMENTS + OPTIONAL_ELEMENTS + (
                  "constraints", # scalarVectorType, scalarType
                  "multiple", # multipleType
                  "elements", # enumerationType
@@ -250,6 +580,16 @@ class CLIParameter(object):
     def __repr__(self):
         return '<CLIParameter %r of type %s>' % (self.identifier(), self.typ)
 
+    def __getstate__(self):
+        # the codec is recompiled on demand after unpickling
+        return dict((name, getattr(self, name)) for name in self.__slots__
+                    if name != '_codec' and hasattr(self, name))
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._codec = None
+
     def identifier(self):
         result = self.name if self.name else self.longflag.lstrip('-')
         if not result:
@@ -258,11 +598,61 @@ class CLIParameter(object):
 
     def parseValue(self, value):
         """Parse the given value and return result."""
-        if self.isVector():
-            return list(map(self._pythonType, value.split(',')))
-        if self.typ == 'boolean':
-            return _parseBool(value)
-        return self._pythonType(value)
+        return self.codec.parse(value)
+
+    def parseValueAsArray(self, value):
+        """Parse the given value of a numeric vector type (see
+        `isNumericVector()`) into a one-dimensional NumPy array of the
+        corresponding dtype.  Requires NumPy."""
+        if not self.isNumericVector():
+            raise ValueError("%s is not of a numeric vector type" % (self, ))
+        numpy = _numpy()
+        return numpy.array(value.split(','), dtype = self._pythonType)
+
+    def parseValuesAsArray(self, values):
+        """Parse the given list of values of a numeric vector type
+        (e.g. given for a parameter with `multiple` set, such as a list
+        of points) into a two-dimensional NumPy array with one row per
+        value.  All values must have the same number of elements.
+        Requires NumPy."""
+        if not self.isNumericVector():
+            raise ValueError("%s is not of a numeric vector type" % (self, ))
+        numpy = _numpy()
+        if not values:
+            return numpy.empty((0, 0), dtype = self._pythonType)
+        if len(set(value.count(',') for value in values)) > 1:
+            raise ValueError("values of %s have differing numbers of elements" % (self, ))
+        elements = ','.join(values).split(',')
+        return numpy.array(elements, dtype = self._pythonType).reshape(len(values), -1)
+
+    def formatValue(self, value):
+        """Format the given python value as command line argument
+        string (the inverse of `parseValue()`).  For parameters with
+        `multiple` set, this has to be called for each single value.
+        Vector values may also be given as NumPy arrays."""
+        return self.codec.format(value)
+
+    def validateValue(self, value):
+        """Raise a ValueError if the given python value is invalid for
+        this parameter (see `CLIValueCodec.validate()`)."""
+        self.codec.validate(value)
+
+    @property
+    def codec(self):
+        """`CLIValueCodec` for this parameter (compiled on first access)."""
+        codec = getattr(self, '_codec', None)
+        if codec is None:
+            try:
+                codec = self.compileCodec()
+            except ValueError: # invalid constraints (reported when parsing)
+                codec = self._codec = CLIValueCodec(self, ignoreConstraints = True)
+        return codec
+
+    def compileCodec(self):
+        """(Re)compile this parameter's `codec`, which is necessary
+        after changing its type, constraints or elements."""
+        self._codec = CLIValueCodec(self)
+        return self._codec
 
     def isOptional(self):
         return self.index is None
@@ -301,21 +691,31 @@ class CLIParameter(object):
         return self.fileExtensions[0]
 
     @classmethod
-    def parse(cls, elementTree):
-        assert _tag(elementTree) in cls.TYPES, "%s not in CLIParameter.TYPES" % _tag(elementTree)
+    def pythonElementType(cls, typ):
+        """Return python type of (the elements of) values of the given
+        parameter type, e.g. int for 'integer' or 'integer-vector'."""
+        if typ in ('point', 'region'):
+            return float
+        if typ.endswith('-vector'):
+            typ = typ[:-7]
+        elif typ.endswith('-enumeration'):
+            typ = typ[:-12]
+        return cls.PYTHON_TYPE_MAPPING.get(typ, str)
 
-        self = cls()
-        self.typ = _tag(elementTree)
+    @classmethod
+    def parse(cls, elementTree, diagnostics = None, tag = None):
+        """Parse parameter from the given element; `tag` may be passed
+        if the element's tag (without xmlns) is already known."""
+        if tag is None:
+            tag = _tag(elementTree)
+        assert tag in cls.TYPES, "%s not in CLIParameter.TYPES" % tag
 
-        if self.typ in ('point', 'region'):
-            self._pythonType = float
-        else:
-            elementType = self.typ
-            if elementType.endswith('-vector'):
-                elementType = elementType[:-7]
-            elif elementType.endswith('-enumeration'):
-                elementType = elementType[:-12]
-            self._pythonType = self.PYTHON_TYPE_MAPPING.get(elementType, str)
+        if diagnostics is None:
+            diagnostics = CLIDiagnostics()
+
+        self = cls()
+        self.typ = tag
+        self._pythonType = cls.pythonElementType(self.typ)
 
         self.hidden = _parseBool(elementTree.get('hidden', 'false'))
 
@@ -336,29 +736,29 @@ class CLIParameter(object):
                 self.fileExtensions = [ext.strip() for ext in value.split(",")]
             elif key == 'reference' and self.typ in ('image', 'transform', 'geometry', 'table'):
                 self.reference = value
-                logger.warning("'reference' attribute of %r is not part of the spec yet (CTK issue #623)" % (_tag(elementTree), ))
+                diagnostics.report(self.typ, 'reference-attribute', self.typ)
             elif key == 'type':
                 self.subtype = value
             elif key != 'hidden':
-                logger.warning('attribute of %r ignored: %s=%r' % (_tag(elementTree), key, value))
+                diagnostics.report(self.typ, 'ignored-attribute', self.typ, key, value)
 
         elements = []
 
-        childNodes = _parseElements(self, elementTree)
-        for n in childNodes:
-            if _tag(n) == 'constraints':
-                self.constraints = CLIConstraints.parse(n)
-            elif _tag(n) == 'element':
+        childNodes = _parseElements(self, elementTree, tag, diagnostics)
+        for childTag, n in childNodes:
+            if childTag == 'element':
                 if not n.text:
-                    logger.warning("Ignoring empty <element> within <%s>" % (_tag(elementTree), ))
+                    diagnostics.report(self.typ, 'empty-enumeration-element', self.typ)
                 else:
                     elements.append(n.text)
+            elif childTag == 'constraints':
+                self.constraints = CLIConstraints.parse(n, diagnostics, childTag)
             else:
-                logger.warning("Element %r within %r not parsed" % (_tag(n), _tag(elementTree)))
+                diagnostics.report(self.typ, 'unparsed-element', childTag, self.typ)
 
-        if not self.flag and not self.longflag and self.index is None:
-            logger.warning("Parameter %s cannot be passed (missing one of flag, longflag, or index)!" % (
-                self.identifier(), ))
+        if not self.flag and not self.longflag and self.index is None and not (
+                self.channel == 'output' and not self.isExternalType()): # (return parameter)
+            diagnostics.report(self.typ, 'unpassable-parameter', self.identifier())
 
         if self.flag and not self.flag.startswith('-'):
             self.flag = '-' + self.flag
@@ -368,25 +768,35 @@ class CLIParameter(object):
         if self.index is not None:
             self.index = int(self.index)
 
+        self._codec = None
+        parseValue = _valueFunctions(self.typ)[0]
+
         if self.default:
             try:
-                self.default = self.parseValue(self.default)
+                self.default = parseValue(self.default)
             except ValueError as e:
-                logger.warning('Could not parse default value of <%s> (%s): %s' % (
-                    _tag(elementTree), self.name, e))
+                diagnostics.report(self.typ, 'invalid-default', self.typ, self.name, e)
 
         if self.typ.endswith('-enumeration'):
             try:
-                self.elements = list(map(self.parseValue, elements))
+                self.elements = list(map(parseValue, elements))
             except ValueError as e:
-                logger.warning('Problem parsing enumeration element values of <%s> (%s): %s' % (
-                    _tag(elementTree), self.name, e))
+                diagnostics.report(self.typ, 'invalid-enumeration', self.typ, self.name, e)
             if not elements:
-                logger.warning("No <element>s found within <%s>" % (_tag(elementTree), ))
+                diagnostics.report(self.typ, 'missing-enumeration-elements', self.typ)
         else:
             self.elements = None
             if elements:
-                logger.warning("Ignoring <element>s within <%s>" % (_tag(elementTree), ))
+                diagnostics.report(self.typ, 'ignored-enumeration-elements', self.typ)
+
+        if self.constraints is not None:
+            try:
+                self.compileCodec() # (the rest is compiled lazily)
+            except ValueError as e:
+                diagnostics.report(self.typ, 'invalid-constraints', self.typ, self.name, e)
+                self._codec = CLIValueCodec(self, ignoreConstraints = True)
+        else:
+            self._codec = None
 
         return self
 
@@ -399,10 +809,182 @@ class CLIConstraints(object):
     __slots__ = REQUIRED_ELEMENTS + OPTIONAL_ELEMENTS
 
     @classmethod
-    def parse(cls, elementTree):
+    def parse(cls, elementTree, diagnostics = None, tag = None):
+        if diagnostics is None:
+            diagnostics = CLIDiagnostics()
+
         self = cls()
-        childNodes = _parseElements(self, elementTree, 'constraints')
-        for n in childNodes:
-            logger.warning("Element %r within %r not parsed" % (_tag(n), _tag(elementTree)))
+        childNodes = _parseElements(self, elementTree, tag or _tag(elementTree), diagnostics, 'constraints')
+        for childTag, n in childNodes:
+            diagnostics.report('constraints', 'unparsed-element', childTag, 'constraints')
 
         return self
+
+
+# --------------------------------------------------------------------
+
+def _formatVector(value):
+    if hasattr(value, 'tolist'): # NumPy array
+        value = value.tolist()
+    return ','.join(map(str, value))
+
+def _formatBool(value):
+    return 'true' if value else 'false'
+
+class _VectorParser(object):
+    """Parser for comma-separated vector values (a class instead of a
+    closure, so that codecs can be pickled)."""
+
+    __slots__ = ('elementType', )
+
+    def __init__(self, elementType):
+        self.elementType = elementType
+
+    def __call__(self, value):
+        return list(map(self.elementType, value.split(',')))
+
+def _valueFunctions(typ):
+    """Return (parse, format) functions for values of the given
+    parameter type (see `CLIParameter.parseValue()` and
+    `CLIParameter.formatValue()`)."""
+    pythonType = CLIParameter.pythonElementType(typ)
+    if typ in _VECTOR_LENGTHS or typ.endswith('-vector'):
+        return (_VectorParser(pythonType), _formatVector)
+    if typ == 'boolean':
+        return (_parseBool, _formatBool)
+    return (pythonType, str)
+
+# number of elements of fixed-size vector types
+_VECTOR_LENGTHS = {
+    'point' : 3,
+    'region' : 6,
+}
+
+_BULK_THRESHOLD = 64 # minimum number of values for using NumPy in invalidIndices()
+
+
+class CLIValueCodec(object):
+    """Precompiled functions for parsing, validating and formatting
+    the values of one `CLIParameter`, available as its `codec`
+    attribute.  Everything that depends only on the parameter's
+    declaration (type, vector-ness, constraints, enumeration elements)
+    is derived once when the codec is compiled.
+
+    Codecs are compiled lazily, on first access of `CLIParameter.codec`.
+    `validate()` checks the type of numeric and boolean values, the
+    number of elements of points and regions, enumeration membership
+    and the minimum and maximum constraints (elementwise for vectors).
+    The constraints' step is not checked, since it is a mere UI
+    (slider) increment.
+
+    Raises a ValueError if the constraints cannot be parsed (unless
+    `ignoreConstraints` is set)."""
+
+    __slots__ = ('parameter', 'parse', 'format', 'multiple', 'isVector', 'vectorLength',
+                 'numericType', 'minimum', 'maximum', 'elements')
+
+    def __init__(self, parameter, ignoreConstraints = False):
+        self.parameter = parameter
+        self.parse, self.format = _valueFunctions(parameter.typ)
+        self.multiple = bool(parameter.multiple)
+        self.isVector = parameter.isVector()
+        self.vectorLength = _VECTOR_LENGTHS.get(parameter.typ)
+
+        pythonType = parameter._pythonType
+        self.numericType = pythonType if pythonType in (int, float) and \
+            not parameter.isExternalType() else None
+
+        self.minimum = self.maximum = None
+        constraints = parameter.constraints
+        if constraints is not None and self.numericType is not None and not ignoreConstraints:
+            for name in ('minimum', 'maximum'):
+                value = getattr(constraints, name, None)
+                if value is not None:
+                    setattr(self, name, self.numericType(value))
+
+        self.elements = None
+        if parameter.elements is not None:
+            try:
+                self.elements = frozenset(parameter.elements)
+            except TypeError: # unhashable (vector) elements
+                self.elements = list(parameter.elements)
+
+    def __repr__(self):
+        return '<CLIValueCodec for %s>' % (self.parameter, )
+
+    def _error(self, value, reason):
+        return ValueError("Invalid value %r for %s: %s" % (value, self.parameter, reason))
+
+    def _validateSingle(self, value):
+        if self.elements is not None and value not in self.elements:
+            raise self._error(value, "not one of %s" % (self.parameter.elements, ))
+        if self.parameter.typ == 'boolean':
+            if not isinstance(value, (bool, int)):
+                raise self._error(value, "not a boolean")
+            return
+        if self.numericType is None:
+            return
+        if self.isVector:
+            if not hasattr(value, '__len__') or isinstance(value, str):
+                raise self._error(value, "not a sequence")
+            if self.vectorLength is not None and len(value) != self.vectorLength:
+                raise self._error(value, "expected %d elements" % (self.vectorLength, ))
+            items = value.tolist() if hasattr(value, 'tolist') else value
+        else:
+            items = (value, )
+        numericTypes = (int, ) if self.numericType is int else (int, float)
+        for item in items:
+            if not isinstance(item, numericTypes) and not (
+                    hasattr(item, 'dtype') and item.dtype.kind in ('iu' if self.numericType is int else 'iuf')):
+                raise self._error(value, "not of type %s" % (self.numericType.__name__, ))
+            if self.minimum is not None and item < self.minimum:
+                raise self._error(value, "less than minimum %s" % (self.minimum, ))
+            if self.maximum is not None and item > self.maximum:
+                raise self._error(value, "greater than maximum %s" % (self.maximum, ))
+
+    def validate(self, value):
+        """Raise a ValueError if the given python value is invalid
+        (for parameters with `multiple` set, a list of values is
+        expected)."""
+        if self.multiple:
+            for item in value:
+                self._validateSingle(item)
+        else:
+            self._validateSingle(value)
+
+    def isValid(self, value):
+        try:
+            self.validate(value)
+        except (ValueError, TypeError):
+            return False
+        return True
+
+    def parseValid(self, value):
+        """Parse the given single value (string) and validate the result."""
+        result = self.parse(value)
+        self._validateSingle(result)
+        return result
+
+    def invalidIndices(self, values):
+        """Validate many values at once (e.g. a column of a parameter
+        sweep) and return the sorted list of indices of invalid ones.
+        For many values of scalar numeric types, the checks are done
+        with NumPy if it is available."""
+        if (len(values) >= _BULK_THRESHOLD and self.numericType is not None and
+                not self.isVector and not self.multiple):
+            try:
+                import numpy
+                array = numpy.asarray(values)
+            except (ImportError, ValueError, TypeError):
+                array = None
+            if array is not None and array.ndim == 1 and array.dtype.kind in (
+                    'iu' if self.numericType is int else 'iuf'):
+                invalid = numpy.zeros(len(array), dtype = bool)
+                if self.minimum is not None:
+                    invalid |= array < self.minimum
+                if self.maximum is not None:
+                    invalid |= array > self.maximum
+                if self.elements is not None:
+                    invalid |= ~numpy.isin(array, list(self.elements))
+                return numpy.flatnonzero(invalid).tolist()
+        return [i for i, value in enumerate(values) if not self.isValid(value)]
@@ -0,0 +1,296 @@
+"""Running several CLI modules as a pipeline (directed acyclic graph).
+
+Outputs of one step (files of external types as well as simple return
+parameters) are wired to inputs of later steps by passing the value of
+`CLIPipelineStep.output()` as parameter value:
+
+>>> pipeline = CLIPipeline(scratch = ScratchSpace())
+>>> registration = pipeline.addStep('registration', registrationModule,
+...                                 dict(fixedVolume = 'fixed.nrrd', movingVolume = 'moving.nrrd'))
+>>> resampling = pipeline.addStep('resampling', resampleModule,
+...                               dict(inputVolume = 'moving.nrrd',
+...                                    transformationFile = registration.output('outputTransform')))
+>>> results = pipeline.run()
+>>> results['resampling'].outputs['outputVolume']
+
+Links are type-checked when steps are added.  Independent steps run
+concurrently, and intermediate files (i.e. linked output files for
+which no path was given) are kept in scratch space and removed as soon
+as all steps consuming them have finished.  Linked output files with
+an explicitly given path are written there and kept.
+"""
+
+import os, shutil, logging, tempfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .execution import CLIExecution
+from .scratch import ScratchDirectory, parameterExtension
+
+logger = logging.getLogger(__name__)
+
+
+def _linkExtension(source, destinations):
+    """Return file extension for an intermediate file written for the
+    output parameter `source` and read for all `destinations`, or None
+    if their fileExtensions do not overlap."""
+    preferred = parameterExtension(source)
+    candidates = list(source.fileExtensions) if source.fileExtensions else None
+    for destination in destinations:
+        if destination.fileExtensions:
+            if candidates is None:
+                candidates = list(destination.fileExtensions)
+            else:
+                candidates = [e for e in candidates if e in destination.fileExtensions]
+    if candidates is None:
+        return preferred
+    if not candidates:
+        return None
+    return preferred if preferred in candidates else candidates[0]
+
+
+def _valueKind(parameter):
+    return (parameter.pythonElementType(parameter.typ), parameter.isVector())
+
+
+def _checkLink(source, destination):
+    """Raise a ValueError if values of the output parameter `source`
+    cannot be passed to the parameter `destination`."""
+    if destination.channel == 'output':
+        raise ValueError("Cannot pass %s to output %s" % (source, destination))
+    if source.isExternalType() != destination.isExternalType():
+        raise ValueError("Cannot pass %s to %s (file vs. value)" % (source, destination))
+    if source.isExternalType():
+        if source.typ != destination.typ and not (
+                'file' in (source.typ, destination.typ) and
+                'directory' not in (source.typ, destination.typ)):
+            raise ValueError("Cannot pass %s to %s (type mismatch)" % (source, destination))
+        if _linkExtension(source, [destination]) is None:
+            raise ValueError("Cannot pass %s to %s (no common file extension in %s and %s)" % (
+                source, destination, source.fileExtensions, destination.fileExtensions))
+    else:
+        sourceType, sourceIsVector = _valueKind(source)
+        destinationType, destinationIsVector = _valueKind(destination)
+        if sourceIsVector != destinationIsVector or not (
+                sourceType is destinationType or (sourceType is int and destinationType is float)):
+            raise ValueError("Cannot pass %s to %s (type mismatch)" % (source, destination))
+
+
+class CLIPipelineOutput(object):
+    """Reference to an output parameter of a `CLIPipelineStep`, to be
+    used as parameter value for later steps."""
+
+    __slots__ = ('step', 'identifier', 'parameter')
+
+    def __init__(self, step, identifier, parameter):
+        self.step = step
+        self.identifier = identifier
+        self.parameter = parameter
+
+    def __repr__(self):
+        return '<CLIPipelineOutput %s.%s>' % (self.step.name, self.identifier)
+
+
+class CLIPipelineStep(object):
+    """One CLI run within a `CLIPipeline` (see `CLIPipeline.addStep()`)."""
+
+    __slots__ = ('name', 'execution', 'values', 'kwargs', 'inputs')
+
+    def __init__(self, name, execution, values, kwargs):
+        self.name = name
+        self.execution = execution
+        self.values = values
+        self.kwargs = kwargs
+        self.inputs = [(identifier, value) for identifier, value in values.items()
+                       if isinstance(value, CLIPipelineOutput)]
+
+    def __repr__(self):
+        return '<CLIPipelineStep %r (%s)>' % (self.name, self.execution.module.name)
+
+    def output(self, identifier):
+        """Return reference to the output parameter with the given
+        identifier (an output file or return parameter)."""
+        parameter = self.execution._parameters.get(identifier)
+        if parameter is None or parameter.channel != 'output':
+            raise ValueError("%s has no output parameter %r" % (
+                self.execution.module.name, identifier))
+        return CLIPipelineOutput(self, identifier, parameter)
+
+    def dependencies(self):
+        """Return set of names of the steps this step depends on."""
+        return set(value.step.name for identifier, value in self.inputs)
+
+
+class CLIPipelineResult(dict):
+    """Mapping from step names to `CLIExecutionResult`s, as returned by
+    `CLIPipeline.run()`.  The `failures` attribute maps the names of
+    steps that failed (or were skipped because a step they depend on
+    failed) to the corresponding exceptions.  Note that the output
+    paths of intermediate files (i.e. outputs linked to other steps
+    for which no path was given) are no longer valid."""
+
+    __slots__ = ('failures', )
+
+    def __init__(self):
+        super(CLIPipelineResult, self).__init__()
+        self.failures = {}
+
+    def cleanup(self):
+        """Call `CLIExecutionResult.cleanup()` for all steps."""
+        for result in self.values():
+            result.cleanup()
+
+
+class CLIPipeline(object):
+    """Directed acyclic graph of CLI runs (see module documentation).
+
+    :param scratch: `ScratchSpace` for intermediate and automatically
+        allocated output files (default: new temporary directories)
+    :param maxWorkers: maximum number of concurrently running steps
+        (default: number of CPUs)
+    """
+
+    def __init__(self, scratch = None, maxWorkers = None):
+        self.scratch = scratch
+        self.maxWorkers = maxWorkers
+        self._steps = []
+        self._stepsByName = {}
+
+    def __repr__(self):
+        return '<CLIPipeline (%d steps)>' % (len(self._steps), )
+
+    def steps(self):
+        """Return list of all steps (in the order they were added)."""
+        return list(self._steps)
+
+    def addStep(self, name, module, values = None, **kwargs):
+        """Add a step running the given `CLIModule` with the given
+        values (dict mapping parameter identifiers to values, which may
+        be `CLIPipelineOutput`s of previously added steps) and return
+        the new `CLIPipelineStep`.  Raises a ValueError for invalid or
+        type-incompatible links.  Any kwargs are passed on to
+        `CLIExecution.run()`."""
+        if name in self._stepsByName:
+            raise ValueError("Duplicate pipeline step name %r" % (name, ))
+        execution = CLIExecution(module)
+        values = dict(values or {})
+        for identifier, value in values.items():
+            parameter = execution._parameters.get(identifier)
+            if parameter is None:
+                raise ValueError("%s has no parameter %r" % (module.name, identifier))
+            if isinstance(value, CLIPipelineOutput):
+                if self._stepsByName.get(value.step.name) is not value.step:
+                    raise ValueError("%r refers to a step not in this pipeline" % (value, ))
+                if parameter.multiple:
+                    raise ValueError("Cannot pass %r to %s (accepting multiple values)" % (
+                        value, parameter))
+                _checkLink(value.parameter, parameter)
+
+        step = CLIPipelineStep(name, execution, values, kwargs)
+        self._steps.append(step)
+        self._stepsByName[name] = step
+        return step
+
+    def _newDirectory(self):
+        if self.scratch is not None:
+            return self.scratch.newDirectory()
+        return ScratchDirectory(tempfile.mkdtemp(prefix = 'ctk-cli-pipeline-'))
+
+    def _allocateIntermediates(self):
+        """Return (paths, consumers, directories) with `paths` mapping
+        (step name, identifier) pairs of linked output files to the
+        allocated paths (except for those with explicitly given
+        paths), `consumers` mapping all linked outputs to the number of
+        consuming steps, and the list of the scratch directories
+        created."""
+        destinations = {}
+        consumers = {}
+        for step in self._steps:
+            for key in set((value.step.name, value.identifier) for _, value in step.inputs):
+                consumers[key] = consumers.get(key, 0) + 1
+            for identifier, value in step.inputs:
+                if value.parameter.isExternalType():
+                    destinations.setdefault((value.step.name, value.identifier), []).append(
+                        step.execution._parameters[identifier])
+
+        paths, directories = {}, {}
+        for (stepName, identifier), parameters in destinations.items():
+            if self._stepsByName[stepName].values.get(identifier) is not None:
+                continue # keep the path given by the caller
+            directory = directories.get(stepName)
+            if directory is None:
+                directory = directories[stepName] = self._newDirectory()
+            source = self._stepsByName[stepName].execution._parameters[identifier]
+            paths[(stepName, identifier)] = directory.allocate(
+                source, identifier, _linkExtension(source, parameters))
+        return paths, consumers, list(directories.values())
+
+    def run(self):
+        """Run all steps, each as soon as the steps it depends on have
+        finished successfully, and return a `CLIPipelineResult`.  A step
+        counts as failed if it raises an exception or exits with a
+        non-zero exit code; steps depending on it are skipped, all
+        others are still run."""
+        result = CLIPipelineResult()
+        paths, consumers, directories = self._allocateIntermediates()
+
+        def release(step):
+            for key in set((value.step.name, value.identifier) for _, value in step.inputs):
+                consumers[key] -= 1
+                path = paths.get(key)
+                if consumers[key] == 0 and path is not None and os.path.exists(path):
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors = True)
+                    else:
+                        os.unlink(path)
+
+        def runStep(step):
+            values = dict(step.values)
+            for identifier, value in step.inputs:
+                values[identifier] = result[value.step.name].outputs[value.identifier]
+            for (stepName, identifier), path in paths.items():
+                if stepName == step.name:
+                    values[identifier] = path
+            kwargs = dict(step.kwargs)
+            if self.scratch is not None:
+                kwargs.setdefault('scratch', self.scratch)
+            stepResult = step.execution.run(values, **kwargs)
+            try:
+                return stepResult.check()
+            except:
+                stepResult.cleanup()
+                raise
+
+        remaining = list(self._steps)
+        running = {}
+        maxWorkers = self.maxWorkers or os.cpu_count() or 1
+        try:
+            with ThreadPoolExecutor(max_workers = maxWorkers) as pool:
+                while remaining or running:
+                    for step in list(remaining):
+                        dependencies = step.dependencies()
+                        failed = [name for name in dependencies if name in result.failures]
+                        if failed:
+                            remaining.remove(step)
+                            result.failures[step.name] = RuntimeError(
+                                "Skipped pipeline step %r because %r failed" % (step.name, failed[0]))
+                            release(step)
+                        elif all(name in result for name in dependencies):
+                            remaining.remove(step)
+                            running[pool.submit(runStep, step)] = step
+                    if not running:
+                        continue # skipped steps may have unblocked (i.e. failed) others
+
+                    done, _ = wait(running, return_when = FIRST_COMPLETED)
+                    for future in done:
+                        step = running.pop(future)
+                        try:
+                            result[step.name] = future.result()
+                        except Exception as e:
+                            logger.warning("Pipeline step %r failed: %s" % (step.name, e))
+                            result.failures[step.name] = e
+                        release(step)
+        finally:
+            for directory in directories:
+                directory.release()
+
+        return result
@@ -0,0 +1,173 @@
+"""Streaming parser for the progress reports of Slicer-style CLIs.
+
+Such CLIs write XML fragments like the following to stdout, mixed with
+arbitrary other output::
+
+    <filter-start>
+      <filter-name>AddScalar</filter-name>
+      <filter-comment>Adding scalar</filter-comment>
+    </filter-start>
+    <filter-progress>0.5</filter-progress>
+    <filter-stage-progress>0.25</filter-stage-progress>
+    <filter-end>
+      <filter-name>AddScalar</filter-name>
+      <filter-time>1.2</filter-time>
+    </filter-end>
+
+`CLIProgressParser` extracts these fragments incrementally from chunks
+of output as they arrive, and passes everything else through.  Only
+incomplete fragments are buffered, up to `MAX_FRAGMENT_SIZE` bytes.
+"""
+
+import re, logging
+
+logger = logging.getLogger(__name__)
+
+_FRAGMENT_START = b'<filter-'
+_re_openingTag = re.compile(br'<(filter-[a-z-]+)>')
+_re_childElement = re.compile(br'<filter-(name|comment|time)>(.*?)</filter-\1>', re.S)
+
+MAX_FRAGMENT_SIZE = 65536
+
+
+class CLIProgressEvent(object):
+    """One progress report: `kind` is 'start', 'progress',
+    'stage-progress' or 'end'.  `progress` (a float between 0 and 1)
+    is set for the progress kinds, `name` and `comment` for 'start',
+    and `name` and `time` (in seconds, if reported) for 'end'."""
+
+    __slots__ = ('kind', 'name', 'comment', 'progress', 'time')
+
+    def __init__(self, kind, name = None, comment = None, progress = None, time = None):
+        self.kind = kind
+        self.name = name
+        self.comment = comment
+        self.progress = progress
+        self.time = time
+
+    def __repr__(self):
+        if self.progress is not None:
+            return '<CLIProgressEvent %s %.3f>' % (self.kind, self.progress)
+        return '<CLIProgressEvent %s %r>' % (self.kind, self.name)
+
+
+def _partialPrefixLength(data):
+    """Return length of the longest suffix of `data` that is a proper
+    prefix of _FRAGMENT_START."""
+    for length in range(min(len(data), len(_FRAGMENT_START) - 1), 0, -1):
+        if _FRAGMENT_START.startswith(data[-length:]):
+            return length
+    return 0
+
+
+def _text(value):
+    return value.decode('utf-8', 'replace').strip()
+
+
+def _parseFragment(tag, content):
+    kind = tag[len('filter-'):].decode('ascii')
+    if kind in ('progress', 'stage-progress'):
+        try:
+            return CLIProgressEvent(kind, progress = float(content))
+        except ValueError:
+            logger.warning("Ignoring invalid <%s> value %r" % (tag.decode('ascii'), content))
+            return None
+    if kind in ('start', 'end'):
+        children = dict((name.decode('ascii'), _text(value))
+                        for name, value in _re_childElement.findall(content))
+        time = children.get('time')
+        try:
+            time = float(time) if time is not None else None
+        except ValueError:
+            time = None
+        return CLIProgressEvent(kind, name = children.get('name'),
+                                comment = children.get('comment'), time = time)
+    return None # unknown filter-* element (dropped like the known ones)
+
+
+class CLIProgressParser(object):
+    """Incremental parser for CLI stdout.  Pass each chunk of output
+    (bytes) to `feed()`, which returns the list of `CLIProgressEvent`s
+    completed by that chunk (and calls `callback` with each of them,
+    if given).  All other output is passed to `passthrough` (called
+    with bytes); the newline following a progress fragment is dropped.
+    Call `close()` at the end of the output to flush the remainder."""
+
+    def __init__(self, callback = None, passthrough = None):
+        self.callback = callback
+        self.passthrough = passthrough
+        self._buffer = b''
+        self._skipNewline = False
+
+    def _pass(self, data):
+        if data and self.passthrough is not None:
+            self.passthrough(data)
+
+    def feed(self, data):
+        buffer = self._buffer + data
+        events = []
+        while buffer:
+            if self._skipNewline:
+                if buffer.startswith(b'\r\n'):
+                    buffer = buffer[2:]
+                elif buffer.startswith(b'\n'):
+                    buffer = buffer[1:]
+                elif buffer == b'\r':
+                    break # wait for more
+                self._skipNewline = False
+                continue
+
+            start = buffer.find(_FRAGMENT_START)
+            if start < 0:
+                keep = _partialPrefixLength(buffer)
+                self._pass(buffer[:len(buffer) - keep])
+                buffer = buffer[len(buffer) - keep:]
+                break
+            self._pass(buffer[:start])
+            buffer = buffer[start:]
+
+            ma = _re_openingTag.match(buffer)
+            end = -1
+            if ma:
+                closingTag = b'</' + ma.group(1) + b'>'
+                end = buffer.find(closingTag, ma.end())
+
+            if end < 0:
+                if (ma is None and b'>' in buffer) or len(buffer) > MAX_FRAGMENT_SIZE:
+                    # not a fragment after all (e.g. '<filter-foo bar>'),
+                    # or too long: treat it as ordinary output
+                    self._pass(buffer[:len(_FRAGMENT_START)])
+                    buffer = buffer[len(_FRAGMENT_START):]
+                    continue
+                break # wait for more
+
+            event = _parseFragment(ma.group(1), buffer[ma.end():end])
+            buffer = buffer[end + len(closingTag):]
+            self._skipNewline = True
+            if event is not None:
+                events.append(event)
+                if self.callback is not None:
+                    self.callback(event)
+
+        self._buffer = buffer
+        return events
+
+    def close(self):
+        """Pass through any buffered (incomplete) output."""
+        if self._buffer != b'\r' or not self._skipNewline:
+            self._pass(self._buffer)
+        self._buffer = b''
+        self._skipNewline = False
+
+
+def iterCLIProgress(stream, passthrough = None, chunkSize = 65536):
+    """Generator yielding the `CLIProgressEvent`s found in the given
+    binary stream (e.g. the stdout pipe of a running CLI) as they
+    arrive; other output is passed to `passthrough` (see
+    `CLIProgressParser`)."""
+    parser = CLIProgressParser(passthrough = passthrough)
+    read = getattr(stream, 'read1', stream.read)
+    for chunk in iter(lambda: read(chunkSize), b''):
+        for event in parser.feed(chunk):
+            yield event
+    parser.close()
@@ -0,0 +1,294 @@
+"""Content-addressed cache of CLI execution results.
+
+A `CLIResultCache` stores the output files, return parameters and
+stdout/stderr of successful `CLIExecution.run()` calls, keyed by
+everything that determines the result: the executable (its stat
+signature or content hash, and the module version), the normalized
+values of all input parameters, and the content hashes of all input
+files.  On a hit, the outputs are restored without spawning anything.
+"""
+
+import os, json, time, base64, shutil, hashlib, logging, tempfile, threading
+
+from .cache import defaultCacheDirectory, statSignature
+from .scratch import linkOrCopy
+
+logger = logging.getLogger(__name__)
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+def _fileHash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _copy(source, destination):
+    """Copy file or directory without sharing inodes (so that later
+    modifications of the copy do not affect the cache, and vice versa)."""
+    if os.path.isdir(source):
+        if os.path.isdir(destination):
+            shutil.rmtree(destination)
+        shutil.copytree(source, destination)
+    else:
+        linkOrCopy(source, destination, hardLink = False)
+
+
+def _treeSize(path):
+    result = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for fn in filenames:
+            try:
+                result += os.lstat(os.path.join(dirpath, fn)).st_size
+            except OSError:
+                pass
+    return result
+
+
+class CLIResultCache(object):
+    """Persistent on-disk cache of CLI results, to be passed to
+    `CLIExecution.run()`:
+
+    >>> results = CLIResultCache(maxSize = 10 * 1024**3)
+    >>> result = execution.run(values, resultCache = results)
+
+    Only successful runs (exit code 0) are cached.  Each entry is a
+    directory that is completely written under a temporary name
+    before being renamed into place, and removed by renaming it away
+    first, so several processes may safely share one cache directory;
+    at worst, an entry vanishing during a lookup makes it a miss.
+
+    :param directory: base directory of the cache (default:
+        $XDG_CACHE_HOME/ctk-cli/results)
+    :param maxSize: if given, least recently used entries are evicted
+        until the total size is at most `maxSize` bytes
+    :param maxEntries: likewise, limits the number of entries
+    :param hashExecutables: identify executables by a hash of their
+        content instead of their stat signature (path, size, mtime,
+        inode), e.g. for caches shared between machines
+
+    Like `XMLDescriptionCache`, `store()` only scans all entries for
+    eviction when the estimated total size or number of entries
+    exceeds the limits, or `EVICTION_INTERVAL` seconds after the last
+    eviction, and then shrinks the cache to `EVICTION_HEADROOM` times
+    the limits.
+    """
+
+    MANIFEST = 'manifest.json'
+
+    EVICTION_INTERVAL = 60
+
+    EVICTION_HEADROOM = 0.9
+
+    def __init__(self, directory = None, maxSize = None, maxEntries = None,
+                 hashExecutables = False):
+        self.directory = directory or defaultCacheDirectory('results')
+        self.maxSize = maxSize
+        self.maxEntries = maxEntries
+        self.hashExecutables = hashExecutables
+        self._hashes = {} # stat signature -> content hash
+        self._lock = threading.Lock()
+        self._size = None # estimated total size and number of entries,
+        self._count = None # None before first eviction
+        self._lastEviction = None
+
+    def __repr__(self):
+        return '<CLIResultCache %r>' % (self.directory, )
+
+    def contentHash(self, path):
+        """Return hash of the contents of the given file or directory
+        (memoized per stat signature)."""
+        if os.path.isdir(path):
+            h = hashlib.sha1()
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for fn in sorted(filenames):
+                    filename = os.path.join(dirpath, fn)
+                    h.update(os.path.relpath(filename, path).encode('utf-8') + b'\0')
+                    h.update(self.contentHash(filename).encode('ascii'))
+            return h.hexdigest()
+
+        signature = statSignature(path)
+        with self._lock:
+            result = self._hashes.get(signature)
+        if result is None:
+            result = _fileHash(path)
+            with self._lock:
+                self._hashes[signature] = result
+        return result
+
+    def key(self, module, values, env = None):
+        """Return the cache key (hex string) for running `module` with
+        the given values (dict mapping parameter identifiers to python
+        values; unset values are replaced by the defaults)."""
+        if self.hashExecutables:
+            executable = self.contentHash(module.path)
+        else:
+            executable = statSignature(module.path)
+
+        normalized = []
+        for parameter in module.parameters():
+            if parameter.channel == 'output':
+                continue # output paths do not influence the results
+            identifier = parameter.identifier()
+            value = values.get(identifier)
+            if value is None:
+                value = parameter.default # (parsed already)
+                if value is None:
+                    continue
+                if parameter.multiple:
+                    value = [value]
+            items = value if parameter.multiple else [value]
+            if parameter.isExternalType():
+                items = [self.contentHash(path) for path in items]
+            else:
+                items = [parameter.formatValue(item) for item in items]
+            normalized.append((identifier, items))
+
+        h = hashlib.sha1()
+        h.update(json.dumps([executable, module.version, sorted(normalized),
+                             sorted(env.items()) if env is not None else None]).encode('utf-8'))
+        return h.hexdigest()
+
+    def _entryDirectory(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def restore(self, key, outputPaths, returnParameterFile = None):
+        """Restore the cached outputs for `key`: copy the output files
+        to the paths given by `outputPaths` (dict mapping parameter
+        identifiers to paths) and the return parameters to
+        `returnParameterFile`.  Returns (stdout, stderr), or None if
+        there is no (complete) entry."""
+        entryDirectory = self._entryDirectory(key)
+        try:
+            with open(os.path.join(entryDirectory, self.MANIFEST)) as f:
+                manifest = json.load(f)
+            if set(manifest['outputs']) != set(outputPaths):
+                return None
+            for identifier, filename in manifest['outputs'].items():
+                _copy(os.path.join(entryDirectory, filename), outputPaths[identifier])
+            if manifest['returnParameters'] is not None and returnParameterFile is not None:
+                _copy(os.path.join(entryDirectory, manifest['returnParameters']), returnParameterFile)
+            os.utime(os.path.join(entryDirectory, self.MANIFEST), None) # mark as recently used
+        except (OSError, IOError, ValueError, KeyError):
+            return None
+        return (base64.b64decode(manifest['stdout']), base64.b64decode(manifest['stderr']))
+
+    def store(self, key, stdout, stderr, outputPaths, returnParameterFile = None):
+        """Store the outputs of a successful run under `key` (see
+        `restore()` for the arguments)."""
+        entryDirectory = self._entryDirectory(key)
+        if os.path.exists(entryDirectory):
+            return
+        parentDirectory = os.path.dirname(entryDirectory)
+        if not os.path.isdir(parentDirectory):
+            try:
+                os.makedirs(parentDirectory)
+            except OSError:
+                if not os.path.isdir(parentDirectory): # lost a race otherwise
+                    raise
+
+        tmpDirectory = tempfile.mkdtemp(prefix = '.tmp-', dir = self.directory)
+        try:
+            manifest = dict(stdout = base64.b64encode(stdout).decode('ascii'),
+                            stderr = base64.b64encode(stderr).decode('ascii'),
+                            outputs = {}, returnParameters = None)
+            for identifier, path in outputPaths.items():
+                filename = 'output-' + identifier + os.path.splitext(path)[1]
+                _copy(path, os.path.join(tmpDirectory, filename))
+                manifest['outputs'][identifier] = filename
+            if returnParameterFile is not None and os.path.exists(returnParameterFile):
+                _copy(returnParameterFile, os.path.join(tmpDirectory, 'returnparameters'))
+                manifest['returnParameters'] = 'returnparameters'
+            with open(os.path.join(tmpDirectory, self.MANIFEST), 'w') as f:
+                json.dump(manifest, f)
+            size = _treeSize(tmpDirectory)
+            try:
+                os.rename(tmpDirectory, entryDirectory)
+            except OSError:
+                return # stored concurrently by another process
+        finally:
+            if os.path.exists(tmpDirectory):
+                shutil.rmtree(tmpDirectory, ignore_errors = True)
+
+        if self.maxSize is not None or self.maxEntries is not None:
+            with self._lock:
+                if self._size is not None:
+                    self._size += size
+                    self._count += 1
+                due = (self._lastEviction is None or
+                       time.time() - self._lastEviction > self.EVICTION_INTERVAL or
+                       (self.maxSize is not None and self._size > self.maxSize) or
+                       (self.maxEntries is not None and self._count > self.maxEntries))
+            if due:
+                # leave some headroom, so that the next store() does
+                # not have to evict again:
+                self._evict(*[int(limit * self.EVICTION_HEADROOM) if limit is not None else None
+                              for limit in (self.maxSize, self.maxEntries)])
+
+    def _remove(self, entryDirectory):
+        tmpDirectory = tempfile.mkdtemp(prefix = '.tmp-', dir = self.directory)
+        try:
+            os.rename(entryDirectory, os.path.join(tmpDirectory, 'entry'))
+        except OSError:
+            pass # removed concurrently
+        finally:
+            shutil.rmtree(tmpDirectory, ignore_errors = True)
+        try:
+            os.rmdir(os.path.dirname(entryDirectory))
+        except OSError:
+            pass # not empty
+
+    def _entries(self):
+        """Return list of (entry directory, size, last use) tuples."""
+        result = []
+        for prefix in self._listdir(self.directory):
+            if prefix.startswith('.'):
+                continue
+            prefixDirectory = os.path.join(self.directory, prefix)
+            for key in self._listdir(prefixDirectory):
+                entryDirectory = os.path.join(prefixDirectory, key)
+                try:
+                    lastUse = os.stat(os.path.join(entryDirectory, self.MANIFEST)).st_mtime
+                except OSError:
+                    continue # removed concurrently
+                result.append((entryDirectory, _treeSize(entryDirectory), lastUse))
+        return result
+
+    def evict(self):
+        """Remove least recently used entries according to `maxSize`
+        and `maxEntries`."""
+        self._evict(self.maxSize, self.maxEntries)
+
+    def _evict(self, targetSize, targetCount):
+        """Remove least recently used entries until the total size is
+        at most `targetSize` and there are at most `targetCount`
+        entries."""
+        with self._lock:
+            self._lastEviction = time.time()
+        entries = sorted(self._entries(), key = lambda e: e[2], reverse = True)
+        totalSize = count = 0
+        for entryDirectory, size, lastUse in entries:
+            if ((targetCount is not None and count >= targetCount) or
+                (targetSize is not None and totalSize + size > targetSize)):
+                self._remove(entryDirectory)
+            else:
+                totalSize += size
+                count += 1
+        with self._lock:
+            self._size, self._count = totalSize, count
+
+    def invalidate(self):
+        """Remove all entries."""
+        for entryDirectory, size, lastUse in self._entries():
+            self._remove(entryDirectory)
+
+    @staticmethod
+    def _listdir(directory):
+        try:
+            return os.listdir(directory)
+        except OSError:
+            return []
@@ -0,0 +1,112 @@
+"""Reading and writing files passed via --returnparameterfile.
+
+Such files contain one line per simple output parameter (integer,
+float, integer-vector etc.) of the form ``name = value``, with the
+value formatted like a command line argument."""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _outputParameters(parameters):
+    """Accept a CLIModule or an iterable of output parameters (e.g. the
+    third list returned by `CLIModule.classifyParameters()`) and return
+    dict mapping names to parameters."""
+    if hasattr(parameters, 'classifyParameters'):
+        parameters = parameters.classifyParameters()[2]
+    return dict((p.name, p) for p in parameters)
+
+
+def _readRaw(filename):
+    """Return dict mapping names to unparsed value strings."""
+    result = {}
+    with open(filename) as f:
+        for line in f.read().splitlines():
+            name, sep, value = line.partition('=')
+            if sep:
+                name = name.strip()
+                if name:
+                    result[name] = value.strip()
+    return result
+
+
+def readReturnParameterFile(filename, parameters):
+    """Read the given return parameter file and return dict mapping
+    parameter names to values parsed with the corresponding output
+    parameter's `parseValue()`.  `parameters` may be a `CLIModule` or
+    its list of output parameters.  Unknown names are ignored with a
+    warning."""
+    byName = _outputParameters(parameters)
+    result = {}
+    for name, value in _readRaw(filename).items():
+        parameter = byName.get(name)
+        if parameter is None:
+            logger.warning("Ignoring unknown return parameter %r in %r" % (name, filename))
+            continue
+        result[name] = parameter.parseValue(value)
+    return result
+
+
+def readReturnParameterFiles(filenames, parameters, asArrays = False):
+    """Read many return parameter files (e.g. from a batch of runs of
+    the same module) at once.  Returns dict mapping each output
+    parameter's name to a list of values, one per file (None where a
+    file lacks that parameter).
+
+    With `asArrays`, the values of numeric parameters are converted in
+    one go into NumPy arrays instead (one-dimensional for scalars, two-
+    dimensional with one row per file for numeric vectors); this
+    requires NumPy and raises a ValueError if any file lacks one of
+    these values."""
+    byName = _outputParameters(parameters)
+    raw = dict((name, []) for name in byName)
+    for filename in filenames:
+        values = _readRaw(filename)
+        for name, column in raw.items():
+            column.append(values.get(name))
+
+    result = {}
+    for name, column in raw.items():
+        parameter = byName[name]
+        if asArrays and (parameter.isNumericVector() or
+                         parameter.typ in ('integer', 'float', 'double')):
+            if None in column:
+                raise ValueError("Return parameter %r missing in %r" % (
+                    name, filenames[column.index(None)]))
+            if parameter.isNumericVector():
+                result[name] = parameter.parseValuesAsArray(column)
+            else:
+                from .module import _numpy
+                result[name] = _numpy().array(column, dtype = parameter._pythonType)
+        else:
+            result[name] = [parameter.parseValue(value) if value is not None else None
+                            for value in column]
+    return result
+
+
+def writeReturnParameterFile(filename, values, parameters = None):
+    """Write the given values (dict mapping names to python values) to
+    a return parameter file.  If `parameters` (a `CLIModule` or its
+    list of output parameters) is given, values are formatted with the
+    corresponding `formatValue()` and unknown names raise a
+    ValueError; otherwise, sequences are joined with commas and
+    booleans written as true/false."""
+    byName = _outputParameters(parameters) if parameters is not None else None
+
+    lines = []
+    for name in sorted(values):
+        value = values[name]
+        if byName is not None:
+            parameter = byName.get(name)
+            if parameter is None:
+                raise ValueError("%r is not an output parameter" % (name, ))
+            value = parameter.formatValue(value)
+        elif isinstance(value, bool):
+            value = 'true' if value else 'false'
+        elif hasattr(value, '__iter__') and not isinstance(value, str):
+            value = ','.join(map(str, value))
+        lines.append('%s = %s\n' % (name, value))
+
+    with open(filename, 'w') as f:
+        f.writelines(lines)
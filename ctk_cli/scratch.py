@@ -0,0 +1,212 @@
+"""Scratch space for the files passed to and from CLI modules.
+
+Parameters of external types (images, transforms, tables, ...) are
+passed as files.  A `ScratchSpace` allocates these files within a
+configurable base directory, which defaults to RAM-backed /dev/shm if
+available, and recycles per-run directories instead of creating and
+deleting them for every CLI call."""
+
+import os, sys, shutil, weakref, tempfile, threading
+
+
+# ioctl request for cloning a file (reflink) on Linux (btrfs, xfs, ...)
+_FICLONE = 0x40049409
+
+
+def defaultScratchBase():
+    """Return /dev/shm if it is a writable directory (Linux tmpfs),
+    otherwise the default directory for temporary files."""
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK | os.X_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+def parameterExtension(parameter):
+    """Return file extension to be used for values of the given
+    parameter ('' for directories and files without fileExtensions)."""
+    if parameter.typ in parameter.EXTERNAL_TYPES:
+        return parameter.defaultExtension()
+    if parameter.typ == 'file' and parameter.fileExtensions:
+        return parameter.fileExtensions[0]
+    return ''
+
+
+def _reflink(source, destination):
+    import fcntl
+    with open(source, 'rb') as src:
+        with open(destination, 'wb') as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+            except:
+                dst.close()
+                os.unlink(destination)
+                raise
+
+
+def linkOrCopy(source, destination, hardLink = True):
+    """Make the file `source` available as `destination` as cheaply as
+    possible: by hard-linking, by reflinking (copy-on-write clone), or
+    by copying it.  Returns 'link', 'reflink' or 'copy'.  Pass
+    `hardLink = False` if changes to one file must not affect the other."""
+    if hardLink:
+        try:
+            os.link(source, destination)
+            return 'link'
+        except (OSError, AttributeError):
+            pass
+    if sys.platform.startswith('linux'):
+        try:
+            _reflink(source, destination)
+            return 'reflink'
+        except (OSError, IOError):
+            pass
+    shutil.copyfile(source, destination)
+    return 'copy'
+
+
+class ScratchDirectory(object):
+    """A directory for the files of one CLI run.  Call `release()`
+    (or use it as context manager) when the files are no longer
+    needed, which empties the directory and returns it to its
+    `ScratchSpace` for reuse (or removes it, if it does not belong to
+    one)."""
+
+    __slots__ = ('path', 'space', '_names')
+
+    def __init__(self, path, space = None):
+        self.path = path
+        self.space = space
+        self._names = set()
+
+    def __repr__(self):
+        return '<ScratchDirectory %r>' % (self.path, )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def _uniqueName(self, name, extension):
+        candidate = name + extension
+        i = 1
+        while candidate in self._names:
+            candidate = '%s_%d%s' % (name, i, extension)
+            i += 1
+        self._names.add(candidate)
+        return candidate
+
+    def allocate(self, parameter, name = None, extension = None):
+        """Return a new path for a value of the given parameter (with
+        the given extension, or the one from `parameterExtension()`).
+        For 'directory' parameters, the directory is created; files
+        are not."""
+        if extension is None:
+            extension = parameterExtension(parameter)
+        path = os.path.join(self.path, self._uniqueName(
+            name or parameter.identifier(), extension))
+        if parameter.typ == 'directory':
+            os.mkdir(path)
+        return path
+
+    def importInput(self, source, parameter = None, name = None):
+        """Make the file `source` available within this directory
+        (hard-linked, reflinked or copied, see `linkOrCopy()`) and return
+        the new path.  If `parameter` is given, the file gets the
+        parameter's extension (e.g. for CLIs that dispatch on the
+        extension); otherwise, it keeps its own."""
+        base, extension = os.path.splitext(os.path.basename(source))
+        if parameter is not None:
+            extension = parameterExtension(parameter) or extension
+        path = os.path.join(self.path, self._uniqueName(name or base, extension))
+        linkOrCopy(source, path)
+        return path
+
+    def clear(self):
+        """Remove all files within this directory."""
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path, ignore_errors = True)
+            else:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+        self._names.clear()
+
+    def release(self):
+        if self.path is None:
+            return # released already
+        if self.space is not None:
+            self.space._recycle(self)
+        else:
+            shutil.rmtree(self.path, ignore_errors = True)
+        self.path = None
+
+
+class ScratchSpace(object):
+    """Pool of `ScratchDirectory` instances within `baseDir` (default:
+    see `defaultScratchBase()`).  Released directories are emptied and
+    kept for reuse (up to `maxIdle` of them); everything is removed by
+    `cleanup()`, at the latest when the ScratchSpace is garbage
+    collected or the interpreter exits.  `baseDir` is created if
+    necessary.
+
+    >>> scratch = ScratchSpace()
+    >>> result = CLIExecution(module).run(values, scratch = scratch)
+    >>> ...
+    >>> result.cleanup() # returns the run's directory to the pool
+    """
+
+    def __init__(self, baseDir = None, maxIdle = 16):
+        self.baseDir = baseDir or defaultScratchBase()
+        self.maxIdle = maxIdle
+        self._lock = threading.Lock()
+        self._root = None
+        self._finalizer = None
+        self._idle = []
+        self._counter = 0
+
+    def __repr__(self):
+        return '<ScratchSpace %r>' % (self._root or self.baseDir, )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cleanup()
+
+    def newDirectory(self):
+        """Return an empty `ScratchDirectory`, reusing a released one
+        if possible."""
+        with self._lock:
+            if self._idle:
+                return ScratchDirectory(self._idle.pop(), self)
+            if self._root is None:
+                os.makedirs(self.baseDir, exist_ok = True)
+                self._root = tempfile.mkdtemp(prefix = 'ctk-cli-scratch-', dir = self.baseDir)
+                # (does not keep self alive, unlike atexit.register(self.cleanup))
+                self._finalizer = weakref.finalize(
+                    self, shutil.rmtree, self._root, ignore_errors = True)
+            self._counter += 1
+            path = os.path.join(self._root, 'run%d' % self._counter)
+        os.mkdir(path)
+        return ScratchDirectory(path, self)
+
+    def _recycle(self, directory):
+        directory.clear()
+        with self._lock:
+            if self._root is not None and len(self._idle) < self.maxIdle:
+                self._idle.append(directory.path)
+                return
+        shutil.rmtree(directory.path, ignore_errors = True)
+
+    def cleanup(self):
+        """Remove all scratch directories (including ones still in use)."""
+        with self._lock:
+            finalizer, self._finalizer = self._finalizer, None
+            self._root = None
+            self._idle = []
+        if finalizer is not None:
+            finalizer() # removes the root directory
@@ -0,0 +1,144 @@
+"""Compact serialization of parsed `CLIModule` trees.
+
+`dumpModule()` converts a module with all its parameter groups and
+parameters into nested tuples of plain values, encoded either as JSON
+(portable, human-readable) or with `marshal` (binary, fastest, meant
+for exchanging modules between processes of the same Python
+installation, e.g. with multiprocessing workers).  `loadModule()`
+rebuilds the objects directly from that data, without any XML parsing.
+`loadCompiledModule()` uses this for caching parsed XML description
+files.
+"""
+
+import os, json, marshal, hashlib, logging
+
+from .cache import defaultCacheDirectory, statSignature, _atomicWrite
+from .module import CLIModule, CLIParameters, CLIParameter, CLIConstraints, CLIDiagnostics, _tagToIdentifier
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+_JSON_FORMAT = 'ctk-cli-module'
+_BINARY_MAGIC = b'CTKCLI\x00'
+
+MODULE_FIELDS = ('path', ) + tuple(map(_tagToIdentifier,
+                                       CLIModule.REQUIRED_ELEMENTS + CLIModule.OPTIONAL_ELEMENTS))
+PARAMETERS_FIELDS = ('advanced', ) + CLIParameters.REQUIRED_ELEMENTS
+PARAMETER_FIELDS = ('typ', 'hidden') + CLIParameter.REQUIRED_ELEMENTS + CLIParameter.OPTIONAL_ELEMENTS + (
+    'multiple', 'elements', 'coordinateSystem', 'fileExtensions', 'reference', 'subtype')
+CONSTRAINTS_FIELDS = CLIConstraints.REQUIRED_ELEMENTS + CLIConstraints.OPTIONAL_ELEMENTS
+
+
+def _fields(obj, fields):
+    return tuple(getattr(obj, field) for field in fields)
+
+def _setFields(obj, fields, values):
+    for field, value in zip(fields, values):
+        setattr(obj, field, value)
+
+
+def moduleToData(module):
+    """Return nested tuples of plain python values (str, int, float,
+    bool, None, lists) representing the given module."""
+    return (_fields(module, MODULE_FIELDS),
+            tuple((_fields(parameters, PARAMETERS_FIELDS),
+                   tuple((_fields(parameter, PARAMETER_FIELDS),
+                          _fields(parameter.constraints, CONSTRAINTS_FIELDS)
+                          if parameter.constraints is not None else None)
+                         for parameter in parameters))
+                  for parameters in module))
+
+
+def moduleFromData(data):
+    """Inverse of `moduleToData()`."""
+    moduleFields, groups = data
+
+    module = CLIModule.__new__(CLIModule)
+    _setFields(module, MODULE_FIELDS, moduleFields)
+    module.diagnostics = CLIDiagnostics(module.name)
+    module._pendingNodes = None
+    module._indexes = None
+
+    for groupFields, parameterData in groups:
+        parameters = CLIParameters()
+        _setFields(parameters, PARAMETERS_FIELDS, groupFields)
+        for parameterFields, constraintsFields in parameterData:
+            parameter = CLIParameter()
+            _setFields(parameter, PARAMETER_FIELDS, parameterFields)
+            parameter._pythonType = CLIParameter.pythonElementType(parameter.typ)
+            if constraintsFields is None:
+                parameter.constraints = None
+            else:
+                parameter.constraints = CLIConstraints()
+                _setFields(parameter.constraints, CONSTRAINTS_FIELDS, constraintsFields)
+            parameter._codec = None # compiled on demand
+            parameters.append(parameter)
+        list.append(module, parameters)
+
+    return module
+
+
+def dumpModule(module, binary = False):
+    """Serialize the given `CLIModule`.  Returns a JSON string by
+    default, or bytes if `binary` is set."""
+    data = moduleToData(module)
+    if binary:
+        return _BINARY_MAGIC + bytes(bytearray([FORMAT_VERSION])) + marshal.dumps(data)
+    return json.dumps([_JSON_FORMAT, FORMAT_VERSION, data], separators = (',', ':'))
+
+
+def loadModule(serialized):
+    """Deserialize a `CLIModule` from data created by `dumpModule()`
+    (either mode)."""
+    if isinstance(serialized, bytes) and serialized.startswith(_BINARY_MAGIC):
+        version = bytearray(serialized[len(_BINARY_MAGIC):len(_BINARY_MAGIC) + 1])[0]
+        if version != FORMAT_VERSION:
+            raise ValueError("Unsupported serialization format version %d" % (version, ))
+        return moduleFromData(marshal.loads(serialized[len(_BINARY_MAGIC) + 1:]))
+
+    if isinstance(serialized, bytes):
+        serialized = serialized.decode('utf-8')
+    try:
+        format, version, data = json.loads(serialized)
+    except ValueError:
+        raise ValueError("Not a serialized CLIModule")
+    if format != _JSON_FORMAT:
+        raise ValueError("Not a serialized CLIModule")
+    if version != FORMAT_VERSION:
+        raise ValueError("Unsupported serialization format version %d" % (version, ))
+    return moduleFromData(data)
+
+
+def loadCompiledModule(xmlFilename, cacheDirectory = None):
+    """Return `CLIModule` for the given XML description file, using a
+    compiled (i.e. serialized) version stored within `cacheDirectory`
+    (default: $XDG_CACHE_HOME/ctk-cli/modules) if it is up to date.
+    Otherwise, the XML is parsed and the compiled version (re)written,
+    which is silently skipped if the cache directory is not writable.
+
+    Cache entries are invalidated by any change of the XML file's
+    path, size, mtime or inode."""
+    cacheDirectory = cacheDirectory or defaultCacheDirectory('modules')
+    signature = repr(statSignature(xmlFilename)).encode('utf-8')
+    cacheFilename = os.path.join(
+        cacheDirectory, hashlib.sha1(os.path.realpath(xmlFilename).encode('utf-8')).hexdigest())
+
+    try:
+        with open(cacheFilename, 'rb') as f:
+            cachedSignature, _, serialized = f.read().partition(b'\n')
+        if cachedSignature == signature:
+            return loadModule(serialized)
+    except (OSError, IOError, ValueError, EOFError, TypeError):
+        pass # no or invalid cache entry
+
+    module = CLIModule(xmlFilename)
+
+    try:
+        if not os.path.isdir(cacheDirectory):
+            os.makedirs(cacheDirectory)
+        _atomicWrite(cacheFilename, signature + b'\n' + dumpModule(module, binary = True))
+    except (OSError, IOError) as e:
+        logger.debug("Could not write compiled module to %r: %s" % (cacheFilename, e))
+
+    return module
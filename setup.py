@@ -3,7 +3,12 @@ from setuptools import setup, find_packages
 setup(
     name = "ctk-cli",
     version = "1.5",
-    packages = find_packages(),
+    packages = find_packages(exclude = ['tests', 'benchmarks']),
+    test_suite = 'tests',
+    python_requires = '>=3.6',
+    extras_require = {
+        'numpy': ['numpy'],
+    },
     description = "Python interface for inspecting and running CLI modules (as defined by CommonTK)",
     license = 'Apache 2.0',
     keywords = "CTK CLI Slicer host plugin module execution model XML",
@@ -12,8 +17,8 @@ setup(
         'Environment :: Web Environment',
         'License :: OSI Approved :: Apache Software License',
         'Operating System :: OS Independent',
-        'Programming Language :: Python :: 2',
         'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
     ],
     author='Hans Meine',
     author_email='hans_meine@gmx.net',
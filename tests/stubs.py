@@ -0,0 +1,226 @@
+"""Stub CLI executables and a stub Slicer launcher for the tests.
+
+`AddScalar` is a python CLI based on `CLIArgumentParser` that reads a
+number from its input file, adds `--scalar` to it, writes the result
+to its output file and returns it as return parameter `sum`.  Every
+invocation (including --xml) is logged to `calls.log` next to it.
+"""
+
+import os, sys, stat, shutil, tempfile, unittest
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ADD_SCALAR_XML = '''<?xml version="1.0" encoding="utf-8"?>
+<executable>
+  <category>Testing</category>
+  <title>Add Scalar</title>
+  <description>Adds a scalar to the number in a file.</description>
+  <version>1.0</version>
+  <contributor>ctk-cli</contributor>
+  <parameters>
+    <label>IO</label>
+    <description>Input and output files</description>
+    <file fileExtensions=".txt">
+      <name>inputFile</name>
+      <label>Input</label>
+      <channel>input</channel>
+      <index>0</index>
+      <description>File containing the input number</description>
+    </file>
+    <file fileExtensions=".txt">
+      <name>outputFile</name>
+      <label>Output</label>
+      <channel>output</channel>
+      <index>1</index>
+      <description>File receiving the result</description>
+    </file>
+  </parameters>
+  <parameters>
+    <label>Options</label>
+    <description>Computation options</description>
+    <double>
+      <name>scalar</name>
+      <longflag>scalar</longflag>
+      <label>Scalar</label>
+      <description>Value to add</description>
+      <default>1</default>
+      <constraints>
+        <minimum>-10</minimum>
+        <maximum>10</maximum>
+        <step>0.5</step>
+      </constraints>
+    </double>
+    <boolean>
+      <name>negate</name>
+      <flag>n</flag>
+      <longflag>negate</longflag>
+      <label>Negate</label>
+      <description>Negate the result</description>
+      <default>false</default>
+    </boolean>
+    <string-enumeration>
+      <name>mode</name>
+      <longflag>mode</longflag>
+      <label>Mode</label>
+      <description>Operation</description>
+      <default>add</default>
+      <element>add</element>
+      <element>subtract</element>
+    </string-enumeration>
+    <integer-vector>
+      <name>size</name>
+      <longflag>size</longflag>
+      <label>Size</label>
+      <description>Returned as outSize</description>
+      <default>1,2,3</default>
+    </integer-vector>
+    <double>
+      <name>sleep</name>
+      <longflag>sleep</longflag>
+      <label>Sleep</label>
+      <description>Seconds to sleep before doing anything</description>
+      <default>0</default>
+    </double>
+    <string>
+      <name>pidFile</name>
+      <longflag>pidfile</longflag>
+      <label>PID file</label>
+      <description>Spawn a long-running child process and write its pid to this file</description>
+    </string>
+  </parameters>
+  <parameters advanced="true">
+    <label>Outputs</label>
+    <description>Return parameters</description>
+    <double>
+      <name>sum</name>
+      <channel>output</channel>
+      <label>Sum</label>
+      <description>The result</description>
+    </double>
+    <integer-vector>
+      <name>outSize</name>
+      <channel>output</channel>
+      <label>Output size</label>
+      <description>The given size</description>
+    </integer-vector>
+  </parameters>
+</executable>
+'''
+
+ADD_SCALAR_SCRIPT = '''#!%(python)s
+import os, sys, time, subprocess
+sys.path.insert(0, %(repository)r)
+here = os.path.dirname(os.path.abspath(__file__))
+with open(os.path.join(here, 'calls.log'), 'a') as f:
+    f.write(' '.join(sys.argv[1:]) + '\\n')
+
+from ctk_cli import CLIArgumentParser
+
+parser = CLIArgumentParser(os.path.join(here, 'AddScalar.xml'))
+args = parser.parse_args()
+
+print('<filter-start><filter-name>AddScalar</filter-name>'
+      '<filter-comment>adding</filter-comment></filter-start>')
+sys.stdout.flush()
+if args.pidFile:
+    child = subprocess.Popen(['sleep', '60'])
+    with open(args.pidFile, 'w') as f:
+        f.write('%%d\\n' %% child.pid)
+time.sleep(args.sleep)
+
+with open(args.inputFile) as f:
+    value = float(f.read())
+value = value + args.scalar if args.mode == 'add' else value - args.scalar
+if args.negate:
+    value = -value
+with open(args.outputFile, 'w') as f:
+    f.write('%%s\\n' %% value)
+
+print('<filter-progress>0.5</filter-progress>')
+print('result %%s' %% value)
+sys.stderr.write('done\\n')
+print('<filter-end><filter-name>AddScalar</filter-name><filter-time>0.1</filter-time></filter-end>')
+parser.write_return_parameters(args, dict(sum = value, outSize = args.size))
+'''
+
+LAUNCHER_SCRIPT = '''#!/bin/sh
+echo launched >> "$(dirname "$0")/launcher.log"
+[ "$1" = "--launcher-no-splash" ] && shift
+[ "$1" = "--launch" ] && shift
+SLICER_STUB_VARIABLE=stub
+export SLICER_STUB_VARIABLE
+exec "$@"
+'''
+
+
+# AddScalar without return parameters (and hence without --returnparameterfile)
+ADD_SCALAR_NO_OUTPUTS_XML = ADD_SCALAR_XML[
+    :ADD_SCALAR_XML.index('  <parameters advanced="true">')] + '</executable>\n'
+
+
+def writeExecutable(path, content):
+    with open(path, 'w') as f:
+        f.write(content)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
+
+
+def writeAddScalar(directory, xml = ADD_SCALAR_XML):
+    """Write the AddScalar stub CLI (and its XML description, which
+    may be modified via `xml`) into `directory` and return the
+    executable's path."""
+    with open(os.path.join(directory, 'AddScalar.xml'), 'w') as f:
+        f.write(xml)
+    return writeExecutable(os.path.join(directory, 'AddScalar'), ADD_SCALAR_SCRIPT % dict(
+        python = sys.executable, repository = REPOSITORY))
+
+
+def writeSlicerTree(directory):
+    """Write a stub Slicer installation (launcher and AddScalar CLI
+    module) into `directory`; returns (launcher path, CLI path)."""
+    launcher = writeExecutable(os.path.join(directory, 'Slicer'), LAUNCHER_SCRIPT)
+    moduleDirectory = os.path.join(directory, 'lib', 'Slicer-5.2', 'cli-modules')
+    os.makedirs(moduleDirectory)
+    return launcher, writeAddScalar(moduleDirectory)
+
+
+def callCount(cliExecutable, argument = None):
+    """Return how often the stub CLI has been called (with the given
+    argument, if any)."""
+    try:
+        with open(os.path.join(os.path.dirname(cliExecutable), 'calls.log')) as f:
+            return sum(1 for line in f if argument is None or argument in line.split())
+    except IOError:
+        return 0
+
+
+def isRunning(pid):
+    """Return True iff a (non-zombie) process with the given pid exists."""
+    try:
+        with open('/proc/%d/stat' % pid) as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except IOError:
+        pass
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+@unittest.skipIf(sys.platform.startswith('win'), 'stub executables require a POSIX system')
+class StubTestCase(unittest.TestCase):
+    """Base class providing a temporary directory `self.directory`
+    with the AddScalar stub (`self.cli`) and an input file containing
+    the number 5 (`self.inputFile`)."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix = 'ctk-cli-test-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.cli = writeAddScalar(self.directory)
+        self.inputFile = os.path.join(self.directory, 'input.txt')
+        with open(self.inputFile, 'w') as f:
+            f.write('5\n')
+
+    def path(self, *names):
+        return os.path.join(self.directory, *names)
@@ -0,0 +1,62 @@
+import asyncio, time, unittest
+
+from ctk_cli import CLITimeoutError, XMLDescriptionCache
+from ctk_cli.aio import describeCLIModuleAsync, getXMLDescriptionAsync, runCLIExecutableAsync
+
+from .stubs import StubTestCase, isRunning, writeExecutable
+
+LONG_LINE_CLI = '''#!/bin/sh
+printf '%%s' 'warning' >&2
+echo '<executable><title>%s</title></executable>'
+'''
+
+
+class AsyncTest(StubTestCase):
+    def run_async(self, coroutine):
+        return asyncio.run(coroutine)
+
+    def test_describe(self):
+        module = self.run_async(describeCLIModuleAsync(self.cli, timeout = 60))
+        self.assertEqual(module.title, 'Add Scalar')
+        self.assertEqual(len(list(module.parameters())), 10)
+
+    def test_unwritable_cache(self):
+        cache = XMLDescriptionCache(self.path('input.txt', 'cache')) # (below a regular file)
+        module = self.run_async(describeCLIModuleAsync(self.cli, cache = cache))
+        self.assertEqual(module.title, 'Add Scalar')
+
+    def test_long_line(self):
+        title = 'x' * 300000
+        cli = writeExecutable(self.path('LongLine'), LONG_LINE_CLI % title)
+        elementTree = self.run_async(getXMLDescriptionAsync(cli))
+        self.assertEqual(elementTree.getroot().find('title').text, title)
+
+    def test_run(self):
+        exitCode, stdout, stderr = self.run_async(runCLIExecutableAsync(
+            [self.cli, self.inputFile, self.path('out.txt'), '--negate'], timeout = 60))
+        self.assertEqual(exitCode, 0)
+        self.assertIn(b'result -6.0', stdout)
+        self.assertEqual(stderr, b'done\n')
+
+    def test_timeout(self):
+        hanging = writeExecutable(self.path('Hang'), '#!/bin/sh\nexec sleep 30\n')
+        start = time.time()
+        with self.assertRaises(CLITimeoutError):
+            self.run_async(getXMLDescriptionAsync(hanging, timeout = 0.5))
+        self.assertLess(time.time() - start, 20)
+
+    def test_parse_error_kills_process(self):
+        pidFile = self.path('pid')
+        cli = writeExecutable(self.path('Broken'),
+                              '#!/bin/sh\necho $$ > %s\necho "<executable><oops>"\n'
+                              'echo "</executable>"\nexec sleep 30\n' % pidFile)
+        start = time.time()
+        with self.assertRaises(Exception):
+            self.run_async(getXMLDescriptionAsync(cli))
+        self.assertLess(time.time() - start, 20)
+        with open(pidFile) as f:
+            self.assertFalse(isRunning(int(f.read())))
+
+
+if __name__ == '__main__':
+    unittest.main()
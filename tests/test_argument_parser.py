@@ -0,0 +1,76 @@
+import os, sys, subprocess, unittest
+
+from ctk_cli import CLIArgumentParser, CLIModule, readReturnParameterFile
+
+from .stubs import StubTestCase
+
+
+class CLIArgumentParserTest(StubTestCase):
+    def setUp(self):
+        super(CLIArgumentParserTest, self).setUp()
+        self.parser = CLIArgumentParser(self.path('AddScalar.xml'))
+
+    def parse(self, *argv):
+        return self.parser.parse_args(['in.txt', 'out.txt'] + list(argv))
+
+    def test_defaults(self):
+        args = self.parse()
+        self.assertEqual((args.inputFile, args.outputFile), ('in.txt', 'out.txt'))
+        self.assertEqual(args.scalar, 1.0)
+        self.assertIs(args.negate, False)
+        self.assertEqual(args.size, [1, 2, 3])
+
+    def test_values(self):
+        args = self.parse('--scalar', '2.5', '--mode', 'subtract', '--size', '4,5,6')
+        self.assertEqual((args.scalar, args.mode, args.size), (2.5, 'subtract', [4, 5, 6]))
+
+    def test_boolean_switch(self):
+        self.assertIs(self.parse('--negate').negate, True)
+        self.assertIs(self.parse('-n').negate, True)
+        self.assertIs(self.parse('--negate=false').negate, False)
+        self.assertIs(self.parse('--negate=true').negate, True)
+        self.assertIs(self.parse('-n=0').negate, False)
+        self.assertIs(self.parse('--negate', '--scalar', '2').negate, True)
+        self.assertIs(self.parse('--negate=false', '-n').negate, True)
+        self.assertIs(self.parse('-n', '--negate=false').negate, False)
+
+    def test_boolean_switch_before_positionals(self):
+        args = self.parser.parse_args(['--negate', 'in.txt', 'out.txt'])
+        self.assertIs(args.negate, True)
+        self.assertEqual((args.inputFile, args.outputFile), ('in.txt', 'out.txt'))
+
+    def assertParseError(self, *argv):
+        with open(os.devnull, 'w') as devnull:
+            stderr, sys.stderr = sys.stderr, devnull
+            try:
+                self.assertRaises(SystemExit, self.parse, *argv)
+            finally:
+                sys.stderr = stderr
+
+    def test_invalid_values(self):
+        for argv in (['--scalar', 'x'], ['--mode', 'multiply'], ['--negate=maybe'],
+                     ['--negate', 'true']):
+            self.assertParseError(*argv)
+
+    def test_constraints(self):
+        self.assertEqual(self.parse('--scalar', '10.25').scalar, 10.25) # (maximum 10)
+        self.parser = CLIArgumentParser(self.path('AddScalar.xml'), enforce_constraints = True)
+        self.assertEqual(self.parse('--scalar', '10').scalar, 10.0)
+        self.assertParseError('--scalar', '10.25')
+        self.assertParseError('--scalar', 'x')
+
+    def test_return_parameters(self):
+        filename = self.path('params.txt')
+        args = self.parse('--returnparameterfile', filename)
+        self.parser.write_return_parameters(args, dict(sum = 1.5, outSize = [1, 2]))
+        outputs = CLIModule(self.path('AddScalar.xml')).classifyParameters()[2]
+        self.assertEqual(readReturnParameterFile(filename, outputs), dict(sum = 1.5, outSize = [1, 2]))
+
+    def test_xml(self):
+        output = subprocess.check_output([self.cli, '--xml'])
+        with open(self.path('AddScalar.xml'), 'rb') as f:
+            self.assertEqual(output.strip(), f.read().strip())
+
+
+if __name__ == '__main__':
+    unittest.main()
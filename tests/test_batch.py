@@ -0,0 +1,59 @@
+import time, unittest
+
+from ctk_cli import CLIExecution, CLIModule, batchJobKey, runBatch
+
+from .stubs import StubTestCase, callCount
+
+
+class RunBatchTest(StubTestCase):
+    def setUp(self):
+        super(RunBatchTest, self).setUp()
+        self.execution = CLIExecution(CLIModule(self.cli))
+
+    def cliRuns(self):
+        return callCount(self.cli) - callCount(self.cli, '--xml')
+
+    def test_results(self):
+        parameterSets = [dict(inputFile = self.inputFile, scalar = float(i)) for i in range(5)]
+        sums = {}
+        for index, result, error in runBatch(self.execution, parameterSets, maxWorkers = 2):
+            self.assertIsNone(error)
+            sums[index] = result.check().outputs['sum']
+            result.cleanup()
+        self.assertEqual(sums, dict((i, 5.0 + i) for i in range(5)))
+
+    def test_checkpoint(self):
+        checkpoint = self.path('checkpoint.jsonl')
+        parameterSets = [dict(inputFile = self.inputFile, outputFile = self.path('out%d.txt' % i),
+                              scalar = float(i)) for i in range(3)]
+        for index, result, error in runBatch(self.execution, parameterSets[:2], checkpoint = checkpoint):
+            result.cleanup()
+        with open(checkpoint, 'a') as f:
+            f.write('{"index": 1, "ke') # (truncated by a crash)
+        results = {}
+        for index, result, error in runBatch(self.execution, parameterSets, checkpoint = checkpoint):
+            results[index] = result.check()
+            result.cleanup()
+        self.assertEqual(self.cliRuns(), 3)
+        self.assertEqual(sorted(results), [0, 1, 2])
+        for i in range(3):
+            self.assertEqual(results[i].outputs['sum'], 5.0 + i)
+            self.assertEqual(results[i].outputs['outputFile'], self.path('out%d.txt' % i))
+        self.assertEqual(results[0].command[0], self.cli)
+        self.assertIsNone(results[0].resourceUsage)
+        self.assertNotEqual(batchJobKey(parameterSets[0]), batchJobKey(parameterSets[1]))
+
+    def test_early_exit_cancels_queued_jobs(self):
+        parameterSets = [dict(inputFile = self.inputFile, sleep = 0.5) for i in range(10)]
+        start = time.time()
+        jobs = runBatch(self.execution, parameterSets, maxWorkers = 1)
+        index, result, error = next(jobs)
+        result.cleanup()
+        jobs.close()
+        self.assertLess(time.time() - start, 3.5)
+        time.sleep(0.5)
+        self.assertLessEqual(self.cliRuns(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+import os, time, unittest
+import xml.etree.ElementTree as ET
+
+from ctk_cli import CLIExecution, CLIModule, CLIResultCache, XMLDescriptionCache, getXMLDescription
+
+from .stubs import StubTestCase, callCount
+
+
+def touch(path, content = None):
+    """Change the stat signature of `path` (appending `content`, if given)."""
+    if content is not None:
+        with open(path, 'a') as f:
+            f.write(content)
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+
+
+class XMLDescriptionCacheTest(StubTestCase):
+    def setUp(self):
+        super(XMLDescriptionCacheTest, self).setUp()
+        self.cache = XMLDescriptionCache(self.path('cache'))
+
+    def xmlCalls(self):
+        return callCount(self.cli, '--xml')
+
+    def test_hit(self):
+        first = getXMLDescription(self.cli, cache = self.cache)
+        second = getXMLDescription(self.cli, cache = self.cache)
+        self.assertEqual(self.xmlCalls(), 1)
+        self.assertEqual(second.find('title').text, 'Add Scalar')
+        self.assertEqual(second.find('title').text, first.find('title').text)
+
+        module = CLIModule(self.cli, cache = self.cache)
+        self.assertEqual(self.xmlCalls(), 1)
+        self.assertEqual(len(list(module.parameters())), 10)
+
+    def test_env_is_part_of_the_key(self):
+        getXMLDescription(self.cli, cache = self.cache)
+        getXMLDescription(self.cli, cache = self.cache, env = dict(os.environ, FOO = 'bar'))
+        self.assertEqual(self.xmlCalls(), 2)
+
+    def test_changed_executable(self):
+        getXMLDescription(self.cli, cache = self.cache)
+        touch(self.cli, '\n')
+        getXMLDescription(self.cli, cache = self.cache)
+        self.assertEqual(self.xmlCalls(), 2)
+        getXMLDescription(self.cli, cache = self.cache)
+        self.assertEqual(self.xmlCalls(), 2)
+
+    def test_invalidate(self):
+        getXMLDescription(self.cli, cache = self.cache)
+        self.cache.invalidate(self.cli)
+        self.assertIsNone(self.cache.get(self.cli))
+        getXMLDescription(self.cli, cache = self.cache)
+        self.cache.invalidate()
+        getXMLDescription(self.cli, cache = self.cache)
+        self.assertEqual(self.xmlCalls(), 3)
+
+    def test_unwritable_cache(self):
+        cache = XMLDescriptionCache(self.path('input.txt', 'cache')) # (below a regular file)
+        self.assertEqual(CLIModule(self.cli, cache = cache).title, 'Add Scalar')
+        self.assertEqual(self.xmlCalls(), 1)
+
+    def test_corrupt_entry(self):
+        getXMLDescription(self.cli, cache = self.cache)
+        with open(self.cache._entryFilename(self.cli, None), 'w') as f:
+            f.write('<executable')
+        self.assertIsNone(self.cache.get(self.cli))
+
+    def test_eviction(self):
+        self.cache.maxAge = 60
+        getXMLDescription(self.cli, cache = self.cache)
+        filename = self.cache._entryFilename(self.cli, None)
+        os.utime(filename, (time.time() - 120, time.time() - 120))
+        self.cache.evict()
+        self.assertFalse(os.path.exists(filename))
+
+    def storeEntries(self, count):
+        """Store `count` entries (with different env) and return their size."""
+        tree = getXMLDescription(self.cli)
+        for i in range(count):
+            self.cache.put(self.cli, tree, env = dict(INDEX = str(i)))
+        return len(ET.tostring(tree.getroot()))
+
+    def countScans(self):
+        """Return list growing by one item per scan of all entries."""
+        scans = []
+        entries = self.cache._entries
+        def countingEntries():
+            scans.append(None)
+            return entries()
+        self.cache._entries = countingEntries
+        return scans
+
+    def test_max_size(self):
+        size = self.storeEntries(1)
+        self.cache.maxSize = 5 * size
+        self.storeEntries(20)
+        totalSize = sum(size for filename, size, atime in self.cache._entries())
+        self.assertLessEqual(totalSize, 5 * size)
+        self.assertGreater(totalSize, 0)
+
+    def test_put_does_not_always_scan(self):
+        self.cache.maxAge = 3600
+        self.cache.maxSize = 10 ** 6
+        scans = self.countScans()
+        self.storeEntries(20)
+        self.assertEqual(len(scans), 1)
+
+
+class CLIResultCacheTest(StubTestCase):
+    def setUp(self):
+        super(CLIResultCacheTest, self).setUp()
+        self.cache = CLIResultCache(self.path('results'))
+        self.execution = CLIExecution(CLIModule(self.cli))
+
+    def run_cli(self, **values):
+        values.setdefault('inputFile', self.inputFile)
+        result = self.execution.run(values, resultCache = self.cache)
+        self.addCleanup(result.cleanup)
+        return result.check()
+
+    def cliRuns(self):
+        return callCount(self.cli) - callCount(self.cli, '--xml')
+
+    def test_hit(self):
+        first = self.run_cli(scalar = 2.0)
+        second = self.run_cli(scalar = 2.0)
+        self.assertEqual(self.cliRuns(), 1)
+        self.assertIsNone(second.resourceUsage)
+        self.assertEqual(second.stdout, first.stdout)
+        self.assertEqual(second.outputs['sum'], 7.0)
+        self.assertEqual(second.outputs['outSize'], [1, 2, 3])
+        self.assertNotEqual(second.outputs['outputFile'], first.outputs['outputFile'])
+        with open(second.outputs['outputFile']) as f:
+            self.assertEqual(float(f.read()), 7.0)
+
+    def test_defaults_are_normalized(self):
+        self.run_cli()
+        self.run_cli(scalar = 1.0, mode = 'add')
+        self.assertEqual(self.cliRuns(), 1)
+
+    def test_changed_values(self):
+        self.run_cli(scalar = 2.0)
+        self.assertEqual(self.run_cli(scalar = 3.0).outputs['sum'], 8.0)
+        self.assertEqual(self.cliRuns(), 2)
+
+    def test_changed_input_file(self):
+        self.run_cli()
+        with open(self.inputFile, 'w') as f:
+            f.write('6\n')
+        self.assertEqual(self.run_cli().outputs['sum'], 7.0)
+        self.assertEqual(self.cliRuns(), 2)
+
+    def test_changed_executable(self):
+        self.run_cli()
+        touch(self.cli, '\n')
+        self.run_cli()
+        self.assertEqual(self.cliRuns(), 2)
+
+    def test_store_errors_are_not_fatal(self):
+        def store(*args):
+            raise OSError(28, 'No space left on device')
+        self.cache.store = store
+        with self.assertLogs('ctk_cli.execution', 'WARNING'):
+            result = self.run_cli(scalar = 2.0)
+        self.assertEqual(result.outputs['sum'], 7.0)
+        with open(result.outputs['outputFile']) as f:
+            self.assertEqual(float(f.read()), 7.0)
+
+    def test_failures_are_not_cached(self):
+        with open(self.inputFile, 'w') as f:
+            f.write('not a number\n')
+        for i in range(2):
+            result = self.execution.run(dict(inputFile = self.inputFile), resultCache = self.cache)
+            result.cleanup()
+            self.assertNotEqual(result.exitCode, 0)
+        self.assertEqual(self.cliRuns(), 2)
+
+    def test_invalidate(self):
+        self.run_cli()
+        self.cache.invalidate()
+        self.run_cli()
+        self.assertEqual(self.cliRuns(), 2)
+
+    def test_max_entries(self):
+        self.cache.maxEntries = 2
+        for scalar in (1.0, 2.0, 3.0):
+            self.run_cli(scalar = scalar)
+        self.assertEqual(len(self.cache._entries()), 1) # (evicted with headroom)
+        self.run_cli(scalar = 3.0)
+        self.assertEqual(self.cliRuns(), 3) # the most recent entry was kept
+
+    def storeEntries(self, count, start = 0):
+        """Store `count` entries (with stdout of 1000 bytes) directly."""
+        for i in range(start, start + count):
+            self.cache.store('%040x' % i, b'x' * 1000, b'', {})
+
+    def test_max_size(self):
+        self.cache.maxSize = 10000
+        self.storeEntries(30)
+        totalSize = sum(size for entryDirectory, size, lastUse in self.cache._entries())
+        self.assertLessEqual(totalSize, 10000)
+        self.assertGreater(totalSize, 0)
+
+    def test_store_does_not_always_scan(self):
+        self.cache.maxSize = 10 ** 6
+        self.cache.maxEntries = 15
+        scans = []
+        entries = self.cache._entries
+        def countingEntries():
+            scans.append(None)
+            return entries()
+        self.cache._entries = countingEntries
+        self.storeEntries(15)
+        self.assertEqual(len(scans), 1) # only on the first store()
+        self.storeEntries(3, 15)
+        self.assertEqual(len(scans), 2) # once more than 15 entries (evicting down to 13)
+        self.assertEqual(len(entries()), 15)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import os, shutil, unittest
+
+from ctk_cli import CLICatalog, discoverCLIModules
+
+from .stubs import StubTestCase, callCount, writeAddScalar, writeExecutable, writeSlicerTree
+
+
+class DiscoverCLIModulesTest(StubTestCase):
+    def setUp(self):
+        super(DiscoverCLIModulesTest, self).setUp()
+        self.broken = writeExecutable(self.path('Broken'), '#!/bin/sh\nexit 1\n')
+        with open(self.path('NotExecutable'), 'w') as f:
+            f.write('#!/bin/sh\n')
+        writeExecutable(self.path('.Hidden'), '#!/bin/sh\nexit 1\n')
+
+    def test_modules_and_failures(self):
+        result = discoverCLIModules(self.directory, maxWorkers = 2)
+        self.assertEqual(list(result), ['AddScalar'])
+        self.assertEqual(result['AddScalar'].path, self.cli)
+        self.assertEqual(result['AddScalar'].title, 'Add Scalar')
+        self.assertEqual(list(result.failures), [self.broken])
+        self.assertIsInstance(result.failures[self.broken], RuntimeError)
+
+    def test_first_directory_wins(self):
+        os.mkdir(self.path('other'))
+        other = writeAddScalar(self.path('other'))
+        result = discoverCLIModules([self.path('other'), self.directory])
+        self.assertEqual(result['AddScalar'].path, other)
+        self.assertEqual(callCount(self.cli, '--xml'), 1) # described nevertheless
+        result = discoverCLIModules([self.directory, self.path('other')])
+        self.assertEqual(result['AddScalar'].path, self.cli)
+
+    def test_lazy(self):
+        module = discoverCLIModules(self.directory, lazy = True)['AddScalar']
+        self.assertFalse(module.isParsed())
+        self.assertEqual(len(module), 3)
+
+    def test_missing_directory(self):
+        result = discoverCLIModules(self.path('missing'))
+        self.assertEqual((dict(result), result.failures), ({}, {}))
+
+
+class RecordingCatalog(CLICatalog):
+    """CLICatalog recording all modifications of the mapping."""
+
+    __slots__ = ('modifications', )
+
+    def __init__(self, *args, **kwargs):
+        super(RecordingCatalog, self).__init__(*args, **kwargs)
+        self.modifications = []
+
+    def __setitem__(self, name, module):
+        self.modifications.append(('set', name))
+        super(RecordingCatalog, self).__setitem__(name, module)
+
+    def __delitem__(self, name):
+        self.modifications.append(('del', name))
+        super(RecordingCatalog, self).__delitem__(name)
+
+    def clear(self):
+        self.modifications.append(('clear', ))
+        super(RecordingCatalog, self).clear()
+
+
+class CLICatalogTest(StubTestCase):
+    def setUp(self):
+        super(CLICatalogTest, self).setUp()
+        self.catalog = CLICatalog(self.directory)
+
+    def xmlCalls(self):
+        return callCount(self.cli, '--xml')
+
+    def test_unchanged_executables_are_not_described_again(self):
+        self.assertEqual(self.catalog.rescan(), [self.cli])
+        module = self.catalog['AddScalar']
+        self.assertEqual(self.catalog.rescan(), [])
+        self.assertIs(self.catalog['AddScalar'], module)
+        self.assertEqual(self.xmlCalls(), 1)
+
+    def test_changed_executable(self):
+        self.catalog.rescan()
+        with open(self.cli, 'a') as f:
+            f.write('# changed\n')
+        self.assertEqual(self.catalog.rescan(), [self.cli])
+        self.assertEqual(self.xmlCalls(), 2)
+
+    def test_added_and_removed_executables(self):
+        self.catalog.rescan()
+        broken = writeExecutable(self.path('Broken'), '#!/bin/sh\nexit 1\n')
+        self.assertEqual(self.catalog.rescan(), [broken])
+        self.assertEqual(list(self.catalog.failures), [broken])
+        self.assertEqual(self.catalog.rescan(), []) # failures are not retried
+        self.assertEqual(list(self.catalog.failures), [broken])
+
+        os.unlink(broken)
+        os.unlink(self.cli)
+        self.assertEqual(self.catalog.rescan(), [])
+        self.assertEqual((dict(self.catalog), self.catalog.failures), ({}, {}))
+
+    def test_only_differences_are_applied(self):
+        catalog = RecordingCatalog(self.directory)
+        catalog.rescan()
+        self.assertEqual(catalog.modifications, [('set', 'AddScalar')])
+        del catalog.modifications[:]
+        catalog.rescan()
+        self.assertEqual(catalog.modifications, [])
+
+        writeExecutable(self.path('Broken'), '#!/bin/sh\nexit 1\n')
+        with open(self.cli, 'a') as f:
+            f.write('# changed\n')
+        catalog.rescan()
+        self.assertEqual(catalog.modifications, [('set', 'AddScalar')])
+        del catalog.modifications[:]
+        os.unlink(self.cli)
+        catalog.rescan()
+        self.assertEqual(catalog.modifications, [('del', 'AddScalar')])
+
+    def test_slicer_extensions(self):
+        slicerRoot = self.path('Slicer')
+        os.mkdir(slicerRoot)
+        launcher, cli = writeSlicerTree(slicerRoot)
+        catalog = CLICatalog(slicerRoots = slicerRoot)
+        self.assertEqual(catalog.rescan(), [cli])
+
+        extension = os.path.join(slicerRoot, 'Extensions-1234', 'Extra', 'lib', 'Slicer-5.2',
+                                 'cli-modules')
+        os.makedirs(extension)
+        shutil.copy(cli, os.path.join(extension, 'ExtraScalar'))
+        shutil.copy(os.path.join(os.path.dirname(cli), 'AddScalar.xml'), extension)
+        self.assertEqual(catalog.rescan(), [os.path.join(extension, 'ExtraScalar')])
+        self.assertEqual(catalog.directories()[-1], extension)
+        self.assertEqual(sorted(catalog), ['AddScalar', 'ExtraScalar'])
+
+
+if __name__ == '__main__':
+    unittest.main()
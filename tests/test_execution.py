@@ -0,0 +1,285 @@
+import os, sys, time, shutil, tempfile, unittest
+
+from ctk_cli import instrumentation
+from ctk_cli import (CLIExecution, CLIModule, CLITimeoutError, LauncherEnvironmentCache,
+                     ScratchSpace, getXMLDescription, setLauncherEnvironmentCache)
+from ctk_cli.execution import prepareCLICommand, slicerLauncher, wrapCLICommand
+
+from .stubs import (ADD_SCALAR_NO_OUTPUTS_XML, ADD_SCALAR_XML, StubTestCase, callCount,
+                    isRunning, writeAddScalar, writeExecutable, writeSlicerTree)
+
+
+class CommandLineTest(StubTestCase):
+    def setUp(self):
+        super(CommandLineTest, self).setUp()
+        self.execution = CLIExecution(CLIModule(self.cli))
+
+    def test_argv(self):
+        command = self.execution.commandLine(
+            dict(inputFile = 'in.txt', outputFile = 'out.txt', scalar = 2.5,
+                 negate = True, mode = 'subtract', size = [4, 5, 6]), 'params.txt')
+        self.assertEqual(command[0], self.cli)
+        self.assertEqual(command[-2:], ['in.txt', 'out.txt'])
+        options = command[1:-2]
+        for pair in (['--scalar', '2.5'], ['--mode', 'subtract'], ['--size', '4,5,6'],
+                     ['--returnparameterfile', 'params.txt']):
+            index = options.index(pair[0])
+            self.assertEqual(options[index:index + 2], pair)
+        self.assertIn('--negate', options)
+
+    def test_false_boolean_is_omitted(self):
+        command = self.execution.commandLine(
+            dict(inputFile = 'in.txt', outputFile = 'out.txt', negate = False))
+        self.assertNotIn('--negate', command)
+
+    def test_false_boolean_with_true_default(self):
+        xml = ADD_SCALAR_XML.replace('<default>false</default>', '<default>true</default>')
+        os.mkdir(self.path('other'))
+        execution = CLIExecution(CLIModule(writeAddScalar(self.path('other'), xml)))
+        values = dict(inputFile = 'in.txt', outputFile = 'out.txt')
+        self.assertIn('--negate', execution.commandLine(dict(values, negate = True)))
+        self.assertNotIn('--negate', execution.commandLine(values))
+        with self.assertRaises(ValueError):
+            execution.commandLine(dict(values, negate = False))
+
+    def test_validation(self):
+        values = dict(inputFile = 'in.txt', outputFile = 'out.txt')
+        for invalid in (dict(scalar = 11.0), dict(mode = 'multiply'), dict(unknown = 1)):
+            values.update(invalid)
+            with self.assertRaises(ValueError):
+                self.execution.commandLine(values)
+            for identifier in invalid:
+                del values[identifier]
+        with self.assertRaises(ValueError):
+            self.execution.commandLine(dict(inputFile = 'in.txt')) # missing argument
+
+    def test_invalid_parameter_sets(self):
+        invalid = self.execution.invalidParameterSets(
+            [dict(scalar = 1.0), dict(scalar = 20.0), dict(mode = 'add', size = [1, 2])])
+        self.assertEqual(invalid, {1: ['scalar']})
+
+
+class RunTest(StubTestCase):
+    def setUp(self):
+        super(RunTest, self).setUp()
+        self.execution = CLIExecution(CLIModule(self.cli))
+
+    def run_cli(self, **values):
+        values.setdefault('inputFile', self.inputFile)
+        result = self.execution.run(values)
+        self.addCleanup(result.cleanup)
+        return result
+
+    def test_outputs_and_return_parameters(self):
+        result = self.run_cli(scalar = 2.0, size = [7, 8, 9]).check()
+        with open(result.outputs['outputFile']) as f:
+            self.assertEqual(float(f.read()), 7.0)
+        self.assertEqual(result.outputs['sum'], 7.0)
+        self.assertEqual(result.outputs['outSize'], [7, 8, 9])
+        self.assertIn(b'result 7.0', result.stdout)
+        self.assertEqual(result.stderr, b'done\n')
+        self.assertGreater(result.resourceUsage.wallTime, 0)
+
+    def test_boolean_switch(self):
+        result = self.run_cli(negate = True).check()
+        self.assertEqual(result.outputs['sum'], -6.0)
+
+    def test_boolean_switch_without_return_parameters(self):
+        os.mkdir(self.path('noOutputs'))
+        cli = writeAddScalar(self.path('noOutputs'), ADD_SCALAR_NO_OUTPUTS_XML)
+        execution = CLIExecution(CLIModule(cli))
+        command = execution.commandLine(dict(inputFile = 'in.txt', outputFile = 'out.txt',
+                                             negate = True))
+        self.assertEqual(command[1:], ['--negate', 'in.txt', 'out.txt'])
+        result = execution.run(dict(inputFile = self.inputFile, negate = True))
+        self.addCleanup(result.cleanup)
+        with open(result.check().outputs['outputFile']) as f:
+            self.assertEqual(float(f.read()), -6.0)
+
+    def test_automatic_outputs_are_removed(self):
+        result = self.run_cli()
+        outputFile = result.outputs['outputFile']
+        self.assertTrue(os.path.exists(outputFile))
+        result.cleanup()
+        self.assertFalse(os.path.exists(outputFile))
+
+    def test_progress(self):
+        events = []
+        result = self.execution.run(dict(inputFile = self.inputFile), progress = events.append)
+        self.addCleanup(result.cleanup)
+        self.assertEqual([event.kind for event in events], ['start', 'progress', 'end'])
+        self.assertEqual(events[0].name, 'AddScalar')
+        self.assertEqual(events[1].progress, 0.5)
+        self.assertEqual(events[2].time, 0.1)
+        self.assertNotIn(b'<filter-', result.stdout)
+        self.assertIn(b'result 6.0', result.stdout)
+
+    def test_scratch_space(self):
+        with ScratchSpace(self.path('scratch', 'base')) as scratch:
+            result = self.execution.run(dict(inputFile = self.inputFile), scratch = scratch)
+            self.assertTrue(result.outputs['outputFile'].startswith(self.path('scratch', 'base')))
+            self.assertEqual(result.check().outputs['sum'], 6.0)
+            result.cleanup()
+
+    def test_failure(self):
+        result = self.execution.run(dict(inputFile = self.path('missing.txt')))
+        self.addCleanup(result.cleanup)
+        self.assertNotEqual(result.exitCode, 0)
+        self.assertRaises(RuntimeError, result.check)
+
+    def test_malformed_return_parameters_release_scratch(self):
+        script = self.path('BadReturn')
+        with open(self.cli) as f:
+            writeExecutable(script, f.read().replace(
+                'parser.write_return_parameters(args, dict(sum = value, outSize = args.size))',
+                "open(args.returnParameterFile, 'w').write('sum = garbage\\n')"))
+        execution = CLIExecution(CLIModule(script))
+        with ScratchSpace(self.path('scratch')) as scratch:
+            with self.assertRaises(ValueError):
+                execution.run(dict(inputFile = self.inputFile), scratch = scratch)
+            self.assertEqual(os.listdir(scratch._root), ['run1'])
+            self.assertEqual(scratch._idle, [os.path.join(scratch._root, 'run1')])
+
+
+class TimeoutTest(StubTestCase):
+    def setUp(self):
+        super(TimeoutTest, self).setUp()
+        self.execution = CLIExecution(CLIModule(self.cli))
+
+    def test_kills_process_group(self):
+        pidFile = self.path('child.pid')
+        start = time.time()
+        with self.assertRaises(CLITimeoutError):
+            self.execution.run(dict(inputFile = self.inputFile, sleep = 30.0, pidFile = pidFile),
+                               timeout = 2)
+        self.assertLess(time.time() - start, 20)
+        with open(pidFile) as f:
+            childPid = int(f.read())
+        deadline = time.time() + 5
+        while isRunning(childPid) and time.time() < deadline:
+            time.sleep(0.05) # (being reaped by init)
+        self.assertFalse(isRunning(childPid))
+
+    def test_completed_run_is_not_a_timeout(self):
+        result = self.execution.run(dict(inputFile = self.inputFile), timeout = 60)
+        self.addCleanup(result.cleanup)
+        self.assertEqual(result.check().outputs['sum'], 6.0)
+
+    @unittest.skipUnless(hasattr(os, 'waitid'), 'tests the fallback for missing os.waitid')
+    def test_without_waitid(self):
+        waitid = os.waitid
+        del os.waitid
+        self.addCleanup(setattr, os, 'waitid', waitid)
+        result = self.execution.run(dict(inputFile = self.inputFile), timeout = 60)
+        self.addCleanup(result.cleanup)
+        self.assertEqual(result.check().outputs['sum'], 6.0)
+        self.assertEqual(getXMLDescription(self.cli, timeout = 60).getroot().tag, 'executable')
+
+    def test_xml_description_timeout(self):
+        hanging = writeExecutable(self.path('Hang'), '#!/bin/sh\nsleep 30 &\nexec sleep 30\n')
+        start = time.time()
+        self.assertRaises(CLITimeoutError, getXMLDescription, hanging, timeout = 0.5)
+        self.assertLess(time.time() - start, 20)
+
+    def test_xml_description_error_kills_process_group(self):
+        pidFile = self.path('child.pid')
+        hanging = writeExecutable(self.path('Hang'), '#!/bin/sh\nsleep 30 &\necho $! > %s\n'
+                                  'echo "<executable>"\nexec sleep 30\n' % pidFile)
+        clock = instrumentation.clock
+        calls = []
+        def failingClock():
+            calls.append(None)
+            if len(calls) > 1: # (the first call is before spawning)
+                raise RuntimeError('interrupted')
+            return clock()
+        instrumentation.clock = failingClock
+        self.addCleanup(setattr, instrumentation, 'clock', clock)
+
+        start = time.time()
+        self.assertRaises(RuntimeError, getXMLDescription, hanging)
+        self.assertLess(time.time() - start, 20)
+        with open(pidFile) as f:
+            childPid = int(f.read())
+        deadline = time.time() + 5
+        while isRunning(childPid) and time.time() < deadline:
+            time.sleep(0.05) # (being reaped by init)
+        self.assertFalse(isRunning(childPid))
+
+
+@unittest.skipIf(sys.platform.startswith('win'), 'stub launcher requires a POSIX system')
+class SlicerLauncherTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix = 'ctk-cli-test-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.launcher, self.cli = writeSlicerTree(self.directory)
+        self.addCleanup(setLauncherEnvironmentCache, None)
+
+    def launchCount(self):
+        try:
+            with open(os.path.join(self.directory, 'launcher.log')) as f:
+                return len(f.readlines())
+        except IOError:
+            return 0
+
+    def test_detection(self):
+        self.assertEqual(slicerLauncher(self.cli), self.launcher)
+        self.assertIsNone(slicerLauncher(os.path.join(self.directory, 'Slicer')))
+
+    def test_wrapping(self):
+        expected = [self.launcher, '--launcher-no-splash', '--launch', self.cli, '--xml']
+        self.assertEqual(wrapCLICommand([self.cli, '--xml']), expected)
+        kwargs = dict(cwd = self.directory)
+        self.assertEqual(prepareCLICommand([self.cli, '--xml'], kwargs), (expected, kwargs))
+        self.assertEqual(prepareCLICommand(['/bin/true'], kwargs), (['/bin/true'], kwargs))
+
+    def test_run_through_launcher(self):
+        module = CLIModule(self.cli)
+        self.assertEqual(module.title, 'Add Scalar')
+        self.assertEqual(self.launchCount(), 1)
+        inputFile = os.path.join(self.directory, 'input.txt')
+        with open(inputFile, 'w') as f:
+            f.write('1\n')
+        result = CLIExecution(module).run(dict(inputFile = inputFile))
+        self.addCleanup(result.cleanup)
+        self.assertEqual(result.check().outputs['sum'], 2.0)
+        self.assertEqual(self.launchCount(), 2)
+
+    def test_environment_cache(self):
+        cache = LauncherEnvironmentCache()
+        environment = cache.environment(self.launcher)
+        self.assertEqual(environment['SLICER_STUB_VARIABLE'], 'stub')
+        self.assertIs(cache.environment(self.launcher), environment)
+        self.assertEqual(self.launchCount(), 1)
+
+        # a different env is a different entry:
+        env = dict(os.environ, OTHER_VARIABLE = '1')
+        self.assertEqual(cache.environment(self.launcher, env)['OTHER_VARIABLE'], '1')
+        self.assertEqual(self.launchCount(), 2)
+
+        # changing the launcher invalidates its entries:
+        with open(self.launcher, 'a') as f:
+            f.write('# changed\n')
+        cache.environment(self.launcher)
+        self.assertEqual(self.launchCount(), 3)
+        cache.environment(self.launcher)
+        self.assertEqual(self.launchCount(), 3)
+
+        cache.invalidate(self.launcher)
+        cache.environment(self.launcher)
+        self.assertEqual(self.launchCount(), 4)
+
+    def test_spawning_with_cached_environment(self):
+        setLauncherEnvironmentCache(LauncherEnvironmentCache())
+        command, kwargs = prepareCLICommand([self.cli, '--xml'], {})
+        self.assertEqual(command, [self.cli, '--xml'])
+        self.assertEqual(kwargs['env']['SLICER_STUB_VARIABLE'], 'stub')
+        self.assertEqual(self.launchCount(), 1)
+
+        CLIModule(self.cli)
+        CLIModule(self.cli)
+        self.assertEqual(self.launchCount(), 1)
+        self.assertEqual(callCount(self.cli, '--xml'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
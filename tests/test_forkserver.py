@@ -0,0 +1,94 @@
+import os, sys, time, unittest
+
+from ctk_cli import CLIExecution, CLIModule, CLITimeoutError
+from ctk_cli.forkserver import startForkServer
+
+from .stubs import REPOSITORY, StubTestCase, callCount, isRunning, writeExecutable
+
+# AddScalar with a main() function, to be run via runCLIMain()
+FORK_SERVER_SCRIPT = '''#!%(python)s
+import os, sys, time, subprocess
+sys.path.insert(0, %(repository)r)
+here = os.path.dirname(os.path.abspath(__file__))
+with open(os.path.join(here, 'calls.log'), 'a') as f:
+    f.write(' '.join(sys.argv[1:]) + '\\n')
+
+from ctk_cli import CLIArgumentParser
+from ctk_cli.forkserver import runCLIMain
+
+parser = CLIArgumentParser(os.path.join(here, 'AddScalar.xml'))
+
+def main(args):
+    if args.pidFile:
+        child = subprocess.Popen(['sleep', '60'])
+        with open(args.pidFile, 'w') as f:
+            f.write('%%d\\n' %% child.pid)
+    time.sleep(args.sleep)
+    with open(args.inputFile) as f:
+        value = float(f.read()) + args.scalar
+    with open(args.outputFile, 'w') as f:
+        f.write('%%s\\n' %% value)
+    print('result %%s' %% value)
+    parser.write_return_parameters(args, dict(sum = value, outSize = args.size))
+
+runCLIMain(parser, main)
+'''
+
+
+@unittest.skipIf(sys.platform.startswith('win'), 'fork servers require a POSIX system')
+class ForkServerTest(StubTestCase):
+    def setUp(self):
+        super(ForkServerTest, self).setUp()
+        self.cli = writeExecutable(self.path('AddScalarServer'), FORK_SERVER_SCRIPT % dict(
+            python = sys.executable, repository = REPOSITORY))
+        self.execution = CLIExecution(CLIModule(self.cli))
+        self.client = startForkServer(self.cli)
+        self.addCleanup(self.client.close)
+
+    def test_run(self):
+        for scalar in (1.0, 2.0):
+            result = self.execution.run(dict(inputFile = self.inputFile, scalar = scalar),
+                                        forkServer = self.client)
+            self.addCleanup(result.cleanup)
+            self.assertEqual(result.check().outputs['sum'], 5.0 + scalar)
+            self.assertIn(b'result', result.stdout)
+        self.assertEqual(callCount(self.cli, '--fork-server'), 1)
+        self.assertEqual(callCount(self.cli), 2) # --xml and the server
+
+    def test_exit_code_and_stderr(self):
+        exitCode, stdout, stderr, returnParameters = self.client.run(
+            [self.path('missing.txt'), self.path('out.txt')])
+        self.assertEqual(exitCode, 1)
+        self.assertIn(b'missing.txt', stderr)
+        self.assertEqual(returnParameters, {})
+
+        exitCode, _, stderr, _ = self.client.run(['--scalar', 'x'])
+        self.assertEqual(exitCode, 2) # argparse error
+        self.assertIn(b'usage', stderr)
+
+    def test_timeout_kills_process_group(self):
+        pidFile = self.path('child.pid')
+        start = time.time()
+        with self.assertRaises(CLITimeoutError):
+            self.client.run([self.inputFile, self.path('out.txt'), '--sleep', '30',
+                             '--pidfile', pidFile], timeout = 2)
+        self.assertLess(time.time() - start, 20)
+        with open(pidFile) as f:
+            childPid = int(f.read())
+        deadline = time.time() + 5
+        while isRunning(childPid) and time.time() < deadline:
+            time.sleep(0.05) # (being reaped by init)
+        self.assertFalse(isRunning(childPid))
+
+        # the server keeps serving requests:
+        exitCode, _, _, returnParameters = self.client.run([self.inputFile, self.path('out.txt')])
+        self.assertEqual((exitCode, returnParameters), (0, {}))
+
+    def test_close(self):
+        socketPath = self.client.socketPath
+        self.client.close()
+        self.assertFalse(os.path.exists(socketPath))
+
+
+if __name__ == '__main__':
+    unittest.main()
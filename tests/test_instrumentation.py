@@ -0,0 +1,83 @@
+import unittest
+
+from ctk_cli import CLIModule, MetricsCollector, XMLDescriptionCache, addListener, removeListener
+from ctk_cli.instrumentation import CLIEvent, emit, isEnabled
+
+from .stubs import StubTestCase
+
+
+class ListenerTest(StubTestCase):
+    def setUp(self):
+        super(ListenerTest, self).setUp()
+        self.events = []
+        addListener(self.events.append)
+        self.addCleanup(removeListener, self.events.append)
+
+    def eventNames(self):
+        return [event.name for event in self.events]
+
+    def test_describing(self):
+        CLIModule(self.cli)
+        self.assertEqual(sorted(self.eventNames()),
+                         ['module-parse', 'parameters-parse', 'spawn', 'xml-parse', 'xml-wait'])
+        for event in self.events:
+            self.assertEqual(event.module, 'AddScalar')
+            self.assertGreaterEqual(event.duration, 0)
+        spawn, = [event for event in self.events if event.name == 'spawn']
+        self.assertEqual(spawn.details, dict(launcher = False))
+
+    def test_lazy_parsing(self):
+        module = CLIModule(self.path('AddScalar.xml'), lazy = True)
+        self.assertEqual(self.eventNames(), ['module-parse'])
+        list(module.parameters())
+        self.assertEqual(self.eventNames(), ['module-parse', 'parameters-parse'])
+
+    def test_xml_cache_hit(self):
+        cache = XMLDescriptionCache(self.path('cache'))
+        CLIModule(self.cli, cache = cache)
+        del self.events[:]
+        CLIModule(self.cli, cache = cache)
+        self.assertIn('xml-cache-hit', self.eventNames())
+        self.assertNotIn('spawn', self.eventNames())
+
+    def test_remove_listener(self):
+        removeListener(self.events.append)
+        self.addCleanup(addListener, self.events.append) # (for the cleanup of setUp)
+        self.assertFalse(isEnabled())
+        CLIModule(self.cli)
+        self.assertEqual(self.events, [])
+
+
+class MetricsCollectorTest(unittest.TestCase):
+    def setUp(self):
+        self.metrics = MetricsCollector()
+        for name, module, duration in (('spawn', 'A', 0.5), ('spawn', 'A', 1.5),
+                                       ('xml-wait', 'B"1', 2.0)):
+            self.metrics(CLIEvent(name, module, duration, {}))
+
+    def test_aggregation(self):
+        self.assertEqual(self.metrics.metrics(), {('spawn', 'A'): (2, 2.0, 1.5),
+                                                  ('xml-wait', 'B"1'): (1, 2.0, 2.0)})
+        self.metrics.reset()
+        self.assertEqual(self.metrics.metrics(), {})
+
+    def test_prometheus_text(self):
+        lines = self.metrics.prometheusText().splitlines()
+        self.assertIn('ctk_cli_duration_seconds_sum{event="spawn",module="A"} 2.0', lines)
+        self.assertIn('ctk_cli_duration_seconds_count{event="spawn",module="A"} 2', lines)
+        self.assertIn('ctk_cli_duration_seconds_max{event="spawn",module="A"} 1.5', lines)
+        self.assertIn('ctk_cli_duration_seconds_count{event="xml-wait",module="B\\"1"} 1', lines)
+        self.assertIn('# TYPE ctk_cli_duration_seconds summary', lines)
+
+    def test_as_listener(self):
+        addListener(self.metrics)
+        try:
+            emit('spawn', 'A', 1.0)
+        finally:
+            removeListener(self.metrics)
+        emit('spawn', 'A', 1.0)
+        self.assertEqual(self.metrics.metrics()[('spawn', 'A')], (3, 3.0, 1.5))
+
+
+if __name__ == '__main__':
+    unittest.main()
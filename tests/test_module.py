@@ -0,0 +1,233 @@
+import io, re, copy, pickle, unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from ctk_cli import CLIModule, CLIParseError
+from ctk_cli.module import CLIParameters
+
+from .stubs import ADD_SCALAR_XML
+
+
+def loadModule(xml = ADD_SCALAR_XML, **kwargs):
+    return CLIModule(stream = io.BytesIO(xml.encode('utf-8')), **kwargs)
+
+
+class ParsingTest(unittest.TestCase):
+    def test_metadata(self):
+        module = loadModule()
+        self.assertEqual(module.title, 'Add Scalar')
+        self.assertEqual(module.version, '1.0')
+        self.assertEqual([parameters.label for parameters in module], ['IO', 'Options', 'Outputs'])
+        self.assertTrue(module[2].advanced)
+
+    def test_defaults_are_parsed(self):
+        module = loadModule()
+        self.assertEqual(module.parameterByIdentifier('scalar').default, 1.0)
+        self.assertEqual(module.parameterByIdentifier('negate').default, False)
+        self.assertEqual(module.parameterByIdentifier('size').default, [1, 2, 3])
+        self.assertEqual(module.parameterByIdentifier('mode').elements, ['add', 'subtract'])
+
+    def test_enumeration_without_default(self):
+        xml = ADD_SCALAR_XML.replace('<default>add</default>', '')
+        mode = loadModule(xml).parameterByIdentifier('mode')
+        self.assertIsNone(mode.default)
+        self.assertEqual(mode.elements, ['add', 'subtract'])
+        mode.validateValue('subtract')
+        self.assertRaises(ValueError, mode.validateValue, 'multiply')
+
+    def test_classification(self):
+        arguments, options, outputs = loadModule().classifyParameters()
+        self.assertEqual([p.name for p in arguments], ['inputFile', 'outputFile'])
+        self.assertEqual(set(p.name for p in options),
+                         set(['scalar', 'negate', 'mode', 'size', 'sleep', 'pidFile']))
+        self.assertEqual([p.name for p in outputs], ['sum', 'outSize'])
+
+    def test_invalid_constraints(self):
+        xml = ADD_SCALAR_XML.replace('<minimum>-10</minimum>', '<minimum>low</minimum>')
+        module = loadModule(xml, diagnosticsPolicy = 'collect')
+        self.assertIn('invalid-constraints', [d.code for d in module.diagnostics])
+        scalar = module.parameterByIdentifier('scalar')
+        scalar.validateValue(-100.0) # constraints are ignored
+        self.assertRaises(ValueError, scalar.validateValue, 'x')
+        self.assertRaises(CLIParseError, loadModule, xml, diagnosticsPolicy = 'strict')
+
+
+def describe(module):
+    """Return nested lists of the parsed values of all parameters."""
+    return [(group.label, group.advanced,
+             [(p.typ, p.name, p.flag, p.longflag, p.index, p.channel, p.default, p.elements,
+               p.fileExtensions, p.constraints and (p.constraints.minimum, p.constraints.step))
+              for p in group])
+            for group in module]
+
+
+class NamespaceTest(unittest.TestCase):
+    NAMESPACE = 'http://www.commontk.org/cli'
+
+    def test_default_namespace(self):
+        xml = ADD_SCALAR_XML.replace('<executable>', '<executable xmlns="%s">' % self.NAMESPACE)
+        module = loadModule(xml, diagnosticsPolicy = 'strict')
+        self.assertEqual(module.title, 'Add Scalar')
+        self.assertEqual(describe(module), describe(loadModule()))
+
+    def test_prefixed_namespace(self):
+        xml = re.sub(r'<(/?)([a-z])', r'<\1cli:\2', ADD_SCALAR_XML).replace(
+            '<cli:executable>', '<cli:executable xmlns:cli="%s">' % self.NAMESPACE)
+        module = loadModule(xml, diagnosticsPolicy = 'strict')
+        self.assertEqual(module.version, '1.0')
+        self.assertEqual(describe(module), describe(loadModule()))
+
+    def test_foreign_namespace(self):
+        xml = ADD_SCALAR_XML.replace(
+            '<title>Add Scalar</title>',
+            '<title>Add Scalar</title><other:title xmlns:other="urn:other">Other</other:title>')
+        module = loadModule(xml, diagnosticsPolicy = 'collect')
+        self.assertEqual(module.title, 'Add Scalar')
+        self.assertEqual([(d.code, d.args) for d in module.diagnostics],
+                         [('unparsed-element', ('title', 'executable'))])
+
+    def test_multiple_and_missing_elements(self):
+        xml = ADD_SCALAR_XML.replace('<version>1.0</version>',
+                                     '<version>1.0</version><version>2.0</version>')
+        xml = xml.replace('<label>Scalar</label>', '')
+        module = loadModule(xml, diagnosticsPolicy = 'collect')
+        self.assertEqual(module.version, '1.0')
+        self.assertEqual(module.parameterByIdentifier('scalar').label, None)
+        self.assertEqual(sorted((d.code, d.element) for d in module.diagnostics),
+                         [('missing-element', 'double'), ('multiple-elements', 'executable')])
+
+
+class LazyParsingTest(unittest.TestCase):
+    def test_metadata_only(self):
+        module = loadModule(lazy = True)
+        self.assertFalse(module.isParsed())
+        self.assertEqual(module.title, 'Add Scalar')
+        self.assertFalse(module.isParsed())
+
+    def test_parsed_on_access(self):
+        for access in (len, list, lambda m: m[0], lambda m: list(m.parameters()),
+                       lambda m: m.classifyParameters(), lambda m: m.parameterByIdentifier('sum')):
+            module = loadModule(lazy = True)
+            access(module)
+            self.assertTrue(module.isParsed())
+            self.assertEqual(len(module), 3)
+
+    def test_same_result(self):
+        lazy, eager = loadModule(lazy = True), loadModule()
+        self.assertEqual([[p.name for p in ps] for ps in lazy], [[p.name for p in ps] for ps in eager])
+
+
+class IndexTest(unittest.TestCase):
+    def setUp(self):
+        self.module = loadModule()
+
+    def test_lookups(self):
+        module = self.module
+        self.assertEqual(module.parameterByIdentifier('scalar').name, 'scalar')
+        self.assertIs(module.parameterByFlag('n'), module.parameterByLongflag('negate'))
+        self.assertIs(module.parameterByFlag('-n'), module.parameterByLongflag('--negate'))
+        self.assertEqual(module.parameterByIndex(1).name, 'outputFile')
+        self.assertEqual([p.name for p in module.parametersOfType('double')],
+                         ['scalar', 'sleep', 'sum'])
+        self.assertIsNone(module.parameterByIdentifier('missing'))
+
+    def test_group_modifications_are_detected(self):
+        module = self.module
+        sleep = module.parameterByIdentifier('sleep')
+        module[1].remove(sleep)
+        self.assertIsNone(module.parameterByIdentifier('sleep'))
+        group = CLIParameters([sleep])
+        module.append(group)
+        self.assertIs(module.parameterByIdentifier('sleep'), sleep)
+        del module[-1]
+        self.assertIsNone(module.parameterByIdentifier('sleep'))
+        self.assertNotIn(sleep, module.classifyParameters()[1])
+
+    def test_attribute_changes_need_invalidation(self):
+        module = self.module
+        scalar = module.parameterByIdentifier('scalar')
+        scalar.longflag = '--offset'
+        self.assertIs(module.parameterByLongflag('scalar'), scalar) # stale
+        module.invalidateIndexes()
+        self.assertIsNone(module.parameterByLongflag('scalar'))
+        self.assertIs(module.parameterByLongflag('offset'), scalar)
+
+
+class CodecTest(unittest.TestCase):
+    def setUp(self):
+        self.module = loadModule()
+
+    def test_compiled_lazily(self):
+        size = self.module.parameterByIdentifier('size')
+        self.assertIsNone(size._codec)
+        self.assertEqual(size.parseValue('4,5,6'), [4, 5, 6])
+        self.assertIsNotNone(size._codec)
+
+    def test_recompile(self):
+        scalar = self.module.parameterByIdentifier('scalar')
+        self.assertRaises(ValueError, scalar.validateValue, 20.0)
+        scalar.constraints.maximum = '100'
+        self.assertRaises(ValueError, scalar.validateValue, 20.0) # not recompiled yet
+        scalar.compileCodec()
+        scalar.validateValue(20.0)
+
+    def test_pickle_parameters(self):
+        for parameter in self.module.parameters():
+            parameter.codec # compile all codecs
+            clone = pickle.loads(pickle.dumps(parameter))
+            self.assertEqual(clone.identifier(), parameter.identifier())
+            self.assertEqual(clone.default, parameter.default)
+            self.assertIsNone(clone._codec)
+        size = pickle.loads(pickle.dumps(self.module.parameterByIdentifier('size')))
+        self.assertEqual(size.parseValue('1,2'), [1, 2])
+        self.assertRaises(ValueError, size.validateValue, [1.5])
+
+    def test_copy(self):
+        scalar = copy.deepcopy(self.module.parameterByIdentifier('scalar'))
+        self.assertRaises(ValueError, scalar.validateValue, 20.0)
+
+    def test_step_is_not_checked(self):
+        xml = ADD_SCALAR_XML.replace('<double>\n      <name>scalar', '<integer>\n      <name>scalar')
+        xml = xml.replace('<step>0.5</step>\n      </constraints>\n    </double>',
+                          '<step>5</step>\n      </constraints>\n    </integer>')
+        scalar = loadModule(xml).parameterByIdentifier('scalar')
+        self.assertEqual(scalar.typ, 'integer')
+        scalar.validateValue(3) # the step is merely a slider increment
+        for values in (range(-12, 13), range(-100, 101)): # (the latter with NumPy, if available)
+            offset = -values[0]
+            self.assertEqual(scalar.codec.invalidIndices(list(values)),
+                             [i for i in range(len(values)) if abs(i - offset) > 10])
+
+
+@unittest.skipUnless(numpy, 'requires NumPy')
+class NumPyTest(unittest.TestCase):
+    def setUp(self):
+        self.size = loadModule().parameterByIdentifier('size')
+
+    def test_parse_as_array(self):
+        array = self.size.parseValueAsArray('4,5,6')
+        self.assertEqual(array.dtype.kind, 'i')
+        self.assertEqual(array.tolist(), [4, 5, 6])
+        scalar = loadModule().parameterByIdentifier('scalar')
+        self.assertRaises(ValueError, scalar.parseValueAsArray, '1')
+
+    def test_parse_values_as_array(self):
+        array = self.size.parseValuesAsArray(['1,2,3', '4,5,6'])
+        self.assertEqual(array.shape, (2, 3))
+        self.assertEqual(array.tolist(), [[1, 2, 3], [4, 5, 6]])
+        self.assertEqual(self.size.parseValuesAsArray([]).shape, (0, 0))
+
+    def test_differing_lengths(self):
+        for values in (['1,2,3', '4,5', '6'], ['1,2', '3']):
+            self.assertRaises(ValueError, self.size.parseValuesAsArray, values)
+
+    def test_format_array(self):
+        self.assertEqual(self.size.formatValue(numpy.array([7, 8, 9])), '7,8,9')
+        self.size.validateValue(numpy.array([7, 8, 9]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os, unittest
+
+from ctk_cli import CLIModule, CLIPipeline, ScratchSpace
+
+from .stubs import StubTestCase
+
+
+class CLIPipelineTest(StubTestCase):
+    def setUp(self):
+        super(CLIPipelineTest, self).setUp()
+        self.module = CLIModule(self.cli)
+        self.pipeline = CLIPipeline()
+
+    def readNumber(self, path):
+        with open(path) as f:
+            return float(f.read())
+
+    def addChain(self, firstValues = {}):
+        """Add steps 'first' (adding 1 to the input) and 'second'
+        (adding the first sum to first's output)."""
+        values = dict(inputFile = self.inputFile)
+        values.update(firstValues)
+        first = self.pipeline.addStep('first', self.module, values)
+        second = self.pipeline.addStep('second', self.module, dict(
+            inputFile = first.output('outputFile'), scalar = first.output('sum')))
+        return first, second
+
+    def test_linked_values(self):
+        first, second = self.addChain()
+        self.assertEqual(second.dependencies(), set(['first']))
+        result = self.pipeline.run()
+        self.addCleanup(result.cleanup)
+        self.assertEqual(result.failures, {})
+        self.assertEqual(result['first'].outputs['sum'], 6.0)
+        self.assertEqual(result['second'].outputs['sum'], 12.0)
+        self.assertEqual(self.readNumber(result['second'].outputs['outputFile']), 12.0)
+
+    def test_intermediate_files_are_removed(self):
+        self.addChain()
+        result = self.pipeline.run()
+        self.addCleanup(result.cleanup)
+        self.assertFalse(os.path.exists(result['first'].outputs['outputFile']))
+        self.assertTrue(os.path.exists(result['second'].outputs['outputFile']))
+
+    def test_explicit_intermediate_path_is_kept(self):
+        keep = self.path('keep.txt')
+        self.addChain(dict(outputFile = keep))
+        result = self.pipeline.run()
+        self.addCleanup(result.cleanup)
+        self.assertEqual(result['first'].outputs['outputFile'], keep)
+        self.assertEqual(self.readNumber(keep), 6.0)
+        self.assertEqual(result['second'].outputs['sum'], 12.0)
+
+    def test_scratch_space(self):
+        with ScratchSpace(self.path('scratch')) as scratch:
+            self.pipeline = CLIPipeline(scratch = scratch)
+            self.addChain()
+            result = self.pipeline.run()
+            self.assertTrue(result['second'].outputs['outputFile'].startswith(self.path('scratch')))
+            result.cleanup()
+
+    def test_invalid_links(self):
+        first = self.pipeline.addStep('first', self.module, dict(inputFile = self.inputFile))
+        for values in (dict(scalar = first.output('outSize')),       # vector vs. scalar
+                       dict(inputFile = first.output('sum')),        # value vs. file
+                       dict(outputFile = first.output('outputFile')), # output
+                       dict(unknown = 1)):
+            self.assertRaises(ValueError, self.pipeline.addStep, 'second', self.module, values)
+        self.assertRaises(ValueError, first.output, 'scalar')
+        self.assertRaises(ValueError, self.pipeline.addStep, 'first', self.module)
+        other = CLIPipeline().addStep('first', self.module, dict(inputFile = self.inputFile))
+        self.assertRaises(ValueError, self.pipeline.addStep, 'second', self.module,
+                          dict(inputFile = other.output('outputFile')))
+
+    def test_failures_skip_dependent_steps(self):
+        self.addChain(dict(inputFile = self.path('missing.txt')))
+        self.pipeline.addStep('independent', self.module, dict(inputFile = self.inputFile))
+        result = self.pipeline.run()
+        self.addCleanup(result.cleanup)
+        self.assertEqual(sorted(result.failures), ['first', 'second'])
+        self.assertIn('first', str(result.failures['second']))
+        self.assertEqual(result['independent'].outputs['sum'], 6.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import io, unittest
+
+from ctk_cli import CLIProgressParser, iterCLIProgress
+from ctk_cli import progress
+
+OUTPUT = (b'starting\n'
+          b'<filter-start>\n'
+          b'  <filter-name>AddScalar</filter-name>\n'
+          b'  <filter-comment>Adding scalar</filter-comment>\n'
+          b'</filter-start>\n'
+          b'line with <b>markup</b> and <filter-foo bar> in it\n'
+          b'<filter-progress>0.25</filter-progress>\r\n'
+          b'<filter-stage-progress>0.5</filter-stage-progress>\n'
+          b'<filter-progress>nan?</filter-progress>\n'
+          b'<filter-end>\n'
+          b'  <filter-name>AddScalar</filter-name>\n'
+          b'  <filter-time>1.5</filter-time>\n'
+          b'</filter-end>\n'
+          b'done <filter-')
+
+PASSTHROUGH = (b'starting\n'
+               b'line with <b>markup</b> and <filter-foo bar> in it\n'
+               b'done <filter-')
+
+
+def parseChunks(chunks):
+    output = []
+    parser = CLIProgressParser(passthrough = output.append)
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    parser.close()
+    return events, b''.join(output)
+
+
+class CLIProgressParserTest(unittest.TestCase):
+    def assertExpectedEvents(self, events):
+        self.assertEqual([event.kind for event in events],
+                         ['start', 'progress', 'stage-progress', 'end'])
+        start, progress, stageProgress, end = events
+        self.assertEqual((start.name, start.comment), ('AddScalar', 'Adding scalar'))
+        self.assertEqual(progress.progress, 0.25)
+        self.assertEqual(stageProgress.progress, 0.5)
+        self.assertEqual((end.name, end.time), ('AddScalar', 1.5))
+
+    def test_single_chunk(self):
+        events, output = parseChunks([OUTPUT])
+        self.assertExpectedEvents(events)
+        self.assertEqual(output, PASSTHROUGH)
+
+    def test_every_split_position(self):
+        for position in range(len(OUTPUT) + 1):
+            events, output = parseChunks([OUTPUT[:position], OUTPUT[position:]])
+            self.assertExpectedEvents(events)
+            self.assertEqual(output, PASSTHROUGH, 'split at %d' % position)
+
+    def test_bytewise(self):
+        events, output = parseChunks([OUTPUT[i:i + 1] for i in range(len(OUTPUT))])
+        self.assertExpectedEvents(events)
+        self.assertEqual(output, PASSTHROUGH)
+
+    def test_callback(self):
+        events = []
+        parser = CLIProgressParser(callback = events.append)
+        self.assertEqual(parser.feed(OUTPUT), events)
+        self.assertExpectedEvents(events)
+
+    def test_oversized_fragment(self):
+        data = b'<filter-progress>' + b' ' * (progress.MAX_FRAGMENT_SIZE + 1) + b'x'
+        events, output = parseChunks([data[i:i + 4096] for i in range(0, len(data), 4096)])
+        self.assertEqual(events, [])
+        self.assertEqual(output, data)
+
+    def test_iter_stream(self):
+        passthrough = []
+        events = list(iterCLIProgress(io.BytesIO(OUTPUT), passthrough.append, chunkSize = 3))
+        self.assertExpectedEvents(events)
+        self.assertEqual(b''.join(passthrough), PASSTHROUGH)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from ctk_cli import CLIModule, readReturnParameterFiles, writeReturnParameterFile
+
+from .stubs import StubTestCase
+
+
+class ReturnParameterFilesTest(StubTestCase):
+    def setUp(self):
+        super(ReturnParameterFilesTest, self).setUp()
+        self.module = CLIModule(self.path('AddScalar.xml'))
+
+    def write(self, *valueDicts):
+        filenames = []
+        for i, values in enumerate(valueDicts):
+            filenames.append(self.path('params%d.txt' % i))
+            writeReturnParameterFile(filenames[-1], values, self.module)
+        return filenames
+
+    def test_lists(self):
+        filenames = self.write(dict(sum = 1.5, outSize = [1, 2]), dict(sum = 2.5))
+        self.assertEqual(readReturnParameterFiles(filenames, self.module),
+                         dict(sum = [1.5, 2.5], outSize = [[1, 2], None]))
+
+    @unittest.skipUnless(numpy, 'requires NumPy')
+    def test_arrays(self):
+        filenames = self.write(dict(sum = 1.5, outSize = [1, 2]), dict(sum = 2.5, outSize = [3, 4]))
+        result = readReturnParameterFiles(filenames, self.module, asArrays = True)
+        self.assertEqual(result['sum'].tolist(), [1.5, 2.5])
+        self.assertEqual(result['outSize'].tolist(), [[1, 2], [3, 4]])
+
+    @unittest.skipUnless(numpy, 'requires NumPy')
+    def test_arrays_with_differing_lengths(self):
+        filenames = self.write(dict(sum = 1, outSize = [1, 2, 3]), dict(sum = 2, outSize = [4, 5]),
+                               dict(sum = 3, outSize = [6]))
+        self.assertRaises(ValueError, readReturnParameterFiles, filenames, self.module,
+                          asArrays = True)
+
+    @unittest.skipUnless(numpy, 'requires NumPy')
+    def test_arrays_with_missing_values(self):
+        filenames = self.write(dict(sum = 1, outSize = [1]), dict(sum = 2))
+        self.assertRaises(ValueError, readReturnParameterFiles, filenames, self.module,
+                          asArrays = True)
+
+
+if __name__ == '__main__':
+    unittest.main()
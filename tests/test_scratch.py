@@ -0,0 +1,66 @@
+import gc, os, shutil, weakref, tempfile, unittest
+
+from ctk_cli import ScratchSpace
+from ctk_cli.scratch import linkOrCopy
+
+from .test_module import loadModule
+
+
+class ScratchSpaceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix = 'ctk-cli-test-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.module = loadModule()
+
+    def test_allocate(self):
+        with ScratchSpace(self.directory) as scratch:
+            directory = scratch.newDirectory()
+            parameter = self.module.parameterByIdentifier('outputFile')
+            first = directory.allocate(parameter)
+            second = directory.allocate(parameter)
+            self.assertEqual(os.path.basename(first), 'outputFile.txt')
+            self.assertEqual(os.path.basename(second), 'outputFile_1.txt')
+            self.assertEqual(os.path.dirname(first), directory.path)
+
+    def test_directories_are_recycled(self):
+        with ScratchSpace(self.directory) as scratch:
+            directory = scratch.newDirectory()
+            path = directory.path
+            with open(os.path.join(path, 'file'), 'w') as f:
+                f.write('data')
+            directory.release()
+            again = scratch.newDirectory()
+            self.assertEqual(again.path, path)
+            self.assertEqual(os.listdir(path), [])
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_missing_base_directory(self):
+        baseDir = os.path.join(self.directory, 'does', 'not', 'exist')
+        with ScratchSpace(baseDir) as scratch:
+            self.assertTrue(os.path.isdir(scratch.newDirectory().path))
+
+    def test_garbage_collection(self):
+        scratch = ScratchSpace(self.directory)
+        scratch.newDirectory().release()
+        root = scratch._root
+        self.assertTrue(os.path.isdir(root))
+        reference = weakref.ref(scratch)
+        del scratch
+        gc.collect()
+        self.assertIsNone(reference())
+        self.assertFalse(os.path.exists(root))
+
+    def test_link_or_copy(self):
+        source = os.path.join(self.directory, 'source')
+        with open(source, 'w') as f:
+            f.write('data')
+        destination = os.path.join(self.directory, 'copy')
+        self.assertIn(linkOrCopy(source, destination, hardLink = False), ('reflink', 'copy'))
+        with open(destination, 'a') as f:
+            f.write('more')
+        with open(source) as f:
+            self.assertEqual(f.read(), 'data')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import io, os, pickle, shutil, tempfile, unittest
+
+from ctk_cli import CLIModule, dumpModule, loadModule
+from ctk_cli.serialization import _BINARY_MAGIC, loadCompiledModule, moduleToData
+
+from .stubs import ADD_SCALAR_XML
+
+
+def parseModule(xml = ADD_SCALAR_XML):
+    return CLIModule(stream = io.BytesIO(xml.encode('utf-8')))
+
+
+class RoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.module = parseModule()
+
+    def assertSameModule(self, module):
+        self.assertEqual(moduleToData(module), moduleToData(self.module))
+        self.assertEqual(module.title, 'Add Scalar')
+        scalar = module.parameterByIdentifier('scalar')
+        self.assertEqual(scalar.default, 1.0)
+        self.assertRaises(ValueError, scalar.validateValue, 20.0)
+        self.assertEqual(module.parameterByIdentifier('size').parseValue('4,5'), [4, 5])
+        self.assertEqual([p.name for p in module.classifyParameters()[2]], ['sum', 'outSize'])
+
+    def test_json(self):
+        serialized = dumpModule(self.module)
+        self.assertIsInstance(serialized, str)
+        self.assertSameModule(loadModule(serialized))
+        self.assertSameModule(loadModule(serialized.encode('utf-8')))
+
+    def test_binary(self):
+        serialized = dumpModule(self.module, binary = True)
+        self.assertIsInstance(serialized, bytes)
+        self.assertSameModule(loadModule(serialized))
+
+    def test_pickle(self):
+        for parameter in self.module.parameters():
+            parameter.codec # compiled codecs must not get in the way
+        self.assertSameModule(pickle.loads(pickle.dumps(self.module)))
+        self.assertSameModule(pickle.loads(pickle.dumps(self.module, protocol = 0)))
+
+    def test_lazy_module(self):
+        lazy = CLIModule(stream = io.BytesIO(ADD_SCALAR_XML.encode('utf-8')), lazy = True)
+        self.assertSameModule(loadModule(dumpModule(lazy)))
+
+    def test_invalid_data(self):
+        self.assertRaises(ValueError, loadModule, '{"foo": 1}')
+        self.assertRaises(ValueError, loadModule, 'no json')
+        serialized = bytearray(dumpModule(self.module, binary = True))
+        serialized[len(_BINARY_MAGIC)] += 1 # format version
+        self.assertRaises(ValueError, loadModule, bytes(serialized))
+
+
+class CompiledModuleTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix = 'ctk-cli-test-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.xmlFilename = os.path.join(self.directory, 'AddScalar.xml')
+        with open(self.xmlFilename, 'w') as f:
+            f.write(ADD_SCALAR_XML)
+        self.cacheDirectory = os.path.join(self.directory, 'compiled')
+
+    def test_compiled_once(self):
+        module = loadCompiledModule(self.xmlFilename, self.cacheDirectory)
+        self.assertEqual(module.title, 'Add Scalar')
+        entries = os.listdir(self.cacheDirectory)
+        self.assertEqual(len(entries), 1)
+        mtime = os.stat(os.path.join(self.cacheDirectory, entries[0])).st_mtime
+
+        module = loadCompiledModule(self.xmlFilename, self.cacheDirectory)
+        self.assertEqual(moduleToData(module), moduleToData(CLIModule(self.xmlFilename)))
+        self.assertEqual(os.stat(os.path.join(self.cacheDirectory, entries[0])).st_mtime, mtime)
+
+    def test_changed_xml(self):
+        loadCompiledModule(self.xmlFilename, self.cacheDirectory)
+        with open(self.xmlFilename, 'w') as f:
+            f.write(ADD_SCALAR_XML.replace('Add Scalar', 'Add Another Scalar'))
+        st = os.stat(self.xmlFilename)
+        os.utime(self.xmlFilename, (st.st_atime, st.st_mtime + 10))
+        module = loadCompiledModule(self.xmlFilename, self.cacheDirectory)
+        self.assertEqual(module.title, 'Add Another Scalar')
+
+    def test_corrupt_entry(self):
+        loadCompiledModule(self.xmlFilename, self.cacheDirectory)
+        entry, = os.listdir(self.cacheDirectory)
+        with open(os.path.join(self.cacheDirectory, entry), 'r+b') as f:
+            f.readline() # keep the valid signature
+            f.write(b'garbage')
+            f.truncate()
+        self.assertEqual(loadCompiledModule(self.xmlFilename, self.cacheDirectory).title, 'Add Scalar')
+
+
+if __name__ == '__main__':
+    unittest.main()